@@ -1,3 +1,35 @@
 """md2pdf root module."""
 
-from .core import md2pdf  # noqa
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .aio import md2pdf_async
+    from .core import document2pdf, html2document, md2html, md2pdf, md2pdf_many
+
+__all__ = [
+    "document2pdf",
+    "html2document",
+    "md2html",
+    "md2pdf",
+    "md2pdf_async",
+    "md2pdf_many",
+]
+
+# Modules of the conversion API
+_API = {
+    "document2pdf": "core",
+    "html2document": "core",
+    "md2html": "core",
+    "md2pdf": "core",
+    "md2pdf_async": "aio",
+    "md2pdf_many": "core",
+}
+
+
+def __getattr__(name: str):
+    """Import the conversion API (and its dependencies) upon first access."""
+    if name in _API:
+        from importlib import import_module
+
+        return getattr(import_module(f".{_API[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
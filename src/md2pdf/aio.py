@@ -0,0 +1,213 @@
+"""md2pdf asyncio API: convert documents from an event loop.
+
+Conversions are CPU-bound: they run in a worker pool (threads or processes) while
+the event loop awaits their results. Workers read input files and write output
+files, so that the event loop is never blocked.
+"""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Iterable, List, Optional, Union, cast
+
+from .conf import ASYNC_WORKERS
+from .pool import (
+    ConvertOptions,
+    ExecutorType,
+    Job,
+    JobResult,
+    convert_job,
+    get_executor,
+)
+from .stats import DocumentStats
+
+# Async converter used when none is given
+_default: Optional["AsyncConverter"] = None
+_default_lock = threading.Lock()
+
+
+class AsyncConverter:
+    """Convert documents in a managed worker pool, from an event loop.
+
+    At most `concurrency` documents (the number of workers by default) are sent to
+    workers at the same time: other conversions wait for a slot without blocking
+    the event loop. A cancelled (or timed out) conversion is dropped if it has not
+    started yet, otherwise its worker completes it and its slot is released then.
+
+    Workers keep their converter (and its caches) between conversions: pool
+    options configure them (see `ConvertOptions`). An async converter is used from
+    one event loop at a time.
+    """
+
+    def __init__(
+        self,
+        workers: int = ASYNC_WORKERS,
+        executor: ExecutorType = ExecutorType.thread,
+        options: Optional[ConvertOptions] = None,
+        concurrency: Optional[int] = None,
+    ):
+        """Start the worker pool."""
+        self.concurrency = concurrency or workers
+        self.pool = get_executor(executor, workers, options)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncConverter":
+        """Use the converter as an async context manager."""
+        return self
+
+    async def __aexit__(self, *args):
+        """Wait for running conversions, then stop workers."""
+        await asyncio.to_thread(self.close)
+
+    def close(self, wait: bool = True):
+        """Stop workers, cancelling pending conversions."""
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Get conversion slots (for the running event loop)."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._loop, self._slots = loop, asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    async def _run(self, job: Job) -> tuple[Union[Path, bytes], DocumentStats]:
+        """Convert a document in a worker once a slot is available."""
+        loop = asyncio.get_running_loop()
+        slots = self._semaphore()
+        await slots.acquire()
+        try:
+            future = self.pool.submit(convert_job, job)
+        except BaseException:
+            slots.release()
+            raise
+
+        def release(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(slots.release)
+
+        # Slots are released once workers are done (even if results are dropped)
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, job: Job, timeout: Optional[float] = None) -> JobResult:
+        """Convert a document, waiting at most `timeout` seconds for it.
+
+        Raises:
+            asyncio.TimeoutError: if the conversion takes longer than `timeout`.
+        """
+        output, stats = await asyncio.wait_for(self._run(job), timeout)
+        return JobResult(job, output, stats)
+
+    async def convert(
+        self,
+        pdf: Path,
+        raw: Optional[str] = None,
+        md: Optional[Path] = None,
+        css: Optional[Path] = None,
+        base_url: Optional[Path] = None,
+        extras: Optional[List[str]] = None,
+        extras_config: Optional[dict] = None,
+        context: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> DocumentStats:
+        """Converts input markdown to styled HTML and renders it to a PDF file.
+
+        See `md2pdf` for arguments, and `run` for the timeout.
+        """
+        job = Job(pdf, raw, md, css, base_url, extras, extras_config, context)
+        return cast(DocumentStats, (await self.run(job, timeout)).stats)
+
+    async def as_completed(
+        self, jobs: Iterable[Job], timeout: Optional[float] = None
+    ) -> AsyncIterator[JobResult]:
+        """Convert documents, yielding results as they complete.
+
+        Jobs are read as slots are available. A failed (or timed out) conversion
+        yields its error, and does not stop the others. Conversions still pending
+        when the iteration stops are cancelled.
+        """
+        remaining = iter(jobs)
+        pending: dict[asyncio.Future, Job] = {}
+        try:
+            while True:
+                while len(pending) < self.concurrency:
+                    job = next(remaining, None)
+                    if job is None:
+                        break
+                    pending[asyncio.ensure_future(self.run(job, timeout))] = job
+                if not pending:
+                    return
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    job = pending.pop(task)
+                    if task.exception() is not None:
+                        yield JobResult(job, error=task.exception())
+                    else:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _default_converter() -> AsyncConverter:
+    """Get the default async converter (with a pool of worker threads)."""
+    global _default  # noqa: PLW0603
+    with _default_lock:
+        if _default is None:
+            _default = AsyncConverter()
+        return _default
+
+
+async def md2pdf_async(
+    pdf: Path,
+    raw: Optional[str] = None,
+    md: Optional[Path] = None,
+    css: Optional[Path] = None,
+    base_url: Optional[Path] = None,
+    extras: Optional[List[str]] = None,
+    extras_config: Optional[dict] = None,
+    context: Optional[dict] = None,
+    timeout: Optional[float] = None,
+    converter: Optional[AsyncConverter] = None,
+) -> DocumentStats:
+    """Converts input markdown to styled HTML and renders it to a PDF file.
+
+    The conversion runs in a worker of the async converter, or of a default one
+    shared by calls (with worker threads).
+
+    Args:
+        pdf: output PDF file path.
+        md: input markdown file path.
+        raw: input markdown raw string content.
+        css: input styles path (CSS).
+        base_url: absolute base path for markdown linked content (as images).
+        extras: supplementary markdown extensions to activate
+        extras_config: a configuration dictionnary for active markdown extensions
+        context: input context to use for jinja template rendering
+        timeout: maximal duration of the conversion (in seconds)
+        converter: the async converter running the conversion
+
+    Returns:
+        The conversion statistics (stages durations, pages and output size).
+
+    Raises:
+        ValidationError: if md_content and md_file_path are empty.
+        asyncio.TimeoutError: if the conversion takes longer than `timeout`.
+    """
+    converter = converter or _default_converter()
+    return await converter.convert(
+        pdf,
+        raw=raw,
+        md=md,
+        css=css,
+        base_url=base_url,
+        extras=extras,
+        extras_config=extras_config,
+        context=context,
+        timeout=timeout,
+    )
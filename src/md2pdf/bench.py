@@ -0,0 +1,286 @@
+"""md2pdf benchmark suite.
+
+Reproducible synthetic corpora are converted with the `md2pdf` function (one
+document after the other) and the CLI batch path (with a worker pool), each run in
+a dedicated process so that its peak memory can be measured.
+"""
+
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import zlib
+from enum import Enum
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional
+
+from .cache import _version
+from .conf import BENCH_SEED
+from .exceptions import ValidationError
+from .stats import write_report
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+
+
+class Corpus(str, Enum):
+    """Benchmark corpora."""
+
+    small = "small"
+    huge = "huge"
+    tables = "tables"
+    code = "code"
+    images = "images"
+
+
+def _count(base: int, scale: float) -> int:
+    """Scale a number of items (at least one)."""
+    return max(round(base * scale), 1)
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    """Generate a random sentence."""
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    """Generate a random paragraph."""
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _table(rng: random.Random, rows: int = 40, columns: int = 5) -> str:
+    """Generate a random markdown table."""
+    lines = [
+        "| " + " | ".join(f"Column {c}" for c in range(columns)) + " |",
+        "|" + " --- |" * columns,
+    ]
+    for _ in range(rows):
+        cells = [rng.choice(WORDS)] + [
+            str(rng.randint(0, 10_000)) for _ in range(columns - 1)
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def _code(rng: random.Random, functions: int = 6) -> str:
+    """Generate a random python code block."""
+    lines = ["```python"]
+    for f in range(functions):
+        name, arg = rng.choice(WORDS), rng.choice(WORDS)
+        lines += [
+            f"def {name}_{f}({arg}, factor={rng.randint(1, 9)}):",
+            f'    """{_sentence(rng, 6)}"""',
+            f"    values = [{arg} * i for i in range({rng.randint(1, 100)})]",
+            "    if not values:",
+            f"        raise ValueError('{rng.choice(WORDS)}')",
+            "    return sum(values) / factor",
+            "",
+        ]
+    lines.append("```")
+    return "\n".join(lines)
+
+
+def _png(path: Path, rng: random.Random, size: int = 512):
+    """Write a random RGB PNG image (noise does not compress, like photos)."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = struct.pack(">I", zlib.crc32(kind + data))
+        return struct.pack(">I", len(data)) + kind + data + crc
+
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    path.write_bytes(
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_corpus(
+    corpus: Corpus, directory: Path, scale: float = 1.0, seed: int = BENCH_SEED
+) -> List[Path]:
+    """Generate a reproducible corpus of markdown files in the directory.
+
+    Corpora:
+        small: many small documents
+        huge: a single huge document
+        tables: table-heavy documents
+        code: code-heavy documents (highlighted code blocks)
+        images: image-heavy documents
+    """
+    rng = random.Random(f"{seed}-{corpus.value}")  # noqa: S311
+    directory.mkdir(parents=True, exist_ok=True)
+    documents: List[str] = []
+
+    if corpus == Corpus.small:
+        for d in range(_count(50, scale)):
+            paragraphs = (_paragraph(rng) for _ in range(3))
+            documents.append(f"# Document {d}\n\n" + "\n\n".join(paragraphs))
+    elif corpus == Corpus.huge:
+        sections = []
+        for s in range(_count(100, scale)):
+            items = "\n".join(f"- {_sentence(rng, 6)}" for _ in range(5))
+            text = "\n\n".join(_paragraph(rng) for _ in range(5))
+            sections.append(f"## Section {s}\n\n{text}\n\n{items}")
+        documents.append("# Huge document\n\n" + "\n\n".join(sections))
+    elif corpus == Corpus.tables:
+        for d in range(_count(10, scale)):
+            tables = (f"{_paragraph(rng, 2)}\n\n{_table(rng)}" for _ in range(5))
+            documents.append(f"# Tables {d}\n\n" + "\n\n".join(tables))
+    elif corpus == Corpus.code:
+        for d in range(_count(10, scale)):
+            blocks = (f"{_paragraph(rng, 2)}\n\n{_code(rng)}" for _ in range(5))
+            documents.append(f"# Code {d}\n\n" + "\n\n".join(blocks))
+    elif corpus == Corpus.images:
+        images = [directory / f"image-{i}.png" for i in range(8)]
+        for image in images:
+            _png(image, rng)
+        for d in range(_count(10, scale)):
+            figures = (
+                f"{_paragraph(rng, 2)}\n\n![Figure]({rng.choice(images).as_uri()})"
+                for _ in range(4)
+            )
+            documents.append(f"# Images {d}\n\n" + "\n\n".join(figures))
+
+    files = []
+    for d, document in enumerate(documents):
+        md = directory / f"{corpus.value}-{d:04d}.md"
+        md.write_text(document)
+        files.append(md)
+    return files
+
+
+def run_library(report: str, *files: str):
+    """Convert files one after the other with `md2pdf` (in a benchmark process)."""
+    from .core import md2pdf
+
+    started_at = perf_counter()
+    stats = [md2pdf(Path(md).with_suffix(".pdf"), md=Path(md)) for md in files]
+    with Path(report).open("w") as output:
+        write_report(output, stats, perf_counter() - started_at)
+
+
+def _peak_memory(ru_maxrss: int) -> float:
+    """Convert the maximum resident set size to MiB."""
+    return ru_maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _measure(command: List[str], report: Path) -> dict:
+    """Run a benchmark process and summarize its statistics report."""
+    peak_memory = None
+    log = report.with_suffix(".log")
+    with log.open("w") as stderr:
+        started_at = perf_counter()
+        process = subprocess.Popen(  # noqa: S603
+            command, stdout=subprocess.DEVNULL, stderr=stderr
+        )
+        if hasattr(os, "wait4"):
+            # Get the resource usage of this process only (and its workers)
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            peak_memory = _peak_memory(usage.ru_maxrss)
+        else:
+            process.wait()
+        elapsed = perf_counter() - started_at
+    if process.returncode != 0:
+        raise RuntimeError(f"Benchmark process failed: {log.read_text()}")
+
+    batch = json.loads(report.read_text().splitlines()[-1])
+    if batch["failed"]:
+        raise RuntimeError(f"{batch['failed']} benchmark documents failed")
+    return {
+        "documents": batch["documents"],
+        "pages": batch["pages"],
+        "elapsed": elapsed,
+        "throughput": batch["throughput"]["documents"],
+        "pages_throughput": batch["throughput"]["pages"],
+        "peak_memory": peak_memory,
+        "duration": {q: batch["duration"][q] for q in ("p50", "p95")},
+        "stages": {
+            stage: {q: values[q] for q in ("p50", "p95")}
+            for stage, values in batch["stages"].items()
+        },
+    }
+
+
+def run(
+    corpora: List[Corpus],
+    directory: Path,
+    scale: float = 1.0,
+    workers: int = 4,
+    executor: str = "thread",
+) -> dict:
+    """Benchmark the library and the CLI batch path with each corpus."""
+    results = {}
+    for corpus in corpora:
+        files = [str(md) for md in make_corpus(corpus, directory / corpus.value, scale)]
+        report = directory / f"{corpus.value}.jsonl"
+
+        results[f"library/{corpus.value}"] = _measure(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "import sys; from md2pdf.bench import run_library; "
+                    "run_library(*sys.argv[1:])"
+                ),
+                str(report),
+                *files,
+            ],
+            report,
+        )
+        results[f"cli/{corpus.value}"] = _measure(
+            [sys.executable, "-m", "md2pdf", "--no-cache", "--stats", str(report)]
+            + ["--workers", str(workers), "--executor", executor]
+            + [arg for md in files for arg in ("-i", md)],
+            report,
+        )
+    return {
+        "environment": {
+            "md2pdf": _version("md2pdf"),
+            "weasyprint": _version("weasyprint"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scale": scale,
+        "workers": workers,
+        "executor": executor,
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """List throughput and peak memory regressions beyond the tolerance (ratio)."""
+    if results["scale"] != baseline["scale"]:
+        raise ValidationError(
+            f"Baseline scale ({baseline['scale']}) differs from the benchmark "
+            f"one ({results['scale']})"
+        )
+    regressions = []
+    for name, result in results["results"].items():
+        reference: Optional[dict] = baseline["results"].get(name)
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {result['throughput']:.2f} documents/s "
+                f"(baseline: {reference['throughput']:.2f})"
+            )
+        if (
+            result["peak_memory"] is not None
+            and reference["peak_memory"] is not None
+            and result["peak_memory"] > reference["peak_memory"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"{name}: peak memory {result['peak_memory']:.1f} MiB "
+                f"(baseline: {reference['peak_memory']:.1f})"
+            )
+    return regressions
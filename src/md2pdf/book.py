@@ -0,0 +1,200 @@
+"""md2pdf books: combine markdown chapters into a single PDF, incrementally.
+
+Chapters are laid out separately and the laid out pages (WeasyPrint documents) are
+kept in memory: when a book is built again (_e.g._ in watch mode), only changed
+chapters are laid out before pages are combined into the output PDF.
+"""
+
+import logging
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, List, Optional
+
+from .cache import MemoryCache, _digest, render_key
+from .conf import BOOK_MEMORY_CACHE_SIZE
+from .core import PAGE_COUNTERS, TOTAL_PAGES, Converter, read_markdown
+from .deps import Dependencies, changed, depend, record
+from .stats import DocumentStats
+
+if TYPE_CHECKING:
+    from weasyprint import Document
+
+logger = logging.getLogger(__name__)
+
+
+class Book:
+    """A book made of markdown chapters, built incrementally.
+
+    Laid out chapters are kept in memory, keyed by their HTML, the stylesheet and
+    their page numbers (when the stylesheet uses page counters): a chapter is laid
+    out again only if it has changed, if its page numbers have, or if files it
+    loaded (_e.g._ images) have. Each chapter starts on a new page.
+
+    A book is not thread-safe: it uses a single converter.
+    """
+
+    def __init__(
+        self, converter: Optional[Converter] = None, size: int = BOOK_MEMORY_CACHE_SIZE
+    ):
+        """Initialize the chapters cache."""
+        self.converter = converter or Converter()
+        self._chapters: MemoryCache[tuple["Document", Dependencies]] = MemoryCache(size)
+        # Number of pages of the last build: the `pages` counter of the next build
+        # is likely to be the same
+        self._total_pages: Optional[int] = None
+        # Number of chapters laid out during the last build
+        self.laid_out = 0
+
+    def _chapter(
+        self,
+        html: str,
+        css: Optional[Path],
+        base_url: Optional[Path],
+        page_offset: int,
+        total_pages: Optional[int],
+    ) -> "Document":
+        """Get the laid out chapter, from the cache if it has not changed."""
+        signature = None
+        if css is not None:
+            stat = css.stat()
+            signature = (str(css.resolve()), stat.st_mtime_ns, stat.st_size)
+        key = (
+            _digest(html.encode()),
+            signature,
+            str(base_url),
+            page_offset,
+            total_pages,
+        )
+        cached = self._chapters.get(key)
+        if cached is not None and not changed(cached[1]):
+            depend(cached[1])
+            return cached[0]
+
+        # Images, fonts… loaded by the chapter
+        with record() as dependencies:
+            stylesheets = self.converter.paged_stylesheets(
+                css, page_offset, total_pages
+            )
+            document = self.converter.layout(html, stylesheets, base_url)
+        self._chapters.put(key, (document, dependencies))
+        self.laid_out += 1
+        return document
+
+    def _layout(
+        self,
+        chapters: List[str],
+        css: Optional[Path],
+        base_url: Optional[Path],
+        numbered: bool,
+        total_pages: Optional[int],
+    ) -> List["Document"]:
+        """Lay out chapters (HTML), offsetting page numbers if they are `numbered`."""
+        documents = []
+        offset = 0
+        for html in chapters:
+            document = self._chapter(
+                html, css, base_url, offset if numbered else 0, total_pages
+            )
+            documents.append(document)
+            offset += len(document.pages)
+        return documents
+
+    def build(
+        self,
+        pdf: Path,
+        chapters: List[Path],
+        css: Optional[Path] = None,
+        base_url: Optional[Path] = None,
+        extras: Optional[List[str]] = None,
+        extras_config: Optional[dict] = None,
+        context: Optional[dict] = None,
+    ) -> DocumentStats:
+        """Build the book PDF from its chapters (markdown files, in order).
+
+        When the stylesheet uses the `pages` counter and the book pages count has
+        changed, chapters are laid out twice: first to count pages, then with the
+        total number of pages.
+
+        See `md2pdf` for other arguments.
+        """
+        converter = self.converter
+        stats = converter.stats = DocumentStats(
+            input=", ".join(map(str, chapters)), output=str(pdf)
+        )
+        started_at = perf_counter()
+        self.laid_out = 0
+        try:
+            with record() as dependencies:
+                key = self._build(
+                    stats, pdf, chapters, css, base_url, extras, extras_config, context
+                )
+            stats.dependencies = dependencies
+            stats.size = pdf.stat().st_size
+
+            if key is not None and converter.cache is not None and not stats.cached:
+                with stats.stage("cache"):
+                    converter.cache.put(key, pdf, dependencies)
+        finally:
+            stats.duration = perf_counter() - started_at
+            converter.stats = None
+        return stats
+
+    def _build(
+        self,
+        stats: DocumentStats,
+        pdf: Path,
+        chapters: List[Path],
+        css: Optional[Path],
+        base_url: Optional[Path],
+        extras: Optional[List[str]],
+        extras_config: Optional[dict],
+        context: Optional[dict],
+    ) -> Optional[str]:
+        """Run build stages, and get the book render cache key (if any)."""
+        converter = self.converter
+        with stats.stage("read"):
+            raws = [read_markdown(md=chapter) for chapter in chapters]
+
+        key = None
+        if converter.cache is not None:
+            with stats.stage("cache"):
+                # Chapters sizes tell chapters boundaries apart
+                variant = {
+                    "book": [len(raw) for raw in raws],
+                    **converter.image_options.variant,
+                }
+                key = render_key(
+                    "".join(raws),
+                    css,
+                    base_url,
+                    extras,
+                    extras_config,
+                    context,
+                    variant,
+                )
+                stats.cached = converter.cache.get(key, pdf)
+            if stats.cached:
+                depend(converter.cache.dependencies(key))
+                return key
+
+        html = [
+            converter.md2html(
+                raw, extras=extras, extras_config=extras_config, context=context
+            )
+            for raw in raws
+        ]
+        text = css.read_text() if css is not None else ""
+        numbered = PAGE_COUNTERS.search(text) is not None
+        total_pages = self._total_pages if TOTAL_PAGES.search(text) else None
+        documents = self._layout(html, css, base_url, numbered, total_pages)
+        pages = [page for document in documents for page in document.pages]
+        if TOTAL_PAGES.search(text) and len(pages) != total_pages:
+            # Lay out chapters again with the right `pages` counter
+            documents = self._layout(html, css, base_url, numbered, len(pages))
+            pages = [page for document in documents for page in document.pages]
+        self._total_pages = len(pages)
+        logger.debug("Laid out %d/%d chapters", self.laid_out, len(chapters))
+        stats.pages = len(pages)
+        with stats.stage("pdf"):
+            converter.document2pdf(documents[0].copy(pages), pdf)
+        return key
@@ -0,0 +1,323 @@
+"""md2pdf render cache."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version as metadata_version
+from pathlib import Path
+from typing import Generic, Hashable, Iterator, List, Optional, TypeVar
+
+from .conf import CACHE_MAX_SIZE
+from .deps import Dependencies, changed, paused
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+def _version(package: str) -> str:
+    """Get installed package version."""
+    try:
+        return metadata_version(package)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _digest(*parts: bytes) -> str:
+    """Hash parts into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        # Prefix each part by its length so that parts cannot be confused
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _dumps(*values) -> bytes:
+    """Serialize values for hashing."""
+    return json.dumps(values, sort_keys=True, default=str).encode()
+
+
+def render_key(
+    raw: str,
+    css: Optional[Path] = None,
+    base_url: Optional[Path] = None,
+    extras: Optional[List[str]] = None,
+    extras_config: Optional[dict] = None,
+    context: Optional[dict] = None,
+    variant: Optional[dict] = None,
+) -> str:
+    """Compute the cache key of a rendered document.
+
+    The key is a hash of everything that may change the output PDF: the markdown
+    source (including its frontmatter), the stylesheet content and location (its
+    relative URLs resolve against it), markdown extensions and their configuration,
+    the template context and the versions of the packages rendering the document.
+    Rendering options (_e.g._ split rendering) are given as a `variant`.
+    """
+    return _digest(
+        raw.encode(),
+        css.read_bytes() if css else b"",
+        str(css.resolve()).encode() if css else b"",
+        str(base_url or Path.cwd()).encode(),
+        _dumps(
+            extras or [],
+            extras_config or {},
+            context or {},
+            *([variant] if variant else []),
+        ),
+        _version("md2pdf").encode(),
+        _version("weasyprint").encode(),
+        _version("markdown").encode(),
+        _version("pymdown-extensions").encode(),
+        _version("pygments").encode(),
+    )
+
+
+def html_key(
+    raw: str,
+    extras: Optional[List[str]] = None,
+    extras_config: Optional[dict] = None,
+    context: Optional[dict] = None,
+) -> str:
+    """Compute the cache key of a document HTML (before styles and layout)."""
+    return _digest(
+        raw.encode(),
+        _dumps(extras or [], extras_config or {}, context or {}),
+        _version("md2pdf").encode(),
+        _version("markdown").encode(),
+        _version("pymdown-extensions").encode(),
+        _version("pygments").encode(),
+    )
+
+
+class MemoryCache(Generic[V]):
+    """A least recently used in-memory cache."""
+
+    def __init__(self, max_size: int):
+        """Initialize the cache."""
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Get the number of entries."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Get an entry, or None if it is missing."""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: V):
+        """Store an entry, evicting the least recently used one if needed."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def _link(src: Path, dst: Path):
+    """Hard link src to dst (or copy it when linking is not possible)."""
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class RenderCache:
+    """A content-addressed on-disk cache of rendered PDF files.
+
+    Cached files are hard linked to (or copied as) output files. Least recently
+    used entries are evicted when the cache exceeds its maximal size (in bytes).
+
+    Files loaded while rendering an entry (_e.g._ images) are not part of its key:
+    their signatures are stored next to the entry, which is ignored once one of
+    them has changed.
+
+    Entries share their inode with the output files they are linked to, so their
+    use is recorded on a sidecar file: touching the entry itself would change the
+    modification time of these outputs (and fool `--make`).
+    """
+
+    suffix: str = ".pdf"
+
+    def __init__(self, directory: Path, max_size: int = CACHE_MAX_SIZE):
+        """Initialize the cache directory."""
+        self.directory = directory
+        self.max_size = max_size
+        self._size: Optional[int] = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        """Get cache entry path."""
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def _dependencies_path(self, key: str) -> Path:
+        """Get the path of the entry dependencies signatures."""
+        entry = self.path(key)
+        return entry.with_name(f"{entry.name}.deps")
+
+    def touch(self, entry: Path):
+        """Mark an entry as recently used."""
+        entry.with_name(f"{entry.name}.used").touch()
+
+    def _used(self, stat: os.stat_result, entry: Path) -> int:
+        """Get the time an entry was last used (in nanoseconds)."""
+        try:
+            used = entry.with_name(f"{entry.name}.used").stat().st_mtime_ns
+        except FileNotFoundError:
+            return stat.st_mtime_ns
+        return max(stat.st_mtime_ns, used)
+
+    def dependencies(self, key: str) -> Dependencies:
+        """Get the dependencies of an entry (with their recorded signatures)."""
+        try:
+            with paused():
+                return json.loads(self._dependencies_path(key).read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _changed(self, key: str) -> bool:
+        """Check whether dependencies of an entry have changed."""
+        if changed(self.dependencies(key)):
+            logger.debug("Dependencies of cache entry %s have changed", key)
+            return True
+        return False
+
+    def get(self, key: str, target: Path) -> bool:
+        """Copy a cached entry to the target path, return False if it is missing.
+
+        Entries whose dependencies have changed are missing.
+        """
+        entry = self.path(key)
+        if self._changed(key):
+            return False
+        try:
+            with paused():
+                _link(entry, target)
+                self.touch(entry)
+        except FileNotFoundError:
+            return False
+        logger.debug("Cache hit for %s (%s)", target, key)
+        return True
+
+    def put(self, key: str, source: Path, dependencies: Optional[Dependencies] = None):
+        """Store the source file as a cache entry (with its dependencies)."""
+        self._put_dependencies(key, dependencies)
+        with self._tmp(key) as tmp, paused():
+            _link(source, tmp)
+
+    def _put_dependencies(self, key: str, dependencies: Optional[Dependencies]):
+        """Store (or remove) signatures of the entry dependencies."""
+        path = self._dependencies_path(key)
+        if not dependencies:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(exist_ok=True)
+        fd, name = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+        with os.fdopen(fd, "w") as tmp:
+            json.dump(dependencies, tmp)
+        Path(name).replace(path)
+
+    @contextmanager
+    def _tmp(self, key: str) -> Iterator[Path]:
+        """Write a temporary file, then atomically move it to the cache entry.
+
+        Other workers may be reading the entry while it is replaced.
+        """
+        entry = self.path(key)
+        entry.parent.mkdir(exist_ok=True)
+        fd, name = tempfile.mkstemp(suffix=".tmp", dir=entry.parent)
+        os.close(fd)
+        tmp = Path(name)
+        try:
+            yield tmp
+            tmp.replace(entry)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += entry.stat().st_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def entries(self) -> list[tuple[os.stat_result, Path]]:
+        """List cache entries with their stats."""
+        entries = []
+        for entry in self.directory.glob(f"*/*{self.suffix}"):
+            try:
+                entries.append((entry.stat(), entry))
+            except FileNotFoundError:
+                # Evicted in the meantime by another worker
+                continue
+        return entries
+
+    def size(self) -> int:
+        """Get cache size (in bytes)."""
+        return sum(stat.st_size for stat, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its max size."""
+        entries = sorted(self.entries(), key=lambda item: self._used(*item))
+        size = sum(stat.st_size for stat, _ in entries)
+        for stat, entry in entries:
+            if size <= self.max_size:
+                break
+            logger.debug("Evicting cache entry %s", entry)
+            entry.unlink(missing_ok=True)
+            self._unlink_sidecars(entry)
+            size -= stat.st_size
+        self._size = size
+
+    def clear(self):
+        """Remove all cache entries."""
+        for _, entry in self.entries():
+            entry.unlink(missing_ok=True)
+            self._unlink_sidecars(entry)
+        self._size = 0
+
+    @staticmethod
+    def _unlink_sidecars(entry: Path):
+        """Remove the dependencies and usage files stored next to an entry."""
+        for suffix in (".deps", ".used"):
+            entry.with_name(f"{entry.name}{suffix}").unlink(missing_ok=True)
+
+
+class HTMLCache(RenderCache):
+    """An on-disk cache of documents HTML rendered from markdown sources.
+
+    Cached HTML is independent from stylesheets: when only styles change, the
+    frontmatter, Jinja and markdown stages are skipped.
+    """
+
+    suffix: str = ".html"
+
+    def load(self, key: str) -> Optional[str]:
+        """Get cached HTML, or None if it is missing (or its dependencies changed)."""
+        entry = self.path(key)
+        if self._changed(key):
+            return None
+        try:
+            with paused():
+                html = entry.read_text()
+                self.touch(entry)
+        except FileNotFoundError:
+            return None
+        return html
+
+    def store(self, key: str, html: str, dependencies: Optional[Dependencies] = None):
+        """Store HTML as a cache entry (with its dependencies, _e.g._ snippets)."""
+        self._put_dependencies(key, dependencies)
+        with self._tmp(key) as tmp:
+            tmp.write_text(html)
@@ -2,12 +2,20 @@
 
 import json
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import shutil
+import sys
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from contextlib import ExitStack
 from datetime import datetime
+from enum import Enum
+from functools import partial
 from importlib.metadata import version as metadata_version
 from pathlib import Path
+from queue import Queue
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
 from time import time
-from typing import Annotated, List, Optional
+from typing import TYPE_CHECKING, Annotated, Callable, List, Optional, TextIO, cast
 
 try:
     import typer
@@ -17,24 +25,73 @@ except ModuleNotFoundError as err:
         "`pip install md2pdf[cli]`"
     ) from err
 from rich.console import Console
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TaskID,
-    TextColumn,
-    TimeElapsedColumn,
-)
-from watchfiles import watch as wf_watch
 
-from .conf import CLI_WATCH_FORCE_POOLING
-from .core import md2pdf
+from .bench import Corpus, compare
+from .bench import run as run_benchmark
+from .cache import RenderCache, render_key
+from .conf import (
+    BENCH_TOLERANCE,
+    CLI_WATCH_COALESCE,
+    CLI_WATCH_DEBOUNCE,
+    CLI_WATCH_FORCE_POLLING,
+    CLI_WATCH_STALE_CHECK_INTERVAL,
+    MERGE_PENDING_ROWS_PER_WORKER,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_QUEUE_SIZE,
+    SERVER_TIMEOUT,
+    SPLIT_CHUNKS_PER_WORKER,
+)
+from .deps import Dependencies, DependencyIndex, absolute, signature
 from .exceptions import ValidationError
+from .images import ImageOptions
+from .inputs import Manifest, find_inputs, is_pattern, manifest_path, mirror
+from .memory import WorkerLimits
+from .merge import output_path, read_rows
+from .pool import (
+    ConvertOptions,
+    ExecutorType,
+    Job,
+    auto_workers,
+    convert_job,
+    get_converter,
+    get_executor,
+    new_converter,
+    worker_task,
+)
+from .preview import Preview
+from .schedule import HISTORY_FILE, History
+from .stats import DocumentStats, write_report
+
+if TYPE_CHECKING:
+    from rich.progress import Progress, TaskID
+
+    from .book import Book
+    from .core import Converter
+
+# Heavy dependencies (WeasyPrint, markdown, Jinja, rich progress, watchfiles…) are
+# only imported when they are needed: program version, help or usage errors should
+# not wait for them.
 
 logger = logging.getLogger(__name__)
 
 cli = typer.Typer(name="md2pdf", no_args_is_help=True, pretty_exceptions_short=True)
 console = Console()
 
+# Standard input (or output) path
+STDIO = Path("-")
+
+
+class SplitLevel(str, Enum):
+    """Headings to split documents at."""
+
+    h1 = "h1"
+    h2 = "h2"
+    h3 = "h3"
+    h4 = "h4"
+    h5 = "h5"
+    h6 = "h6"
+
 
 def parse_config(config: str) -> dict:
     """Parse configuration input as a JSON string."""
@@ -47,68 +104,490 @@ def parse_config(config: str) -> dict:
     return parsed
 
 
-def _run_with_progress(
-    progress: Progress,
-    task: TaskID,
-    md_: Path,
-    pdf: Path,
-    css: Optional[Path] = None,
-    extras: Optional[list[str]] = None,
-    extras_config: Optional[dict] = None,
-):
-    """A wrapper for md2pdf thread execution with task progress update."""
-    progress.start_task(task)
-    md2pdf(
+def parse_workers(workers: str) -> Optional[int]:
+    """Parse the number of workers: a positive integer, or `auto` (None)."""
+    if str(workers) == "auto":
+        return None
+    try:
+        parsed = int(workers)
+    except ValueError:
+        parsed = 0
+    if parsed < 1:
+        raise typer.BadParameter("should be a positive integer, or `auto`")
+    return parsed
+
+
+def parse_input(path: str) -> Path:
+    """Parse a markdown input: an existing path, a glob pattern or `-` (stdin)."""
+    if path != str(STDIO) and not is_pattern(path) and not Path(path).exists():
+        raise typer.BadParameter(f"Path '{path}' does not exist.")
+    return Path(path)
+
+
+def parse_pages(pages: str) -> Preview:
+    """Parse a preview of pages: `FIRST-LAST`, or a single page."""
+    first, _, last = str(pages).partition("-")
+    try:
+        return Preview(pages=(int(first), int(last or first)))
+    except (ValidationError, ValueError) as err:
+        raise typer.BadParameter(
+            "should be a page (from 1), or a range of pages"
+        ) from err
+
+
+@worker_task
+def _convert(
+    md_: Path, pdf: Path, options: ConvertOptions, preview: Optional[Preview] = None
+) -> DocumentStats:
+    """Convert a markdown file (or a part of it) in a worker and return its stats."""
+    return get_converter().convert(
         pdf,
         md=md_,
-        css=css,
+        css=options.css,
         base_url=Path.cwd(),
-        extras=extras if extras else None,
-        extras_config=extras_config,
+        extras=options.extras if options.extras else None,
+        extras_config=options.extras_config,
+        preview=preview,
+    )
+
+
+def _start_workers(
+    progress: "Progress",
+    pool: Executor,
+    md: List[Path],
+    pdf: Optional[Path],
+    options: ConvertOptions,
+    report: Optional[TextIO] = None,
+    stale: Optional[Event] = None,
+    history: Optional[History] = None,
+    outputs: Optional[dict[Path, Path]] = None,
+    manifest: Optional[Manifest] = None,
+    preview: Optional[Preview] = None,
+    superseded: Optional[List[Path]] = None,
+) -> List[DocumentStats]:
+    """Run convertion in a worker pool with progress.
+
+    Up to date documents (according to the manifest, if any) are skipped.
+    Documents found in the render cache are not sent to workers, and identical
+    documents are rendered only once. Other documents are sent to workers by
+    decreasing estimated cost, from their conversion history (updated with their
+    durations). Documents statistics are written to the report (if any). When the
+    `stale` event is set (input files have changed again), renders that have not
+    started yet are cancelled, and their documents added to `superseded`. Previews
+    (parts of documents) are neither cached nor recorded in the history, and are
+    written next to output files (see `_output_path`).
+    """
+    started_at = time()
+    cache = (
+        RenderCache(options.cache_dir)
+        if options.cache_dir and preview is None
+        else None
+    )
+    # Previews durations are not recorded
+    history = history if history is not None and preview is None else History()
+    superseded = [] if superseded is None else superseded
+    tasks: list["TaskID"] = []
+    stats: list[DocumentStats] = []
+    # Documents to generate from each render key: (task, md, pdf)
+    renders: dict[str, list[tuple["TaskID", Path, Path]]] = {}
+    jobs: dict[Future, list[tuple["TaskID", Path, Path]]] = {}
+
+    pdfs = {md_: _output_path(md_, pdf, outputs, preview is not None) for md_ in md}
+    options_key = render_key(
+        "",
+        options.css,
+        Path.cwd(),
+        options.extras,
+        options.extras_config,
+        variant=options.images.variant,
     )
+    fresh = _up_to_date(manifest, pdfs, options_key)
+    with progress:
+        for md_ in md:
+            pdf_ = pdfs[md_]
+            if md_ in fresh:
+                stats.append(_cached_stats(md_, pdf_, fresh[md_]))
+                continue
+            task = progress.add_task("convert", md=md_, pdf=pdf_, total=1)
+            tasks.append(task)
+
+            key = render_key(
+                md_.read_text(),
+                options.css,
+                Path.cwd(),
+                options.extras,
+                options.extras_config,
+                variant=options.images.variant,
+            )
+            if cache is not None and cache.get(key, pdf_):
+                stats.append(_cached_stats(md_, pdf_, cache.dependencies(key)))
+                progress.update(task, completed=True)
+                continue
+            renders.setdefault(key, []).append((task, md_, pdf_))
+
+        # Longest documents first, so that workers finish at the same time
+        costs = history.costs(documents[0][1] for documents in renders.values())
+        for documents in sorted(
+            renders.values(), key=lambda documents: costs[documents[0][1]], reverse=True
+        ):
+            _, md_, pdf_ = documents[0]
+            jobs[pool.submit(_convert, md_, pdf_, options, preview)] = documents
+
+        # Workers send their results back: update progress as they come
+        cancelled: list[Future] = []
+        pending = set(jobs)
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=CLI_WATCH_STALE_CHECK_INTERVAL if stale is not None else None,
+                return_when=FIRST_COMPLETED,
+            )
+            if stale is not None and stale.is_set() and not cancelled:
+                # Running renders cannot be interrupted: they are waited for so that
+                # they do not overwrite the next ones
+                cancelled = [future for future in pending if future.cancel()]
+            for future in done:
+                if not future.cancelled():
+                    _collect(progress, future, jobs[future], stats)
+
+    history.record(stats)
+    history.save()
+    if manifest is not None:
+        manifest.record(stats, options_key)
+        manifest.save()
+    elapsed = time() - started_at
+    if cancelled:
+        console.print(f"⏭️ Cancelled {len(cancelled)} superseded renders")
+        superseded.extend(md_ for future in cancelled for _, md_, _ in jobs[future])
+    console.print(f"🚀 Output files generated in [blue]{elapsed:.3f}s[/]")
+    if report is not None:
+        write_report(report, stats, elapsed)
+
+    # Clean tasks
+    for task in tasks:
+        progress.remove_task(task)
+    return stats
+
+
+def _collect(
+    progress: "Progress",
+    future: Future,
+    documents: list[tuple["TaskID", Path, Path]],
+    stats: list[DocumentStats],
+):
+    """Collect a worker result: the rendered document and its duplicates."""
+    (task, md_, pdf_), *duplicates = documents
+    if (err := future.exception()) is not None:
+        console.print(f"❌ Failed to convert [red]{md_}[/red]: {err}")
+        stats.extend(
+            DocumentStats(input=str(m), output=str(p), error=str(err))
+            for _, m, p in documents
+        )
+        return
+    stats.append(future.result())
     progress.update(task, completed=True)
+    for duplicate, duplicate_md, duplicate_pdf in duplicates:
+        if duplicate_pdf != pdf_:
+            shutil.copyfile(pdf_, duplicate_pdf)
+        # Duplicates depend on their own markdown file, not on the rendered one
+        dependencies = dict(future.result().dependencies)
+        dependencies.pop(str(absolute(md_)), None)
+        dependencies[str(absolute(duplicate_md))] = signature(duplicate_md)
+        stats.append(_cached_stats(duplicate_md, duplicate_pdf, dependencies))
+        progress.update(duplicate, completed=True)
+
+
+def _stream(
+    pool: Executor,
+    md_: Path,
+    pdf: Path,
+    options: ConvertOptions,
+    report: Optional[TextIO] = None,
+) -> DocumentStats:
+    """Convert a document read from stdin, or written to stdout (as PDF bytes).
+
+    Streams are read and written by the main process: workers get the markdown
+    content and send PDF bytes back, without intermediate files.
+    """
+    started_at = time()
+    job = Job(
+        pdf=None if pdf == STDIO else pdf,
+        raw=sys.stdin.read() if md_ == STDIO else None,
+        md=None if md_ == STDIO else md_,
+        css=options.css,
+        base_url=Path.cwd(),
+        extras=options.extras if options.extras else None,
+        extras_config=options.extras_config,
+    )
+    try:
+        output, stats = pool.submit(convert_job, job).result()
+    except Exception as err:
+        console.print(f"❌ Failed to convert [red]{md_}[/red]: {err}")
+        raise typer.Exit(code=1) from err
+    if isinstance(output, bytes):
+        sys.stdout.buffer.write(output)
+        sys.stdout.buffer.flush()
+    elapsed = time() - started_at
+    console.print(f"🚀 Output file generated in [blue]{elapsed:.3f}s[/]")
+    if report is not None:
+        write_report(report, [stats], elapsed)
+    return stats
 
 
-def _start_threads(
-    progress: Progress,
+def _split(
+    progress: "Progress",
+    pool: Executor,
     workers: int,
     md: List[Path],
-    pdf: Optional[Path] = None,
-    css: Optional[Path] = None,
-    extras: Optional[list[str]] = None,
-    extras_config: Optional[dict] = None,
-):
-    """Run convertion in threads with progress."""
+    pdf: Optional[Path],
+    options: ConvertOptions,
+    level: SplitLevel,
+    converter: "Converter",
+    report: Optional[TextIO] = None,
+    stale: Optional[Event] = None,
+    outputs: Optional[dict[Path, Path]] = None,
+    superseded: Optional[List[Path]] = None,
+) -> List[DocumentStats]:
+    """Convert documents one after the other, laying out their chunks in parallel.
+
+    When the `stale` event is set (input files have changed again), remaining
+    documents are not converted, and added to `superseded`.
+    """
+    from .split import split_convert
+
     started_at = time()
-    tasks = []
+    cache = RenderCache(options.cache_dir) if options.cache_dir else None
+    tasks: list["TaskID"] = []
+    stats: list[DocumentStats] = []
     with progress:
-        with ThreadPoolExecutor(max_workers=workers) as pool:
-            for md_ in md:
-                pdf_ = md_.with_suffix(".pdf") if pdf is None else pdf
-                task = progress.add_task(
-                    "convert", md=md_, pdf=pdf_, total=1, start=False
-                )
-                pool.submit(
-                    _run_with_progress,
-                    progress,
-                    task,
-                    md_,
-                    pdf_,
-                    css,
-                    extras,
-                    extras_config,
+        for index, md_ in enumerate(md):
+            if stale is not None and stale.is_set():
+                console.print(f"⏭️ Cancelled {len(md) - index} superseded renders")
+                if superseded is not None:
+                    superseded.extend(md[index:])
+                break
+            pdf_ = _output_path(md_, pdf, outputs)
+            task = progress.add_task("convert", md=md_, pdf=pdf_, total=1)
+            tasks.append(task)
+            try:
+                stats.append(
+                    split_convert(
+                        pool,
+                        pdf_,
+                        md=md_,
+                        css=options.css,
+                        base_url=Path.cwd(),
+                        extras=options.extras if options.extras else None,
+                        extras_config=options.extras_config,
+                        level=int(level.value[1]),
+                        chunks=workers * SPLIT_CHUNKS_PER_WORKER,
+                        cache=cache,
+                        converter=converter,
+                    )
                 )
-                tasks.append(task)
+            except Exception as err:
+                console.print(f"❌ Failed to convert [red]{md_}[/red]: {err}")
+                stats.append(DocumentStats(str(md_), str(pdf_), error=str(err)))
+                continue
+            progress.update(task, completed=True)
 
-    console.print(f"🚀 Output files generated in [blue]{(time() - started_at):.3f}s[/]")
+    elapsed = time() - started_at
+    console.print(f"🚀 Output files generated in [blue]{elapsed:.3f}s[/]")
+    if report is not None:
+        write_report(report, stats, elapsed)
 
     # Clean tasks
     for task in tasks:
         progress.remove_task(task)
+    return stats
+
+
+def _build_book(
+    progress: "Progress",
+    book: "Book",
+    chapters: List[Path],
+    pdf: Path,
+    options: ConvertOptions,
+    report: Optional[TextIO] = None,
+    md: Optional[List[Path]] = None,
+    stale: Optional[Event] = None,
+    superseded: Optional[List[Path]] = None,
+) -> List[DocumentStats]:
+    """Build the book from its chapters, laying out changed chapters only.
+
+    The book is always built from all its chapters: changed files (`md`) are
+    ignored, and so is the `stale` event (a build is not interrupted, and no
+    chapter is `superseded`).
+    """
+    started_at = time()
+    stats: list[DocumentStats] = []
+    with progress:
+        task = progress.add_task(
+            "convert", md=f"{len(chapters)} chapters", pdf=pdf, total=1
+        )
+        try:
+            stats.append(
+                book.build(
+                    pdf,
+                    chapters,
+                    css=options.css,
+                    base_url=Path.cwd(),
+                    extras=options.extras if options.extras else None,
+                    extras_config=options.extras_config,
+                )
+            )
+        except Exception as err:
+            console.print(f"❌ Failed to build [red]{pdf}[/red]: {err}")
+            stats.append(DocumentStats(None, str(pdf), error=str(err)))
+        else:
+            progress.update(task, completed=True)
+
+    elapsed = time() - started_at
+    if not stats[0].cached and stats[0].error is None:
+        console.print(f"📚 {book.laid_out}/{len(chapters)} chapters laid out")
+    console.print(f"🚀 Output files generated in [blue]{elapsed:.3f}s[/]")
+    if report is not None:
+        write_report(report, stats, elapsed)
+    progress.remove_task(task)
+    return stats
+
+
+def _up_to_date(
+    manifest: Optional[Manifest], pdfs: dict[Path, Path], options_key: str
+) -> dict[Path, Dependencies]:
+    """Get up to date documents according to the manifest (if any)."""
+    if manifest is None:
+        return {}
+    fresh = manifest.fresh(pdfs.items(), options_key)
+    if fresh:
+        console.print(f"⏭️ {len(fresh)} documents are up to date")
+    return fresh
+
+
+def _output_path(
+    md_: Path,
+    pdf: Optional[Path],
+    outputs: Optional[dict[Path, Path]] = None,
+    preview: bool = False,
+) -> Path:
+    """Get the output PDF path of a markdown file (creating its directory).
+
+    Previews are written next to output files (`<name>.preview.pdf`): partial
+    documents do not replace them, a later `--make` run would find them up to date.
+    """
+    if pdf is None and outputs is not None and md_ in outputs:
+        outputs[md_].parent.mkdir(parents=True, exist_ok=True)
+        pdf = outputs[md_]
+    elif pdf is None:
+        pdf = md_.with_suffix(".pdf")
+    return pdf.with_suffix(f".preview{pdf.suffix}") if preview else pdf
+
+
+def _cached_stats(
+    md_: Path, pdf: Path, dependencies: Optional[Dependencies] = None
+) -> DocumentStats:
+    """Get statistics of a document generated without being rendered."""
+    return DocumentStats(
+        input=str(md_),
+        output=str(pdf),
+        size=pdf.stat().st_size,
+        cached=True,
+        dependencies=dependencies or {},
+    )
+
+
+@worker_task
+def _convert_row(
+    raw: str, pdf: Path, row: dict, options: ConvertOptions
+) -> DocumentStats:
+    """Render a template with a data row in a worker."""
+    return get_converter().convert(
+        pdf,
+        raw=raw,
+        css=options.css,
+        base_url=Path.cwd(),
+        extras=options.extras if options.extras else None,
+        extras_config=options.extras_config,
+        context=row,
+    )
 
 
-def _get_progress(console: Console) -> Progress:
+def _merge(
+    progress: "Progress",
+    pool: Executor,
+    workers: int,
+    md: Path,
+    data: Path,
+    pattern: str,
+    options: ConvertOptions,
+    report: Optional[TextIO] = None,
+):
+    """Render the markdown template with each data row in a worker pool.
+
+    Rows are read lazily: only a few rows per worker are pending at a time.
+    """
+    started_at = time()
+    raw = md.read_text()
+    pending: dict[Future, tuple[int, Path]] = {}
+    stats: list[DocumentStats] = []
+    rendered, failed = 0, 0
+
+    def collect(done):
+        nonlocal rendered, failed
+        for future in done:
+            index, pdf = pending.pop(future)
+            if (err := future.exception()) is not None:
+                console.print(f"❌ Failed to render data row [red]{index}[/red]: {err}")
+                stats.append(DocumentStats(str(md), str(pdf), error=str(err)))
+                failed += 1
+                continue
+            stats.append(future.result())
+            rendered += 1
+            progress.advance(task)
+
+    with progress:
+        task = progress.add_task("merge", md=md, pdf=pattern, total=None)
+        for index, row in enumerate(read_rows(data), start=1):
+            pdf = output_path(pattern, row, index)
+            pdf.parent.mkdir(parents=True, exist_ok=True)
+            pending[pool.submit(_convert_row, raw, pdf, row, options)] = (index, pdf)
+            if len(pending) >= workers * MERGE_PENDING_ROWS_PER_WORKER:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+        progress.update(task, total=rendered)
+
+    elapsed = time() - started_at
+    console.print(
+        f"🚀 {rendered} output files generated in [blue]{elapsed:.3f}s[/]"
+        + (f" ([red]{failed} failed[/red])" if failed else "")
+    )
+    if report is not None:
+        write_report(report, stats, elapsed)
+
+
+def _get_merge_progress(console: Console) -> "Progress":
+    """Get rich progress component for mail merge."""
+    from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
+    return Progress(
+        SpinnerColumn(finished_text="✅"),
+        TextColumn(
+            "Merging: [blue]{task.fields[md]}[/blue] "
+            "→ [green]{task.fields[pdf]}[/green]"
+        ),
+        "·",
+        TextColumn("{task.completed:.0f} documents"),
+        "·",
+        TimeElapsedColumn(),
+        console=console,
+    )
+
+
+def _get_progress(console: Console) -> "Progress":
     """Get rich progress component."""
+    from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
     return Progress(
         SpinnerColumn(finished_text="✅"),
         TextColumn(
@@ -121,19 +600,375 @@ def _get_progress(console: Console) -> Progress:
     )
 
 
+def _watch(
+    render: Callable[..., List[DocumentStats]],
+    md: List[Path],
+    css: Optional[Path],
+    documents: List[DocumentStats],
+    debounce: int = CLI_WATCH_DEBOUNCE,
+    coalesce: int = CLI_WATCH_COALESCE,
+    preview: Optional[Preview] = None,
+):
+    """Render PDF upon changes of input files, or files they depend on.
+
+    Files loaded while rendering documents (snippets, imported stylesheets, fonts,
+    images…) are indexed: a change only renders documents depending on it again.
+
+    Changes are detected in a background thread: changes detected during a render
+    are coalesced, and set the render as stale for it to cancel superseded renders.
+    Documents whose render was cancelled are rendered with the next changes.
+
+    In preview mode, pressing Enter switches between previews and full renders,
+    and renders all documents again.
+    """
+    from watchfiles import watch as wf_watch
+
+    index = DependencyIndex()
+    for md_ in md:
+        # Failed documents dependencies are unknown
+        index.update(str(md_), [md_] + ([css] if css else []))
+
+    def update(documents: List[DocumentStats]) -> bool:
+        """Update documents dependencies, and tell if watched directories changed."""
+        directories = {path.parent for path in index.paths}
+        for document in documents:
+            if document.input is not None and document.dependencies:
+                index.update(document.input, document.dependencies)
+        return directories != {path.parent for path in index.paths}
+
+    update(documents)
+    console.print(
+        f"👀 Looking for changes in: {[str(p) for p in md]} and "
+        f"{len(index.paths) - len(md)} dependencies (CTRL+C to quit)"
+    )
+    changes_queue: Queue[set[Path]] = Queue()
+    stale = Event()
+    stop = Event()
+    restart = Event()
+    full = Event()
+
+    def watcher():
+        while not stop.is_set():
+            restart.clear()
+            # Directories are watched as editors may replace files when saving them
+            directories = {path.parent for path in index.paths if path.parent.is_dir()}
+            for changes in wf_watch(
+                *directories,
+                watch_filter=lambda _, path: Path(path) in index.paths,
+                debounce=coalesce,
+                step=debounce,
+                stop_event=restart,
+                force_polling=CLI_WATCH_FORCE_POLLING,
+                recursive=False,
+            ):
+                changes_queue.put({Path(change[1]) for change in changes})
+                stale.set()
+
+    Thread(target=watcher, daemon=True).start()
+    if preview is not None:
+        Thread(
+            target=_switch_previews,
+            args=(preview, full, partial(changes_queue.put, set(md)), stale),
+            daemon=True,
+        ).start()
+    try:
+        while True:
+            changed_files = changes_queue.get()
+            stale.clear()
+            # Coalesce changes detected during the last render
+            while not changes_queue.empty():
+                changed_files |= changes_queue.get_nowait()
+
+            dependents = index.dependents(changed_files)
+            if not dependents:
+                continue
+            console.rule(str(datetime.now()), align="right")
+            console.print(f"⚡️ Detected changes in: {list(map(str, changed_files))}")
+            changed_md = [md_ for md_ in md if str(md_) in dependents]
+
+            # Only plain conversions have previews
+            parts = (
+                {}
+                if preview is None
+                else {"preview": None if full.is_set() else preview}
+            )
+            superseded: list[Path] = []
+            if update(
+                render(
+                    _get_progress(console),
+                    md=changed_md,
+                    stale=stale,
+                    superseded=superseded,
+                    **parts,
+                )
+            ):
+                # Watch directories of new dependencies
+                restart.set()
+            if superseded:
+                # Cancelled documents are still stale
+                changes_queue.put(set(superseded))
+
+            watcher_callback()
+    finally:
+        stop.set()
+        restart.set()
+
+
+def _switch_previews(
+    preview: Preview, full: Event, render_all: Callable[[], None], stale: Event
+):
+    """Switch between previews and full renders when Enter is pressed.
+
+    The `full` event is set for full renders, then all documents are rendered
+    again (cancelling superseded renders).
+    """
+    try:
+        for _ in sys.stdin:
+            if full.is_set():
+                full.clear()
+                console.print(f"🔍 Preview: [blue]{preview}[/blue]")
+            else:
+                full.set()
+                console.print("📄 Full renders")
+            render_all()
+            stale.set()
+    except (OSError, ValueError):
+        # Standard input is not readable (or closed)
+        return
+
+
+def _get_renderer(
+    pool: Executor,
+    workers: int,
+    md: List[Path],
+    pdf: Optional[Path],
+    options: ConvertOptions,
+    book: bool,
+    split_at: Optional[SplitLevel],
+    report: Optional[TextIO],
+    outputs: Optional[dict[Path, Path]] = None,
+    manifest: Optional[Manifest] = None,
+    preview: Optional[Preview] = None,
+) -> Callable[..., List[DocumentStats]]:
+    """Get the function rendering markdown files with progress."""
+    if book and pdf is not None:
+        # Chapters are laid out in this process to be kept in memory between builds
+        from .book import Book
+
+        return partial(
+            _build_book,
+            book=Book(new_converter(options)),
+            chapters=md,
+            pdf=pdf,
+            options=options,
+            report=report,
+        )
+    if split_at is not None:
+        # Documents HTML is rendered in this process (and chunks laid out by workers)
+        return partial(
+            _split,
+            converter=new_converter(options),
+            pool=pool,
+            workers=workers,
+            pdf=pdf,
+            options=options,
+            level=split_at,
+            report=report,
+            outputs=outputs,
+        )
+    return partial(
+        _start_workers,
+        pool=pool,
+        pdf=pdf,
+        options=options,
+        report=report,
+        outputs=outputs,
+        manifest=manifest,
+        preview=preview,
+        # Kept between watch mode renders
+        history=History(
+            options.cache_dir / HISTORY_FILE if options.cache_dir else None
+        ),
+    )
+
+
+def _stdio_output(md: Optional[List[Path]], pdf: Optional[Path]) -> Optional[Path]:
+    """Get the PDF output path, and print messages to stderr if it is stdout.
+
+    Documents read from stdin are written to stdout by default.
+    """
+    if pdf is None and STDIO in (md or []):
+        pdf = STDIO
+    # Messages must not mix with PDF bytes
+    console.stderr = pdf == STDIO
+    return pdf
+
+
+def _pool_size(
+    workers: Optional[int],
+    md: List[Path],
+    data: Optional[Path],
+    book: bool,
+    split_at: Optional[SplitLevel],
+) -> int:
+    """Get the number of workers to start (`auto` when it is None)."""
+    if workers is not None:
+        return workers
+    # Only plain conversions have as many jobs as input files
+    plain = data is None and split_at is None and not book
+    workers = auto_workers(len(md) if plain else None)
+    console.print(f"👷 Workers: [blue]{workers}[/blue]")
+    return workers
+
+
+def _pool_executor(
+    executor: ExecutorType, split_at: Optional[SplitLevel], limits: WorkerLimits
+) -> ExecutorType:
+    """Get the worker pool type required by options."""
+    if split_at is not None:
+        # Chunks are laid out in parallel: threads would be bound by the GIL
+        console.print(f"✂️ Split at: [blue]{split_at.value}[/blue] headings")
+        return ExecutorType.process
+    if limits.max_rss is not None:
+        # Worker threads share the process memory
+        console.print(
+            f"🧹 Worker memory budget: [blue]{limits.max_rss // 1024**2} MiB[/blue]"
+        )
+        return ExecutorType.process
+    return executor
+
+
+def _get_preview(
+    pages: Optional[Preview],
+    section: Optional[str],
+    book: bool,
+    data: Optional[Path],
+    split_at: Optional[SplitLevel],
+    make: bool,
+) -> Optional[Preview]:
+    """Get the part of documents to preview (exit if options are inconsistent)."""
+    if pages is None and section is None:
+        return None
+    if pages is not None and section is not None:
+        console.print(
+            "❌ Preview options `[red]--preview-pages[/red]` and"
+            " `[red]--preview-section[/red]` cannot be used together."
+        )
+        raise typer.Exit(code=2)
+    if book or data is not None or split_at is not None or make:
+        console.print(
+            "❌ Preview options `[red]--preview-pages[/red]` and"
+            " `[red]--preview-section[/red]` cannot be used with the `--book/-b`,"
+            " `--data/-d`, `--split-at` and `--make/-m` options."
+        )
+        raise typer.Exit(code=2)
+    preview = pages or Preview(section=section)
+    console.print(f"🔍 Preview: [blue]{preview}[/blue]")
+    return preview
+
+
+def _check_inputs(
+    md: Optional[List[Path]],
+    pdf: Optional[Path],
+    data: Optional[Path],
+    watch: bool,
+    book: bool,
+    split_at: Optional[SplitLevel],
+    output_dir: Optional[Path] = None,
+    make: bool = False,
+) -> dict[Path, Path]:
+    """Check input options consistency (exit if they are not).
+
+    Returns:
+        Markdown files found from inputs, with their path relative to the input
+        directory or pattern (see `find_inputs`).
+    """
+    sources = find_inputs(md or [])
+    if not sources:
+        console.print("🤷‍♂️ No markdown input file. See `--help`")
+        raise typer.Exit(code=2)
+    # The same file may be given more than once
+    multiple = len(md or []) > 1 or len(sources) > 1
+
+    if (STDIO in (md or []) or pdf == STDIO) and (
+        multiple
+        or watch
+        or book
+        or data is not None
+        or split_at is not None
+        or output_dir is not None
+        or make
+    ):
+        console.print(
+            "❌ Standard input and output (`[red]-[/red]`) require a single input,"
+            " and cannot be used with the `--watch/-w`, `--book/-b`, `--data/-d`,"
+            " `--split-at`, `--output-dir` and `--make/-m` options."
+        )
+        raise typer.Exit(code=2)
+
+    if output_dir is not None and (pdf is not None or book or data is not None):
+        console.print(
+            "❌ Output directory option `[red]--output-dir[/red]` cannot be used"
+            " with the `--output/-o`, `--book/-b` and `--data/-d` options."
+        )
+        raise typer.Exit(code=2)
+
+    if make and (book or data is not None or split_at is not None):
+        console.print(
+            "❌ Make option `[red]--make/-m[/red]` cannot be used with the"
+            " `--book/-b`, `--data/-d` and `--split-at` options."
+        )
+        raise typer.Exit(code=2)
+
+    if book and (pdf is None or data is not None or split_at is not None):
+        console.print(
+            "❌ Book option `[red]--book[/red]` requires the `--output/-o` option,"
+            " and cannot be used with the `--data/-d` and `--split-at` options."
+        )
+        raise typer.Exit(code=2)
+
+    if pdf is not None and multiple and not book:
+        console.print(
+            "❌ PDF output option `[red]--output/-o[/red]`"
+            " cannot be used with multiple input."
+        )
+        raise typer.Exit(code=2)
+
+    if data is not None and (multiple or pdf is not None or watch):
+        console.print(
+            "❌ Data option `[red]--data/-d[/red]` requires a single input, and"
+            " cannot be used with the `--output/-o` and `--watch/-w` options."
+        )
+        raise typer.Exit(code=2)
+
+    if data is not None and split_at is not None:
+        console.print(
+            "❌ Split option `[red]--split-at[/red]` cannot be used with the"
+            " `--data/-d` option."
+        )
+        raise typer.Exit(code=2)
+
+    return sources
+
+
 def watcher_callback():
     """Dummy watcher callback used for testing."""
 
 
-@cli.command(no_args_is_help=True)
+@cli.callback(invoke_without_command=True)
 def main(
+    ctx: typer.Context,
     md: Annotated[
         Optional[list[Path]],
         typer.Option(
             "--input",
             "-i",
-            help="Markdown source file path (can be used multiple times).",
-            exists=True,
+            help=(
+                "Markdown source file, directory (searched recursively), glob "
+                "pattern or `-` (stdin) (can be used multiple times)."
+            ),
+            parser=parse_input,
+            metavar="PATH",
         ),
     ] = None,
     pdf: Annotated[
@@ -141,7 +976,10 @@ def main(
         typer.Option(
             "--output",
             "-o",
-            help="PDF output file path (when a single md input is used).",
+            help=(
+                "PDF output file path (with a single md input, or a book), or `-` "
+                "(stdout)."
+            ),
         ),
     ] = None,
     css: Annotated[
@@ -169,29 +1007,197 @@ def main(
             "--watch", "-w", help="Automatically render PDF upon input file(s) changes."
         ),
     ] = False,
-    workers: Annotated[
+    debounce: Annotated[
         int,
-        typer.Option("--workers", "-W", help="Number of parallel workers to start."),
+        typer.Option(
+            "--debounce",
+            help="Watch mode: render once no change is detected for this delay (ms).",
+        ),
+    ] = CLI_WATCH_DEBOUNCE,
+    coalesce: Annotated[
+        int,
+        typer.Option(
+            "--coalesce",
+            help="Watch mode: group changes over this window at most (ms).",
+        ),
+    ] = CLI_WATCH_COALESCE,
+    preview_pages: Annotated[
+        Optional[Preview],
+        typer.Option(
+            "--preview-pages",
+            help=(
+                "Preview mode: only lay out these pages (`FIRST-LAST`); press Enter "
+                "in watch mode to switch to full renders."
+            ),
+            parser=parse_pages,
+            metavar="PAGES",
+        ),
+    ] = None,
+    preview_section: Annotated[
+        Optional[str],
+        typer.Option(
+            "--preview-section",
+            help=(
+                "Preview mode: only lay out the section with this title; press "
+                "Enter in watch mode to switch to full renders."
+            ),
+        ),
+    ] = None,
+    workers: Annotated[
+        Optional[int],
+        typer.Option(
+            "--workers",
+            "-W",
+            help=(
+                "Number of parallel workers to start (`auto`: fit available CPU "
+                "cores and memory)."
+            ),
+            parser=parse_workers,
+            metavar="INTEGER|auto",
+        ),
     ] = 4,
+    executor: Annotated[
+        ExecutorType,
+        typer.Option(
+            "--executor",
+            "-x",
+            help="Worker pool type (use processes to scale with CPU cores).",
+        ),
+    ] = ExecutorType.thread,
+    max_tasks_per_worker: Annotated[
+        Optional[int],
+        typer.Option(
+            "--max-tasks-per-worker",
+            help="Recycle workers after this number of documents.",
+            min=1,
+        ),
+    ] = None,
+    max_worker_rss: Annotated[
+        Optional[int],
+        typer.Option(
+            "--max-worker-rss",
+            help=(
+                "Recycle worker processes whose resident memory exceeds this budget "
+                "(MiB); documents exceeding twice the budget fail."
+            ),
+            min=1,
+        ),
+    ] = None,
+    cache_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--cache-dir",
+            help="Render cache directory (unchanged documents are not rendered).",
+            envvar="MD2PDF_CACHE_DIR",
+        ),
+    ] = None,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Do not use the render cache.")
+    ] = False,
+    data: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--data",
+            "-d",
+            help="Render the input template with each data file row (.jsonl/.csv).",
+            exists=True,
+        ),
+    ] = None,
+    output_pattern: Annotated[
+        Optional[str],
+        typer.Option(
+            "--output-pattern",
+            "-O",
+            help=(
+                "PDF output path pattern for data rows, formatted with row fields "
+                "and its {index} (default: <input>-{index}.pdf)."
+            ),
+        ),
+    ] = None,
+    book: Annotated[
+        bool,
+        typer.Option(
+            "--book",
+            "-b",
+            help=(
+                "Combine input files as chapters of the output PDF (only changed "
+                "chapters are laid out again in watch mode)."
+            ),
+        ),
+    ] = False,
+    split_at: Annotated[
+        Optional[SplitLevel],
+        typer.Option(
+            "--split-at",
+            help=(
+                "Lay out huge documents in chunks cut at these headings, in "
+                "parallel worker processes (requires the `split` extra)."
+            ),
+        ),
+    ] = None,
+    dpi: Annotated[
+        Optional[int],
+        typer.Option(
+            "--dpi",
+            help="Downsample embedded images to this maximal resolution.",
+            min=1,
+        ),
+    ] = None,
+    jpeg_quality: Annotated[
+        Optional[int],
+        typer.Option(
+            "--jpeg-quality",
+            help="Recompress embedded JPEG images with this quality (0 to 95).",
+            min=0,
+            max=95,
+        ),
+    ] = None,
+    output_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--output-dir",
+            help="PDF output directory, mirroring the source tree of inputs.",
+            file_okay=False,
+        ),
+    ] = None,
+    make: Annotated[
+        bool,
+        typer.Option(
+            "--make",
+            "-m",
+            help=(
+                "Skip documents whose PDF is newer than their markdown source, "
+                "stylesheet and resources (like make)."
+            ),
+        ),
+    ] = False,
+    stats: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--stats",
+            help=(
+                "Write conversion statistics to this file (JSON lines: one per "
+                "document, then batch aggregates)."
+            ),
+        ),
+    ] = None,
     version: Annotated[
         bool, typer.Option("--version", "-V", help="Display program version.")
     ] = False,
 ):
     """Markdown to PDF conversion tool with styles… and templates!"""
+    if ctx.invoked_subcommand is not None:
+        return
+
     if version:
         console.print(f"{metadata_version('md2pdf')}")
         raise typer.Exit()
 
-    if md is None or not len(md):
-        console.print("🤷‍♂️ No markdown input file. See `--help`")
-        raise typer.Exit(code=2)
-
-    if pdf is not None and len(md) > 1:
-        console.print(
-            "❌ PDF output option `[red]--output/-o[/red]`"
-            " cannot be used with multiple input."
-        )
-        raise typer.Exit(code=2)
+    pdf = _stdio_output(md, pdf)
+    sources = _check_inputs(md, pdf, data, watch, book, split_at, output_dir, make)
+    md = list(sources)
+    workers = _pool_size(workers, md, data, book, split_at)
+    preview = _get_preview(preview_pages, preview_section, book, data, split_at, make)
 
     if css is not None:
         console.print(f"💅 CSS file: [blue]{css}[/blue]")
@@ -205,30 +1211,228 @@ def main(
         extras_config = parse_config(config)
         console.print(f"🔧 Configuration: [blue]{extras_config}[/blue]")
 
-    # Run rendering and exit (if watch is not active)
-    _start_threads(_get_progress(console), workers, md, pdf, css, extras, extras_config)
-    if not watch:
-        raise typer.Exit()
+    if no_cache:
+        cache_dir = None
+    if cache_dir is not None:
+        console.print(f"🗄️ Cache directory: [blue]{cache_dir}[/blue]")
 
-    # Watch changes in CSS and markdown files
-    paths_to_watch = ([css] if css else []) + md
-    console.print(
-        f"👀 Looking for changes in: {[str(p) for p in paths_to_watch]} "
-        "(CTRL+C to quit)"
+    if book:
+        console.print(f"📚 Book: [blue]{len(md)} chapters[/blue]")
+
+    limits = WorkerLimits(
+        max_tasks_per_worker, max_worker_rss * 1024**2 if max_worker_rss else None
     )
-    for changes in wf_watch(
-        *paths_to_watch,
-        force_polling=CLI_WATCH_FORCE_POOLING,
-    ):
-        changed_files = {Path(change[1]) for change in changes}
-        console.rule(str(datetime.now()), align="right")
-        console.print(f"⚡️ Detected changes in: {list(map(str, changed_files))}")
-        changed_md = list(changed_files & set(md))
-        if css in changed_files:
-            changed_md = md
+    executor = _pool_executor(executor, split_at, limits)
+
+    with ExitStack() as stack:
+        html_cache_dir = cache_dir
+        if watch and html_cache_dir is None:
+            # Share documents HTML between workers during the watch session: when
+            # only styles change, markdown sources are not rendered again.
+            html_cache_dir = Path(
+                stack.enter_context(TemporaryDirectory(prefix="md2pdf-"))
+            )
+        options = ConvertOptions(
+            css,
+            extras,
+            extras_config,
+            cache_dir,
+            html_cache_dir,
+            ImageOptions(dpi, jpeg_quality),
+            limits,
+            record_rss=stats is not None,
+            # Files loaded by documents are watched, checked by `--make` or reported
+            dependencies=watch or make or stats is not None,
+        )
+        pool = stack.enter_context(get_executor(executor, workers, options))
+        report = stack.enter_context(stats.open("w")) if stats is not None else None
+
+        if STDIO in (md[0], pdf):
+            _stream(pool, md[0], cast(Path, pdf), options, report)
+            raise typer.Exit()
 
-        _start_threads(
-            _get_progress(console), workers, changed_md, pdf, css, extras, extras_config
+        if data is not None:
+            pattern = output_pattern or str(
+                md[0].with_name(f"{md[0].stem}-{{index}}.pdf")
+            )
+            console.print(f"🗃️ Data file: [blue]{data}[/blue]")
+            _merge(
+                _get_merge_progress(console),
+                pool,
+                workers,
+                md[0],
+                data,
+                pattern,
+                options,
+                report,
+            )
+            raise typer.Exit()
+
+        render = _get_renderer(
+            pool,
+            workers,
+            md,
+            pdf,
+            options,
+            book,
+            split_at,
+            report,
+            outputs=mirror(sources, output_dir) if output_dir else None,
+            manifest=Manifest(manifest_path(output_dir)) if make else None,
+            preview=preview,
         )
 
-        watcher_callback()
+        # Run rendering and exit (if watch is not active)
+        documents = render(_get_progress(console), md=md)
+        if not watch:
+            raise typer.Exit()
+
+        _watch(render, md, css, documents, debounce, coalesce, preview)
+
+
+@cli.command()
+def serve(
+    host: Annotated[
+        str, typer.Option("--host", "-H", help="Address to listen on.")
+    ] = SERVER_HOST,
+    port: Annotated[
+        int, typer.Option("--port", "-p", help="Port to listen on.")
+    ] = SERVER_PORT,
+    socket: Annotated[
+        Optional[Path],
+        typer.Option("--socket", "-s", help="Unix socket to listen on (not a port)."),
+    ] = None,
+    workers: Annotated[
+        int,
+        typer.Option("--workers", "-W", help="Number of parallel workers to start."),
+    ] = 4,
+    executor: Annotated[
+        ExecutorType,
+        typer.Option("--executor", "-x", help="Worker pool type."),
+    ] = ExecutorType.process,
+    queue_size: Annotated[
+        int,
+        typer.Option(
+            "--queue-size",
+            "-q",
+            help="Number of pending requests (others get a 503 response).",
+        ),
+    ] = SERVER_QUEUE_SIZE,
+    timeout: Annotated[
+        float,
+        typer.Option("--timeout", "-t", help="Render timeout (in seconds)."),
+    ] = SERVER_TIMEOUT,
+):
+    """Serve PDF rendering over HTTP with a pool of warm workers.
+
+    POST a JSON request to /render: {"markdown": "# Hi {{ name }}", "css": "h1 {}",
+    "extras": [], "extras_config": {}, "context": {"name": "you"}} to get the PDF.
+    """
+    from .pool import start_workers
+    from .server import Renderer, is_loopback, make_server
+
+    if socket is None and not is_loopback(host):
+        console.print(
+            f"⚠️ Listening on [red]{host}[/red]: anyone reaching this address can"
+            " render documents"
+        )
+
+    with get_executor(executor, workers) as pool:
+        console.print(f"🔥 Starting {workers} workers…")
+        start_workers(pool, workers)
+
+        renderer = Renderer(pool, workers, queue_size=queue_size, timeout=timeout)
+        server = make_server(renderer, host=host, port=port, socket=socket)
+        address = socket if socket is not None else f"http://{host}:{port}"
+        console.print(f"📡 Listening on [blue]{address}[/blue] (CTRL+C to quit)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if socket is not None:
+                socket.unlink(missing_ok=True)
+
+
+@cli.command()
+def bench(
+    corpus: Annotated[
+        Optional[list[Corpus]],
+        typer.Option(
+            "--corpus", help="Corpus to benchmark (can be used multiple times)."
+        ),
+    ] = None,
+    scale: Annotated[float, typer.Option("--scale", help="Corpora size factor.")] = 1.0,
+    workers: Annotated[
+        int,
+        typer.Option("--workers", "-W", help="Number of CLI workers."),
+    ] = 4,
+    executor: Annotated[
+        ExecutorType,
+        typer.Option("--executor", "-x", help="CLI worker pool type."),
+    ] = ExecutorType.thread,
+    baseline: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--baseline",
+            "-b",
+            help="Baseline results file to compare with (saved if it does not exist).",
+        ),
+    ] = None,
+    save_baseline: Annotated[
+        bool, typer.Option("--save-baseline", help="Overwrite baseline results.")
+    ] = False,
+    tolerance: Annotated[
+        float,
+        typer.Option(
+            "--tolerance",
+            "-t",
+            help="Tolerated throughput and peak memory regression (ratio).",
+        ),
+    ] = BENCH_TOLERANCE,
+    output: Annotated[
+        Optional[Path], typer.Option("--output", "-o", help="Results file.")
+    ] = None,
+):
+    """Benchmark conversions of synthetic corpora (and check for regressions)."""
+    from rich.table import Table
+
+    corpora = corpus or list(Corpus)
+    console.print(f"⏱️ Benchmarking corpora: {[c.value for c in corpora]} (×{scale})")
+    with TemporaryDirectory(prefix="md2pdf-bench-") as directory:
+        results = run_benchmark(
+            corpora, Path(directory), scale, workers, executor.value
+        )
+
+    table = Table("Benchmark", "Documents", "Pages", "Docs/s", "Pages/s", "p95 (s)")
+    table.add_column("Peak memory (MiB)")
+    for name, result in results["results"].items():
+        peak_memory = result["peak_memory"]
+        table.add_row(
+            name,
+            str(result["documents"]),
+            str(result["pages"]),
+            f"{result['throughput']:.2f}",
+            f"{result['pages_throughput']:.2f}",
+            f"{result['duration']['p95']:.3f}",
+            f"{peak_memory:.1f}" if peak_memory is not None else "-",
+        )
+    console.print(table)
+
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+
+    if baseline is None:
+        return
+    if save_baseline or not baseline.exists():
+        baseline.write_text(json.dumps(results, indent=2))
+        console.print(f"💾 Baseline saved to [blue]{baseline}[/blue]")
+        return
+
+    regressions = compare(results, json.loads(baseline.read_text()), tolerance)
+    for regression in regressions:
+        console.print(f"❌ Regression: [red]{regression}[/red]")
+    if regressions:
+        raise typer.Exit(code=1)
+    console.print(f"✅ No regression compared to [blue]{baseline}[/blue]")
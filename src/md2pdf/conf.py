@@ -7,5 +7,139 @@ MARKDOWN_BASE_EXTENSIONS: list = [
     "pymdownx.superfences",
 ]
 
-# FIXME: shouldn't be required for Linux
-CLI_WATCH_FORCE_POOLING = True
+# Markdown files found in input directories
+INPUT_SUFFIXES = (".md", ".markdown")
+
+# Render cache maximal size (in bytes)
+CACHE_MAX_SIZE = 1024**3
+
+# Number of documents HTML kept in memory by a converter
+HTML_MEMORY_CACHE_SIZE = 128
+
+# Number of raw stylesheets kept parsed in memory by a converter
+STYLESHEET_MEMORY_CACHE_SIZE = 16
+
+# Number of compiled Jinja templates kept in memory by a converter
+TEMPLATE_MEMORY_CACHE_SIZE = 16
+
+# Remote resources cache maximal size (in bytes), and number of resources kept in
+# memory by a fetcher
+FETCH_CACHE_MAX_SIZE = 256 * 1024**2
+FETCH_MEMORY_CACHE_SIZE = 256
+
+# Remote resources are fresh for this duration (in seconds) unless their response
+# sets one: then they are revalidated using their ETag or Last-Modified headers
+FETCH_MAX_AGE = 300
+
+# Remote resources requests timeout (in seconds), concurrent prefetch requests and
+# followed redirects
+FETCH_TIMEOUT = 10.0
+FETCH_WORKERS = 8
+FETCH_MAX_REDIRECTS = 5
+
+# Number of formulas kept in memory by a formula renderer, and concurrent KaTeX
+# processes rendering formulas missing from the cache
+FORMULA_MEMORY_CACHE_SIZE = 1024
+FORMULA_WORKERS = 4
+
+# Number of code blocks kept highlighted in memory by a converter
+HIGHLIGHT_MEMORY_CACHE_SIZE = 1024
+
+# Number of decoded images kept in memory by a converter between documents
+IMAGE_MEMORY_CACHE_SIZE = 256
+
+# Number of laid out chapters kept in memory by a book
+BOOK_MEMORY_CACHE_SIZE = 256
+
+# Watch mode uses native file system events when they are available (set the
+# WATCHFILES_FORCE_POLLING environment variable to poll, e.g. on network drives)
+CLI_WATCH_FORCE_POLLING = None
+
+# Watch mode: render once no change has been detected for this quiet period, and
+# group changes over this window at most (in milliseconds)
+CLI_WATCH_DEBOUNCE = 100
+CLI_WATCH_COALESCE = 1600
+
+# Interval between checks for changes superseding the current render (in seconds)
+CLI_WATCH_STALE_CHECK_INTERVAL = 0.1
+
+# Number of input files whose conversion durations are kept to schedule the
+# longest documents first
+SCHEDULE_HISTORY_SIZE = 4096
+
+# Estimated memory of a worker (in bytes), to size pools automatically
+WORKER_MEMORY = 512 * 1024**2
+
+# Worker processes exit when their resident memory exceeds this multiple of their
+# budget, checked at this interval (in seconds)
+WORKER_RSS_HARD_LIMIT_RATIO = 2
+WORKER_MEMORY_CHECK_INTERVAL = 0.05
+WORKER_EXIT_CODE = 75
+
+# Number of times a task interrupted by the exit of another worker process is
+# submitted again
+WORKER_RETRIES = 3
+
+# Number of data rows read ahead per worker in mail merge mode
+MERGE_PENDING_ROWS_PER_WORKER = 4
+
+# Number of chunks per worker in split rendering (for workers to share the load)
+SPLIT_CHUNKS_PER_WORKER = 2
+
+# Preview mode: HTML characters laid out per requested page at first (more HTML is
+# laid out until it covers requested pages)
+PREVIEW_PAGE_SIZE = 4096
+
+# Benchmark corpora random seed, and tolerated regression ratio
+BENCH_SEED = 42
+BENCH_TOLERANCE = 0.2
+
+# Worker processes are started from a multi-threaded parent (progress display,
+# file watcher, HTTP server): do not fork it.
+PROCESS_START_METHOD = "spawn"
+
+# Async API: number of workers of the default pool
+ASYNC_WORKERS = 4
+
+# Batch API: default number of workers, and jobs read ahead per worker
+BATCH_WORKERS = 4
+BATCH_PENDING_JOBS_PER_WORKER = 2
+
+# Render server defaults
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+SERVER_QUEUE_SIZE = 16
+SERVER_TIMEOUT = 30.0
+SERVER_MAX_REQUEST_SIZE = 16 * 1024**2
+
+# Markdown extensions render server requests can activate (others may read local
+# files, _e.g._ `pymdownx.snippets`)
+SERVER_EXTRAS = (
+    "markdown.extensions.abbr",
+    "markdown.extensions.admonition",
+    "markdown.extensions.attr_list",
+    "markdown.extensions.def_list",
+    "markdown.extensions.extra",
+    "markdown.extensions.fenced_code",
+    "markdown.extensions.footnotes",
+    "markdown.extensions.md_in_html",
+    "markdown.extensions.nl2br",
+    "markdown.extensions.sane_lists",
+    "markdown.extensions.smarty",
+    "markdown.extensions.tables",
+    "markdown.extensions.toc",
+    "pymdownx.betterem",
+    "pymdownx.caret",
+    "pymdownx.details",
+    "pymdownx.emoji",
+    "pymdownx.highlight",
+    "pymdownx.inlinehilite",
+    "pymdownx.keys",
+    "pymdownx.magiclink",
+    "pymdownx.mark",
+    "pymdownx.smartsymbols",
+    "pymdownx.superfences",
+    "pymdownx.tabbed",
+    "pymdownx.tasklist",
+    "pymdownx.tilde",
+)
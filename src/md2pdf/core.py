@@ -1,87 +1,743 @@
 """md2pdf core module."""
 
+import io
+import json
 import logging
+import os
+import re
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Union,
+    cast,
+)
 
 import frontmatter
 from jinja2 import Template
-from markdown import markdown
-from weasyprint import CSS, HTML
+from jinja2.sandbox import SandboxedEnvironment
+from markdown import Markdown
+from markdown.extensions import Extension
 
-from .conf import MARKDOWN_BASE_EXTENSIONS
+from .cache import HTMLCache, MemoryCache, RenderCache, html_key, render_key
+from .conf import (
+    BATCH_PENDING_JOBS_PER_WORKER,
+    BATCH_WORKERS,
+    HTML_MEMORY_CACHE_SIZE,
+    MARKDOWN_BASE_EXTENSIONS,
+    PREVIEW_PAGE_SIZE,
+    STYLESHEET_MEMORY_CACHE_SIZE,
+    TEMPLATE_MEMORY_CACHE_SIZE,
+)
+from .deps import Dependencies, changed, depend, record, signature, track
 from .exceptions import ValidationError
+from .fetch import Fetcher, ResourceCache, resource_urls
+from .highlight import HighlightCache, HighlightExtension, Highlights
+from .images import ImageCache, ImageOptions
+from .memory import peak_rss, reset_peak_rss
+from .pool import (
+    ConvertOptions,
+    ExecutorType,
+    Job,
+    JobResult,
+    convert_job,
+    get_executor,
+)
+from .preview import Preview, section, truncate
+from .stats import DocumentStats
+
+if TYPE_CHECKING:
+    # WeasyPrint is imported upon first layout: rendering HTML does not need it
+    from weasyprint import CSS, Document
+    from weasyprint.text.fonts import FontConfiguration
+
+    from .formulas import FormulaRenderer
 
 logger = logging.getLogger(__name__)
 
+# Page counters used in stylesheets: parts of a document laid out separately need
+# their page numbers to be offset
+PAGE_COUNTERS = re.compile(r"counters?\(\s*pages?\s*[,)]")
+TOTAL_PAGES = re.compile(r"counter\(\s*pages\s*\)")
+
+# These markdown extensions render formulas and highlight code using the converter
+# formula renderer and highlights
+KATEX_EXTENSION = "markdown_katex"
+HIGHLIGHT_EXTENSION = "pymdownx.highlight"
+
+
+def read_markdown(
+    raw: Optional[str] = None,
+    md: Optional[Union[Path, str, os.PathLike, TextIO]] = None,
+) -> str:
+    """Get markdown content from the raw string, the input file or text stream.
+
+    Raises:
+        ValidationError: if the content is empty.
+    """
+    if isinstance(md, (str, os.PathLike)):
+        md = Path(md)
+    if isinstance(md, Path):
+        logger.debug("Reading markdown content from file %s", md)
+        raw = md.read_text()
+    elif md is not None:
+        logger.debug("Reading markdown content from stream %s", md)
+        raw = md.read()
+
+    if raw is None or not len(raw):
+        raise ValidationError(
+            "No markdown content to process (empty file or raw string)"
+        )
+    return raw
+
+
+class Converter:
+    """A reusable markdown to PDF converter.
+
+    A converter keeps what can be shared between conversions: parsed stylesheets,
+    the font configuration, markdown engines and fetched resources (images,
+    stylesheets…). It is not thread-safe: use one converter per thread or process
+    (its fetcher can be shared).
+
+    When a render cache is given, unchanged documents are not rendered again. HTML
+    rendered from markdown sources is also kept (in memory, and on disk when an
+    HTML cache is given) so that a stylesheet change only triggers a new layout.
+    Decoded images are kept in memory between documents, and embedded according
+    to image options.
+
+    Conversion stages are timed: `convert` returns the document statistics.
+
+    A sandboxed converter renders Jinja templates in a sandbox: use it (with a
+    fetcher that does not read local files) to convert untrusted documents.
+
+    Files loaded by documents are recorded in their statistics as dependencies.
+    Files opened directly (_e.g._ markdown sources, snippets included by markdown
+    extensions) are only recorded by converters with caches, or by converters
+    tracking `dependencies` (see `deps.track`).
+
+    Converters recording resident memory report the peak resident memory of each
+    document in its statistics: it resets the peak of the whole process, and is
+    meant for pool workers.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[RenderCache] = None,
+        html_cache: Optional[HTMLCache] = None,
+        fetcher: Optional[Fetcher] = None,
+        images: Optional[ImageOptions] = None,
+        sandboxed: bool = False,
+        record_rss: bool = False,
+        dependencies: bool = False,
+    ):
+        """Initialize converter caches."""
+        if dependencies or cache is not None or html_cache is not None:
+            track()
+        self.sandbox = SandboxedEnvironment() if sandboxed else None
+        self.record_rss = record_rss
+        self.cache = cache
+        self.html_cache = html_cache
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.image_options = images if images is not None else ImageOptions()
+        self.images = ImageCache(self.fetcher)
+        self._font_config: Optional["FontConfiguration"] = None
+        self._stylesheets: dict[Path, tuple[Dependencies, "CSS"]] = {}
+        self._raw_stylesheets: MemoryCache["CSS"] = MemoryCache(
+            STYLESHEET_MEMORY_CACHE_SIZE
+        )
+        self._templates: MemoryCache[tuple[dict, Template]] = MemoryCache(
+            TEMPLATE_MEMORY_CACHE_SIZE
+        )
+        self._engines: dict[tuple[tuple[str, ...], str], Markdown] = {}
+        self._formulas: Optional["FormulaRenderer"] = None
+        self._highlights: Optional[Highlights] = None
+        self._html: MemoryCache[tuple[str, Dependencies]] = MemoryCache(
+            HTML_MEMORY_CACHE_SIZE
+        )
+        # Statistics of the document being converted
+        self.stats: Optional[DocumentStats] = None
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        """Time a conversion stage of the current document (if any)."""
+        if self.stats is None:
+            yield
+            return
+        with self.stats.stage(name):
+            yield
+
+    @property
+    def font_config(self) -> "FontConfiguration":
+        """Get the font configuration shared by stylesheets and layouts."""
+        if self._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+
+            self._font_config = FontConfiguration()
+        return self._font_config
+
+    def stylesheet(self, css: Path) -> "CSS":
+        """Get the parsed stylesheet, parsing it again if its files have changed.
+
+        Files loaded by the stylesheet (imported stylesheets, fonts) are watched too.
+        """
+        from weasyprint import CSS
+
+        css = css.resolve()
+        cached = self._stylesheets.get(css)
+        if cached is not None and not changed(cached[0]):
+            depend(cached[0])
+            return cached[1]
+
+        logger.debug("Parsing stylesheet %s", css)
+        with record() as dependencies:
+            # Get the signature before the stylesheet is read
+            depend({str(css): signature(css)})
+            stylesheet = CSS(
+                filename=css, font_config=self.font_config, url_fetcher=self.fetcher
+            )
+        self._stylesheets[css] = (dependencies, stylesheet)
+        return stylesheet
+
+    def raw_stylesheet(self, raw: str, base_url: Optional[Path] = None) -> "CSS":
+        """Get the parsed stylesheet from raw CSS content.
+
+        Relative URLs of the stylesheet are resolved against `base_url` (if any).
+        """
+        from weasyprint import CSS
+
+        key = (raw, base_url)
+        stylesheet = self._raw_stylesheets.get(key)
+        if stylesheet is None:
+            stylesheet = CSS(
+                string=raw,
+                base_url=str(base_url) if base_url is not None else None,
+                font_config=self.font_config,
+                url_fetcher=self.fetcher,
+            )
+            self._raw_stylesheets.put(key, stylesheet)
+        return stylesheet
+
+    def paged_stylesheets(
+        self,
+        css: Optional[Path] = None,
+        page_offset: int = 0,
+        total_pages: Optional[int] = None,
+    ) -> List["CSS"]:
+        """Get stylesheets laying out a part of a document.
+
+        The page counter starts after `page_offset` pages, and when `total_pages` is
+        given, it replaces the `pages` counter of the stylesheet.
+        """
+        stylesheets = []
+        if css is not None:
+            if total_pages is None:
+                stylesheets.append(self.stylesheet(css))
+            else:
+                raw = TOTAL_PAGES.sub(f'"{total_pages}"', css.read_text())
+                stylesheets.append(self.raw_stylesheet(raw, base_url=css))
+        if page_offset:
+            stylesheets.append(
+                self.raw_stylesheet(
+                    f"@page :first {{ counter-increment: page {page_offset + 1} }}"
+                )
+            )
+        return stylesheets
+
+    def template(self, raw: str) -> tuple[dict, Template]:
+        """Get the frontmatter context and the compiled Jinja template."""
+        cached = self._templates.get(raw)
+        if cached is None:
+            ftmt_context: dict = {}
+            source = raw
+
+            # Check if markdown file is a template
+            if frontmatter.checks(raw):
+                logger.info("Markdown input file contains frontmatter header")
+
+                # Get context and the template
+                ftmt_context, source = frontmatter.parse(raw)
+                logger.debug("Frontmatter context %s", ftmt_context)
+
+            cached = (
+                ftmt_context,
+                (
+                    self.sandbox.from_string(source)
+                    if self.sandbox is not None
+                    else Template(source)
+                ),
+            )
+            self._templates.put(raw, cached)
+        return cached
+
+    @property
+    def formulas(self) -> "FormulaRenderer":
+        """Get the renderer of formulas (for the `markdown_katex` extension).
+
+        Rendered formulas are cached in the render cache directory, or in the
+        temporary directory (as the extension does).
+        """
+        if self._formulas is None:
+            from .formulas import FormulaCache, FormulaRenderer
+
+            directory = (
+                self.cache.directory
+                if self.cache is not None
+                else Path(tempfile.gettempdir()) / "md2pdf"
+            )
+            self._formulas = FormulaRenderer(FormulaCache(directory / "formulas"))
+        return self._formulas
+
+    @property
+    def highlights(self) -> Highlights:
+        """Get code blocks highlighted by Pygments (for `pymdownx.highlight`).
+
+        Highlighted blocks are kept in memory, and in the render cache directory
+        when the converter has a render cache.
+        """
+        if self._highlights is None:
+            self._highlights = Highlights(
+                HighlightCache(self.cache.directory / "highlight")
+                if self.cache is not None
+                else None
+            )
+        return self._highlights
+
+    def _extension(self, name: str, extension_configs: dict) -> Union[str, Extension]:
+        """Get a markdown extension (by name, or configured by the converter)."""
+        configs = extension_configs.get(name, {})
+        if name == HIGHLIGHT_EXTENSION:
+            return HighlightExtension(highlights=self.highlights, **configs)
+        if name == KATEX_EXTENSION:
+            from .formulas import KatexExtension
+
+            return KatexExtension(renderer=self.formulas, **configs)
+        return name
+
+    def markdown(self, extensions: List[str], extension_configs: dict) -> Markdown:
+        """Get a reset markdown engine with active extensions."""
+        key = (tuple(extensions), json.dumps(extension_configs, sort_keys=True))
+        engine = self._engines.get(key)
+        if engine is None:
+            logger.debug("Loading markdown extensions %s", extensions)
+            loaded = [self._extension(name, extension_configs) for name in extensions]
+            if HIGHLIGHT_EXTENSION not in extensions:
+                # Extensions such as `pymdownx.superfences` register the highlight
+                # extension (disabled) unless it has been registered first
+                loaded.insert(
+                    0, HighlightExtension(highlights=self.highlights, _enabled=False)
+                )
+            engine = Markdown(
+                extensions=loaded,
+                extension_configs=extension_configs,
+            )
+            self._engines[key] = engine
+        return engine.reset()
+
+    def md2html(
+        self,
+        raw: Optional[str] = None,
+        md: Optional[Union[Path, str, os.PathLike, TextIO]] = None,
+        extras: Optional[List[str]] = None,
+        extras_config: Optional[dict] = None,
+        context: Optional[dict] = None,
+    ) -> str:
+        """Render markdown (and its frontmatter) to HTML, using caches."""
+        raw = read_markdown(raw, md)
+        key = html_key(raw, extras, extras_config, context)
+        cached = self._html.get(key)
+        if cached is not None and not changed(cached[1]):
+            depend(cached[1])
+            return cached[0]
+
+        html = self.html_cache.load(key) if self.html_cache is not None else None
+        if html is not None and self.html_cache is not None:
+            dependencies = self.html_cache.dependencies(key)
+            depend(dependencies)
+        else:
+            # Markdown extensions may include files (_e.g._ snippets)
+            with record() as dependencies:
+                html = self._render_html(
+                    raw, extras or [], extras_config or {}, context
+                )
+            if self.html_cache is not None:
+                self.html_cache.store(key, html, dependencies)
+
+        self._html.put(key, (html, dependencies))
+        return html
+
+    def html2document(
+        self,
+        html: str,
+        css: Optional[Path] = None,
+        base_url: Optional[Path] = None,
+        raw_css: Optional[str] = None,
+    ) -> "Document":
+        """Lay out styled HTML as a WeasyPrint document."""
+        styles = [self.stylesheet(css)] if css else []
+        if raw_css:
+            styles.append(self.raw_stylesheet(raw_css))
+        return self.layout(html, styles, base_url)
+
+    def layout(
+        self,
+        html: str,
+        stylesheets: List["CSS"],
+        base_url: Optional[Path] = None,
+    ) -> "Document":
+        """Lay out HTML with parsed stylesheets as a WeasyPrint document.
+
+        Remote resources of the document are fetched concurrently before its layout.
+        """
+        from weasyprint import HTML
+
+        if base_url is None:
+            base_url = Path.cwd()
+        with self._stage("fetch"):
+            self.fetcher.prefetch(resource_urls(html))
+        with self._stage("html"):
+            parsed = HTML(string=html, base_url=str(base_url), url_fetcher=self.fetcher)
+        with self._stage("layout"):
+            return parsed.render(
+                stylesheets=stylesheets,
+                font_config=self.font_config,
+                cache=self.images,
+                **self.image_options.weasyprint,
+            )
+
+    def preview(
+        self,
+        html: str,
+        preview: Preview,
+        css: Optional[Path] = None,
+        base_url: Optional[Path] = None,
+    ) -> "Document":
+        """Lay out the previewed part of styled HTML as a WeasyPrint document."""
+        if preview.section is not None:
+            return self.html2document(section(html, preview.section), css, base_url)
+
+        first, last = cast(tuple[int, int], preview.pages)
+        size = PREVIEW_PAGE_SIZE * last
+        while True:
+            part = truncate(html, size)
+            document = self.html2document(part, css, base_url)
+            # The last page of a truncated document may miss content
+            if len(document.pages) > last or len(part) == len(html):
+                break
+            size *= 2
+        # Documents shorter than the first page are previewed from their last page
+        return document.copy(document.pages[first - 1 : last] or document.pages[-1:])
+
+    def document2pdf(
+        self, document: "Document", target: Optional[Union[Path, BinaryIO]] = None
+    ) -> Optional[bytes]:
+        """Write the document as PDF to the target, or return PDF bytes."""
+        # Do not overwrite cache entries linked to the output file
+        if isinstance(target, Path) and target.exists() and target.stat().st_nlink > 1:
+            target.unlink()
+        return document.write_pdf(target, **self.image_options.weasyprint)
+
+    def _render_html(
+        self,
+        raw: str,
+        extras: List[str],
+        extras_config: dict,
+        context: Optional[dict] = None,
+    ) -> str:
+        """Render the frontmatter, Jinja and markdown stages."""
+        # Frontmatter values take precedence over the input context
+        with self._stage("frontmatter"):
+            ftmt_context, template = self.template(raw)
+        with self._stage("jinja"):
+            raw = template.render({**(context or {}), **ftmt_context})
+
+        extensions = MARKDOWN_BASE_EXTENSIONS + extras
+        with self._stage("markdown"):
+            return self.markdown(extensions, extras_config).convert(raw)
+
+    def convert(
+        self,
+        pdf: Union[Path, str, os.PathLike, BinaryIO],
+        raw: Optional[str] = None,
+        md: Optional[Union[Path, str, os.PathLike, TextIO]] = None,
+        css: Optional[Path] = None,
+        base_url: Optional[Path] = None,
+        extras: Optional[List[str]] = None,
+        extras_config: Optional[dict] = None,
+        context: Optional[dict] = None,
+        preview: Optional[Preview] = None,
+    ) -> DocumentStats:
+        """Converts input markdown to styled HTML and renders it to a PDF file.
+
+        The PDF can be written to a writable binary file object instead (it is not
+        cached then): it is written at once to file objects that cannot seek (as
+        pipes). A preview only lays out a part of the document (it is not cached
+        either, see `Preview`). See `md2pdf` for other arguments.
+        """
+        # Paths may be given as strings
+        if isinstance(pdf, (str, os.PathLike)):
+            pdf = Path(pdf)
+        if isinstance(md, (str, os.PathLike)):
+            md = Path(md)
+        stats = self.stats = DocumentStats(
+            input=str(md) if isinstance(md, Path) else None,
+            output=str(pdf) if isinstance(pdf, Path) else None,
+        )
+        started_at = perf_counter()
+        target = pdf if isinstance(pdf, Path) or pdf.seekable() else io.BytesIO()
+        start = 0 if isinstance(target, Path) else target.tell()
+        if self.record_rss:
+            reset_peak_rss()
+        try:
+            self._convert(
+                target, raw, md, css, base_url, extras, extras_config, context, preview
+            )
+            if isinstance(target, Path):
+                stats.size = target.stat().st_size
+            else:
+                stats.size = target.tell() - start
+            if isinstance(target, io.BytesIO) and target is not pdf:
+                cast(BinaryIO, pdf).write(target.getvalue())
+        finally:
+            stats.duration = perf_counter() - started_at
+            if self.record_rss:
+                stats.rss = peak_rss()
+            self.stats = None
+        return stats
+
+    def _convert(
+        self,
+        pdf: Union[Path, BinaryIO],
+        raw: Optional[str],
+        md: Optional[Union[Path, TextIO]],
+        css: Optional[Path],
+        base_url: Optional[Path],
+        extras: Optional[List[str]],
+        extras_config: Optional[dict],
+        context: Optional[dict],
+        preview: Optional[Preview] = None,
+    ):
+        """Run conversion stages of the current document.
+
+        Files loaded during the conversion are recorded as its dependencies.
+        """
+        stats = cast(DocumentStats, self.stats)
+        with record() as dependencies:
+            with self._stage("read"):
+                raw = read_markdown(raw, md)
+
+            key = None
+            if self.cache is not None and isinstance(pdf, Path) and preview is None:
+                with self._stage("cache"):
+                    key = render_key(
+                        raw,
+                        css,
+                        base_url,
+                        extras,
+                        extras_config,
+                        context,
+                        self.image_options.variant,
+                    )
+                    stats.cached = self.cache.get(key, pdf)
+                    if stats.cached:
+                        depend(self.cache.dependencies(key))
+
+            if not stats.cached:
+                html = self.md2html(
+                    raw, extras=extras, extras_config=extras_config, context=context
+                )
+                # Images of previous documents are not needed anymore
+                self.images.trim()
+                document = (
+                    self.html2document(html, css, base_url)
+                    if preview is None
+                    else self.preview(html, preview, css, base_url)
+                )
+                stats.pages = len(document.pages)
+                with self._stage("pdf"):
+                    self.document2pdf(document, pdf)
+        stats.dependencies = dependencies
+
+        if (
+            key is not None
+            and self.cache is not None
+            and isinstance(pdf, Path)
+            and not stats.cached
+        ):
+            with self._stage("cache"):
+                self.cache.put(key, pdf, dependencies)
+
 
 def md2pdf(
-    pdf: Path,
+    pdf: Union[Path, str, os.PathLike, BinaryIO],
     raw: Optional[str] = None,
-    md: Optional[Path] = None,
+    md: Optional[Union[Path, str, os.PathLike, TextIO]] = None,
     css: Optional[Path] = None,
     base_url: Optional[Path] = None,
     extras: Optional[List[str]] = None,
     extras_config: Optional[dict] = None,
     context: Optional[dict] = None,
-):
+    cache_dir: Optional[Path] = None,
+    dpi: Optional[int] = None,
+    jpeg_quality: Optional[int] = None,
+) -> DocumentStats:
     """Converts input markdown to styled HTML and renders it to a PDF file.
 
+    Use a `Converter` instead to convert multiple documents.
+
     Args:
-        pdf: output PDF file path.
-        md: input markdown file path.
+        pdf: output PDF file path, or writable binary file object (as a pipe).
+        md: input markdown file path, or readable text stream.
         raw: input markdown raw string content.
         css: input styles path (CSS).
         base_url: absolute base path for markdown linked content (as images).
         extras: supplementary markdown extensions to activate
         extras_config: a configuration dictionnary for active markdown extensions
         context: input context to use for jinja template rendering
+        cache_dir: render cache directory (unchanged documents are not rendered,
+            remote resources are cached)
+        dpi: maximal resolution of embedded images (larger images are downsampled)
+        jpeg_quality: recompress embedded JPEG images with this quality (0 to 95)
 
     Returns:
-        None
+        The conversion statistics (stages durations, pages and output size).
 
     Raises:
-        ValidationError: if md_content and md_file_path are empty.
+        ValidationError: if md_content and md_file_path are empty, or if image
+            options are invalid.
     """
-    context = context if context else {}
-    extras_config = extras_config if extras_config else {}
+    converter = Converter(
+        cache=RenderCache(cache_dir) if cache_dir is not None else None,
+        html_cache=HTMLCache(cache_dir) if cache_dir is not None else None,
+        fetcher=Fetcher(
+            ResourceCache(cache_dir / "resources") if cache_dir is not None else None
+        ),
+        images=ImageOptions(dpi, jpeg_quality),
+    )
+    return converter.convert(
+        pdf,
+        raw=raw,
+        md=md,
+        css=css,
+        base_url=base_url,
+        extras=extras,
+        extras_config=extras_config,
+        context=context,
+    )
 
-    # Merge base extensions with extras extensions
-    extras = extras if extras and len(extras) else []
 
-    if md:
-        logger.debug("Reading markdown content from file %s", md)
-        raw = md.read_text()
+def md2pdf_many(
+    jobs: Iterable[Job],
+    workers: int = BATCH_WORKERS,
+    executor: ExecutorType = ExecutorType.thread,
+    options: Optional[ConvertOptions] = None,
+) -> Iterator[JobResult]:
+    """Converts documents in a worker pool, yielding results as they complete.
 
-    if raw is None or not len(raw):
-        raise ValidationError(
-            "No markdown content to process (empty file or raw string)"
-        )
+    Workers are warmed up once for the whole batch (markdown engines, stylesheet,
+    fonts, render caches), with the pool options. Jobs are read lazily: only a few
+    jobs per worker are pending at a time. A failed conversion yields its error,
+    and does not stop the others. Closing the generator cancels pending jobs.
 
-    # Check if markdown file is a template
-    if frontmatter.checks(raw):
-        logger.info("Markdown input file contains frontmatter header")
+    Args:
+        jobs: documents to convert (jobs without an output path give PDF bytes).
+        workers: number of workers of the pool.
+        executor: pool executor type (threads or processes).
+        options: conversion options shared by all documents (see `ConvertOptions`).
 
-        # Get context and the template
-        ftmt_context, raw = frontmatter.parse(raw)
-        logger.debug("Frontmatter context %s", context)
-        context.update(ftmt_context)
+    Yields:
+        The result of each job: its output path (or PDF bytes) and conversion
+        statistics (stages durations, pages and output size), or its error.
+    """
+    pool = get_executor(executor, workers, options)
+    pending: dict[Future, Job] = {}
+    try:
+        remaining = iter(jobs)
+        while True:
+            while len(pending) < workers * BATCH_PENDING_JOBS_PER_WORKER:
+                job = next(remaining, None)
+                if job is None:
+                    break
+                pending[pool.submit(convert_job, job)] = job
+            if not pending:
+                return
 
-    # Render the template
-    raw = Template(raw).render(context)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                if (err := future.exception()) is not None:
+                    yield JobResult(job, error=err)
+                else:
+                    yield JobResult(job, *future.result())
+    finally:
+        pool.shutdown(cancel_futures=True)
 
-    extensions = MARKDOWN_BASE_EXTENSIONS + extras
-    raw_html = markdown(raw, extensions=extensions, extension_configs=extras_config)
 
-    # Weasyprint HTML object
-    if base_url is None:
-        base_url = Path.cwd()
-    html: HTML = HTML(string=raw_html, base_url=str(base_url))
+def md2html(
+    raw: Optional[str] = None,
+    md: Optional[Union[Path, str, os.PathLike, TextIO]] = None,
+    extras: Optional[List[str]] = None,
+    extras_config: Optional[dict] = None,
+    context: Optional[dict] = None,
+) -> str:
+    """Converts input markdown to HTML.
+
+    Args:
+        raw: input markdown raw string content.
+        md: input markdown file path, or readable text stream.
+        extras: supplementary markdown extensions to activate
+        extras_config: a configuration dictionnary for active markdown extensions
+        context: input context to use for jinja template rendering
+
+    Returns:
+        The HTML string.
+
+    Raises:
+        ValidationError: if md_content and md_file_path are empty.
+    """
+    return Converter().md2html(
+        raw, md=md, extras=extras, extras_config=extras_config, context=context
+    )
+
+
+def html2document(
+    html: str,
+    css: Optional[Path] = None,
+    base_url: Optional[Path] = None,
+    raw_css: Optional[str] = None,
+) -> "Document":
+    """Lays out styled HTML as a WeasyPrint document.
+
+    Args:
+        html: input HTML string.
+        css: input styles path (CSS).
+        base_url: absolute base path for HTML linked content (as images).
+        raw_css: input styles raw string content (CSS).
+
+    Returns:
+        The WeasyPrint document (its pages can be inspected before writing it).
+    """
+    return Converter().html2document(html, css=css, base_url=base_url, raw_css=raw_css)
 
-    # Get styles
-    styles: list = []
-    if css:
-        styles.append(CSS(filename=css))
 
-    # Generate PDF
-    html.write_pdf(pdf, stylesheets=styles)
+def document2pdf(
+    document: "Document", target: Optional[Union[Path, BinaryIO]] = None
+) -> Optional[bytes]:
+    """Writes a WeasyPrint document as PDF.
+
+    Args:
+        document: the laid out document.
+        target: output PDF file path or writable binary file object.
+
+    Returns:
+        PDF bytes when no target is given, None otherwise.
+    """
+    return Converter().document2pdf(document, target)
@@ -0,0 +1,158 @@
+"""md2pdf dependencies: files loaded while rendering documents.
+
+Files opened for reading by the current thread are recorded using an audit hook:
+this covers markdown sources, snippets included by markdown extensions, and
+stylesheets, imported stylesheets, fonts and images loaded by WeasyPrint. Audit
+hooks see every file opened by the process, and cannot be removed: the hook is
+only installed once dependencies are tracked (see `track`).
+"""
+
+import os
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+# File signature: its modification time and size (None for missing files)
+Signature = Optional[tuple[int, int]]
+Dependencies = dict[str, Signature]
+
+# Python modules and installed packages data are not document dependencies
+IGNORED_SUFFIXES = (".py", ".pyc", ".so")
+IGNORED_DIRECTORIES = tuple(
+    Path(prefix) for prefix in {sys.prefix, sys.base_prefix, sys.exec_prefix}
+)
+
+_recorders = threading.local()
+_hook_lock = threading.Lock()
+
+
+def absolute(path: Union[str, Path]) -> Path:
+    """Get the normalized absolute path (symbolic links are not resolved)."""
+    return Path(os.path.abspath(path))
+
+
+def signature(path: Union[str, Path]) -> Signature:
+    """Get the file signature."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def changed(dependencies: Dependencies) -> bool:
+    """Check whether one of the dependencies has changed since it was recorded."""
+    for path, recorded in dependencies.items():
+        current = signature(path)
+        # Signatures loaded from JSON are lists
+        if current != (tuple(recorded) if recorded is not None else None):
+            return True
+    return False
+
+
+def depend(dependencies: Dependencies):
+    """Add dependencies to active recorders of the current thread.
+
+    Use it when a resource is loaded from a cache instead of being read.
+    """
+    for recorder in getattr(_recorders, "stack", ()):
+        for path, recorded in dependencies.items():
+            recorder.setdefault(path, recorded)
+
+
+def _audit(event: str, args: tuple):
+    """Record files opened for reading while recorders are active."""
+    if event != "open" or not getattr(_recorders, "stack", None):
+        return
+    path, mode, flags = args
+    if not isinstance(path, (str, bytes, os.PathLike)):
+        return
+    if mode is not None and any(m in mode for m in "wax+"):
+        return
+    if mode is None and flags & (os.O_WRONLY | os.O_RDWR | os.O_CREAT):
+        return
+    path = os.path.abspath(os.fsdecode(path))
+    if path.endswith(IGNORED_SUFFIXES) or any(
+        Path(path).is_relative_to(directory) for directory in IGNORED_DIRECTORIES
+    ):
+        return
+    depend({path: signature(path)})
+
+
+@cache
+def _install_hook():
+    """Install the audit hook (once: audit hooks cannot be removed)."""
+    sys.addaudithook(_audit)
+
+
+def track():
+    """Record files opened by recorders of this process from now on.
+
+    Call it when dependencies are needed (_e.g._ render caches or watch mode):
+    it installs an audit hook for the lifetime of the process.
+    """
+    with _hook_lock:
+        _install_hook()
+
+
+@contextmanager
+def record() -> Iterator[Dependencies]:
+    """Record dependencies of the current thread (and their signatures).
+
+    Recorders get dependencies added with `depend`, and files opened for reading
+    once dependencies are tracked (see `track`). Recorders can be nested: outer
+    recorders get dependencies of inner ones.
+    """
+    if not hasattr(_recorders, "stack"):
+        _recorders.stack = []
+    dependencies: Dependencies = {}
+    _recorders.stack.append(dependencies)
+    try:
+        yield dependencies
+    finally:
+        _recorders.stack.pop()
+
+
+@contextmanager
+def paused() -> Iterator[None]:
+    """Do not record files opened by the current thread (_e.g._ cache entries)."""
+    stack = getattr(_recorders, "stack", [])
+    _recorders.stack = []
+    try:
+        yield
+    finally:
+        _recorders.stack = stack
+
+
+class DependencyIndex:
+    """A reverse index of documents dependencies."""
+
+    def __init__(self):
+        """Initialize the index."""
+        self._dependencies: dict[str, set[Path]] = {}
+        self._dependents: defaultdict[Path, set[str]] = defaultdict(set)
+        self.paths: frozenset[Path] = frozenset()
+
+    def update(self, document: str, dependencies: Iterable[Union[str, Path]]):
+        """Replace the dependencies of a document."""
+        paths = {absolute(path) for path in dependencies}
+        for path in self._dependencies.get(document, set()) - paths:
+            self._dependents[path].discard(document)
+            if not self._dependents[path]:
+                del self._dependents[path]
+        for path in paths:
+            self._dependents[path].add(document)
+        self._dependencies[document] = paths
+        # Replaced (not updated) for other threads to read it safely
+        self.paths = frozenset(self._dependents)
+
+    def dependents(self, paths: Iterable[Union[str, Path]]) -> set[str]:
+        """Get documents depending on any of these files."""
+        documents: set[str] = set()
+        for path in paths:
+            documents |= self._dependents.get(absolute(path), set())
+        return documents
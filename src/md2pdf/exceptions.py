@@ -3,3 +3,19 @@
 
 class ValidationError(Exception):
     """md2pdf validation error."""
+
+
+class QueueFullError(Exception):
+    """md2pdf render queue is full."""
+
+
+class FetchError(Exception):
+    """md2pdf resource fetching error."""
+
+
+class MemoryLimitError(Exception):
+    """md2pdf worker process exited, exceeding its memory limit."""
+
+
+class RenderTimeoutError(Exception):
+    """md2pdf worker process exited, exceeding its render timeout."""
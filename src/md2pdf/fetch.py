@@ -0,0 +1,458 @@
+"""md2pdf resources fetching: cache and prefetch resources loaded by documents.
+
+WeasyPrint fetches images and stylesheets one after the other during layout, and
+fetches them again for each document. A `Fetcher` keeps them in memory (and on
+disk when it has a resource cache), revalidates remote resources using their ETag
+or Last-Modified headers, and prefetches remote resources of a document
+concurrently before its layout.
+"""
+
+import json
+import logging
+import mimetypes
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import timezone
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from functools import cached_property, partial
+from html.parser import HTMLParser
+from http import HTTPStatus
+from http.client import HTTPConnection, HTTPException, HTTPResponse, HTTPSConnection
+from pathlib import Path
+from threading import Lock, local
+from time import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.request import url2pathname
+
+from .cache import MemoryCache, RenderCache, _digest, _version
+from .conf import (
+    FETCH_CACHE_MAX_SIZE,
+    FETCH_MAX_AGE,
+    FETCH_MAX_REDIRECTS,
+    FETCH_MEMORY_CACHE_SIZE,
+    FETCH_TIMEOUT,
+    FETCH_WORKERS,
+)
+from .deps import absolute, depend, paused, signature
+from .exceptions import FetchError
+
+if TYPE_CHECKING:
+    from ssl import SSLContext
+
+logger = logging.getLogger(__name__)
+
+REMOTE_SCHEMES = ("http", "https")
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# Resources referenced by CSS, _e.g._ `url("logo.png")` or `url(logo.png)`
+CSS_URLS = re.compile(r"""url\(\s*["']?([^"')\s]+)["']?\s*\)""")
+
+
+@dataclass(frozen=True)
+class Resource:
+    """A fetched resource.
+
+    Remote resources are fresh until `expires` (a timestamp): then they are
+    revalidated using their `etag` or `last_modified` validators. The validator of
+    local files is their signature.
+    """
+
+    url: str
+    body: bytes
+    mime_type: Optional[str] = None
+    encoding: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    expires: float = 0.0
+
+
+class ResourceCache(RenderCache):
+    """An on-disk cache of remote resources, keyed by their URL.
+
+    Entries are a JSON line of the resource metadata followed by its body. Least
+    recently used entries are evicted when the cache exceeds its maximal size.
+    """
+
+    suffix: str = ".res"
+
+    def __init__(self, directory: Path, max_size: int = FETCH_CACHE_MAX_SIZE):
+        """Initialize the cache directory."""
+        super().__init__(directory, max_size)
+
+    def load(self, url: str) -> Optional[Resource]:
+        """Get the cached resource, or None if it is missing."""
+        entry = self.path(_digest(url.encode()))
+        try:
+            with paused():
+                data = entry.read_bytes()
+                self.touch(entry)
+        except FileNotFoundError:
+            return None
+        metadata, _, body = data.partition(b"\n")
+        return Resource(body=body, **json.loads(metadata))
+
+    def store(self, url: str, resource: Resource):
+        """Store the resource as a cache entry."""
+        metadata = {k: v for k, v in asdict(resource).items() if k != "body"}
+        with self._tmp(_digest(url.encode())) as tmp:
+            tmp.write_bytes(json.dumps(metadata).encode() + b"\n" + resource.body)
+
+
+def _cache_control(headers: Message) -> tuple[float, bool]:
+    """Get the freshness lifetime of a response, and whether it can be stored."""
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    max_age: float = FETCH_MAX_AGE
+    if "no-cache" in directives:
+        max_age = 0
+    elif "max-age" in directives:
+        try:
+            max_age = float(directives["max-age"])
+        except ValueError:
+            pass
+    elif "Expires" in headers:
+        # Invalid dates (_e.g._ "0") mean that the response has already expired
+        expires = _timestamp(headers["Expires"])
+        date = _timestamp(headers.get("Date"))
+        max_age = max(expires - (date or time()), 0) if expires is not None else 0
+    return max_age, "no-store" not in directives
+
+
+def _timestamp(date: Optional[str]) -> Optional[float]:
+    """Get the timestamp of an HTTP date, None if it is missing or invalid."""
+    if date is None:
+        return None
+    try:
+        parsed = parsedate_to_datetime(date)
+    except (TypeError, ValueError):
+        return None
+    # Dates without a time zone are in UTC
+    return parsed.replace(tzinfo=parsed.tzinfo or timezone.utc).timestamp()
+
+
+def _response(resource: Resource) -> Any:
+    """Get the response of a WeasyPrint URL fetcher for the resource."""
+    try:
+        from weasyprint.urls import URLFetcherResponse
+    except ImportError:
+        # URL fetchers of WeasyPrint < 68 return dictionaries
+        return {
+            "string": resource.body,
+            "mime_type": resource.mime_type,
+            "encoding": resource.encoding,
+            "redirected_url": resource.url,
+        }
+
+    headers = {}
+    if resource.mime_type is not None:
+        charset = f"; charset={resource.encoding}" if resource.encoding else ""
+        headers["Content-Type"] = f"{resource.mime_type}{charset}"
+    return URLFetcherResponse(resource.url, resource.body, headers)
+
+
+class _ResourcesParser(HTMLParser):
+    """Find URLs of resources loaded by an HTML document."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        super().__init__(convert_charrefs=True)
+        self.urls: List[str] = []
+        self._style = False
+
+    def handle_starttag(self, tag, attrs):
+        """Find resources of elements (images, stylesheets, inline styles)."""
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "src" or (tag == "link" and name == "href"):
+                self.urls.append(value)
+            elif name == "style":
+                self.urls += CSS_URLS.findall(value)
+        self._style = tag == "style"
+
+    def handle_endtag(self, tag):
+        """Leave an element."""
+        self._style = False
+
+    def handle_data(self, data):
+        """Find resources of style elements."""
+        if self._style:
+            self.urls += CSS_URLS.findall(data)
+
+
+def resource_urls(html: str) -> List[str]:
+    """Find URLs of remote resources loaded by an HTML document."""
+    parser = _ResourcesParser()
+    parser.feed(html)
+    parser.close()
+    return list(
+        dict.fromkeys(
+            url for url in parser.urls if urlsplit(url).scheme in REMOTE_SCHEMES
+        )
+    )
+
+
+class Fetcher:
+    """A caching, prefetching WeasyPrint URL fetcher.
+
+    Remote resources are kept in memory (and in the resource cache, if any) and
+    requested again once they are stale, with conditional requests. Connections
+    are reused per host. Local files are kept in memory until they change. Other
+    URLs (_e.g._ `data:` URLs) are fetched by WeasyPrint.
+
+    A fetcher is thread-safe: it can be shared by converters of worker threads.
+    """
+
+    # Fetching errors do not stop the rendering (read by WeasyPrint >= 68)
+    _fail_on_errors = False
+
+    def __init__(
+        self,
+        cache: Optional[ResourceCache] = None,
+        timeout: float = FETCH_TIMEOUT,
+        workers: int = FETCH_WORKERS,
+        headers: Optional[dict] = None,
+        ssl_context: Optional["SSLContext"] = None,
+        size: int = FETCH_MEMORY_CACHE_SIZE,
+        files: bool = True,
+    ):
+        """Initialize caches and the connections pool.
+
+        Local files (`file:` URLs) are not fetched when `files` is false.
+        """
+        self.cache = cache
+        self.files = files
+        self.timeout = timeout
+        self.workers = workers
+        self.headers = {"User-Agent": f"md2pdf/{_version('md2pdf')}", **(headers or {})}
+        self.ssl_context = ssl_context
+        self._lock = Lock()
+        self._memory: MemoryCache[Resource] = MemoryCache(size)
+        # Idle connections per origin: (scheme, host, port)
+        self._idle: dict[tuple[str, str, Optional[int]], List[HTTPConnection]] = {}
+        # Prefetch errors of the document converted by each thread, raised again
+        # upon its next fetch (instead of retrying)
+        self._document = local()
+
+    def __call__(self, url: str) -> Any:
+        """Fetch a resource for WeasyPrint."""
+        if urlsplit(url).scheme.lower() not in (*REMOTE_SCHEMES, "file"):
+            return self._default(url)
+        return _response(self.fetch(url))
+
+    @cached_property
+    def _default(self) -> Callable[[str], Any]:
+        """Get the default WeasyPrint URL fetcher."""
+        try:
+            from weasyprint.urls import URLFetcher
+        except ImportError:
+            from weasyprint import default_url_fetcher
+
+            return partial(default_url_fetcher, timeout=self.timeout)
+        return URLFetcher(timeout=self.timeout, ssl_context=self.ssl_context)
+
+    def fetch(self, url: str) -> Resource:
+        """Fetch a remote resource or a local file."""
+        error = getattr(self._document, "errors", {}).pop(url, None)
+        if error is not None:
+            raise error
+        if urlsplit(url).scheme.lower() == "file":
+            if not self.files:
+                raise FetchError(f"Local files are not fetched: {url}")
+            return self._fetch_file(url)
+        return self._fetch_remote(url)
+
+    def prefetch(self, urls: Iterable[str]):
+        """Fetch remote resources of a document concurrently (unless they are fresh).
+
+        Prefetch errors are raised when the document fetches the resource, once:
+        they are forgotten when this thread prefetches resources of another
+        document.
+        """
+        errors: dict[str, Exception] = {}
+        self._document.errors = errors
+        now = time()
+        with self._lock:
+            stale = [
+                url
+                for url in dict.fromkeys(urls)
+                if urlsplit(url).scheme.lower() in REMOTE_SCHEMES
+                and not ((cached := self._memory.get(url)) and cached.expires > now)
+            ]
+        if not stale:
+            return
+
+        logger.debug("Prefetching %d resources", len(stale))
+        with ThreadPoolExecutor(max_workers=min(len(stale), self.workers)) as pool:
+            futures = [(url, pool.submit(self.fetch, url)) for url in stale]
+        for url, future in futures:
+            error = future.exception()
+            if isinstance(error, Exception):
+                logger.debug("Could not prefetch %s: %s", url, error)
+                errors[url] = error
+
+    def close(self):
+        """Close idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _fetch_file(self, url: str) -> Resource:
+        """Read a local file, or get it from memory if it has not changed."""
+        path = absolute(url2pathname(urlsplit(url).path))
+        current = signature(path)
+        validator = json.dumps(current)
+        with self._lock:
+            cached = self._memory.get(url)
+        if cached is not None and cached.etag == validator:
+            # The file is not opened: record it as a dependency
+            depend({str(path): current})
+            return cached
+
+        resource = Resource(
+            url=urlunsplit(urlsplit(url)._replace(query="", fragment="")),
+            body=path.read_bytes(),
+            mime_type=mimetypes.guess_type(path.name)[0],
+            etag=validator,
+        )
+        with self._lock:
+            self._memory.put(url, resource)
+        return resource
+
+    def _fetch_remote(self, url: str) -> Resource:
+        """Fetch a remote resource, or get it from caches if it is fresh."""
+        with self._lock:
+            cached = self._memory.get(url)
+        if cached is None and self.cache is not None:
+            cached = self.cache.load(url)
+        if cached is not None and cached.expires > time():
+            with self._lock:
+                self._memory.put(url, cached)
+            return cached
+
+        try:
+            resource, store = self._request(url, cached)
+        except (OSError, HTTPException) as error:
+            if cached is None:
+                raise
+            logger.warning("Could not revalidate %s (%s), using it anyway", url, error)
+            return cached
+
+        with self._lock:
+            self._memory.put(url, resource)
+            if store and self.cache is not None:
+                self.cache.store(url, resource)
+        return resource
+
+    def _request(self, url: str, cached: Optional[Resource]) -> tuple[Resource, bool]:
+        """Request a remote resource (conditionally if it is cached).
+
+        Return the resource and whether it can be stored.
+        """
+        headers = dict(self.headers)
+        if cached is not None and cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified is not None:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        location = url
+        for _ in range(FETCH_MAX_REDIRECTS + 1):
+            response, body = self._get(location, headers)
+            redirect = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or redirect is None:
+                break
+            location = urljoin(location, redirect)
+        else:
+            raise FetchError(f"Too many redirects fetching {url}")
+
+        max_age, store = _cache_control(response.headers)
+        if response.status == HTTPStatus.NOT_MODIFIED and cached is not None:
+            logger.debug("Resource %s has not changed", url)
+            resource = replace(
+                cached,
+                etag=response.getheader("ETag", cached.etag),
+                last_modified=response.getheader("Last-Modified", cached.last_modified),
+                expires=time() + max_age,
+            )
+            return resource, store
+        if response.status != HTTPStatus.OK:
+            raise FetchError(f"HTTP error {response.status} fetching {location}")
+
+        content_type = response.getheader("Content-Type")
+        resource = Resource(
+            url=location,
+            body=body,
+            mime_type=(
+                response.headers.get_content_type()
+                if content_type is not None
+                else mimetypes.guess_type(urlsplit(location).path)[0]
+            ),
+            encoding=response.headers.get_content_charset(),
+            etag=response.getheader("ETag"),
+            last_modified=response.getheader("Last-Modified"),
+            expires=time() + max_age,
+        )
+        return resource, store
+
+    def _get(self, url: str, headers: dict) -> tuple[HTTPResponse, bytes]:
+        """Send a GET request using an idle connection to the host (if any)."""
+        parts = urlsplit(url)
+        if not parts.hostname:
+            raise FetchError(f"Invalid URL {url}")
+        origin = (parts.scheme.lower(), parts.hostname, parts.port)
+        target = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        while True:
+            connection, reused = self._connection(origin)
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (ConnectionError, HTTPException):
+                connection.close()
+                if reused:
+                    # The host closed the idle connection: open a new one
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(origin, connection)
+        return response, body
+
+    def _connection(
+        self, origin: tuple[str, str, Optional[int]]
+    ) -> tuple[HTTPConnection, bool]:
+        """Get an idle connection to the origin, or a new one (and if it is reused)."""
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = origin
+        if scheme == "https":
+            connection: HTTPConnection = HTTPSConnection(
+                host, port, timeout=self.timeout, context=self.ssl_context
+            )
+        else:
+            connection = HTTPConnection(host, port, timeout=self.timeout)
+        return connection, False
+
+    def _release(self, origin: tuple[str, str, Optional[int]], connection):
+        """Keep the connection for next requests to the origin."""
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.workers:
+                idle.append(connection)
+                return
+        connection.close()
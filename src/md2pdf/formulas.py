@@ -0,0 +1,252 @@
+"""md2pdf formulas: render TeX formulas of the `markdown_katex` extension.
+
+The `markdown_katex` extension runs the KaTeX program once per formula, while the
+same formulas recur across documents. Formulas rendered by KaTeX are cached (in
+memory, and on disk), and formulas of a document missing from the cache are
+rendered concurrently before the document is converted.
+
+Formulas are rendered as the extension does, including its options (_e.g._
+`no_inline_svg` embeds formulas as SVG images, working around WeasyPrint not
+supporting inline SVG). The extension preprocessor is extended by overriding
+its internal methods: the `markdown_katex` version is bounded by the `latex`
+extra.
+"""
+
+import json
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from threading import Lock
+from typing import Iterable, List, Optional
+
+try:
+    from markdown_katex import extension, wrapper
+except ModuleNotFoundError as err:
+    raise RuntimeError(
+        "Missing dependency: to render formulas, you should install the `latex` "
+        "extra first: `pip install md2pdf[latex]`"
+    ) from err
+
+from .cache import MemoryCache, RenderCache, _digest, _dumps, _version
+from .conf import FORMULA_MEMORY_CACHE_SIZE, FORMULA_WORKERS
+from .deps import paused
+
+logger = logging.getLogger(__name__)
+
+# Extension options that are not KaTeX options
+EXTENSION_OPTIONS = ("no_inline_svg", "insert_fonts_css")
+
+Formula = tuple[str, dict]
+
+
+def _katex_options(options: dict) -> dict:
+    """Get KaTeX options from extension options."""
+    return {
+        name: value for name, value in options.items() if name not in EXTENSION_OPTIONS
+    }
+
+
+def formula_key(tex: str, options: dict) -> str:
+    """Compute the cache key of a formula rendered with KaTeX options."""
+    return _digest(tex.encode(), _dumps(options), _version("markdown-katex").encode())
+
+
+class FormulaCache(RenderCache):
+    """An on-disk cache of formulas rendered by KaTeX (as HTML)."""
+
+    suffix: str = ".katex"
+
+    def load(self, key: str) -> Optional[str]:
+        """Get the rendered formula, or None if it is missing."""
+        try:
+            with paused():
+                return self.path(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key: str, html: str):
+        """Store the rendered formula as a cache entry."""
+        with self._tmp(key) as tmp:
+            tmp.write_text(html)
+
+
+class FormulaRenderer:
+    """Render formulas with KaTeX, using caches.
+
+    A renderer is thread-safe: it can be shared by converters of worker threads.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[FormulaCache] = None,
+        workers: int = FORMULA_WORKERS,
+        size: int = FORMULA_MEMORY_CACHE_SIZE,
+    ):
+        """Initialize caches."""
+        self.cache = cache
+        self.workers = workers
+        self._lock = Lock()
+        self._memory: MemoryCache[str] = MemoryCache(size)
+        # Batch errors, raised again upon the next render (instead of retrying)
+        self._errors: dict[str, Exception] = {}
+
+    @cached_property
+    def command(self) -> List[str]:
+        """Get the KaTeX command (looked up once)."""
+        return wrapper.get_bin_cmd()
+
+    def _cached(self, key: str) -> Optional[str]:
+        """Get a rendered formula from caches."""
+        with self._lock:
+            html = self._memory.get(key)
+        if html is None and self.cache is not None:
+            html = self.cache.load(key)
+            if html is not None:
+                with self._lock:
+                    self._memory.put(key, html)
+        return html
+
+    def _katex(self, tex: str, options: dict) -> str:
+        """Render a formula with the KaTeX program."""
+        arguments = []
+        for name, value in options.items():
+            argument = name if name.startswith("--") else f"--{name}"
+            if value is True:
+                arguments.append(argument)
+            elif value is not False:
+                arguments += [argument, str(value)]
+
+        process = subprocess.run(  # noqa: S603
+            [*self.command, *arguments],
+            input=tex.encode(wrapper.KATEX_INPUT_ENCODING),
+            capture_output=True,
+            check=False,
+        )
+        if process.returncode != 0:
+            output = b"\n".join((process.stdout, process.stderr)).decode().strip()
+            raise wrapper.KatexError(f"Error processing '{tex}': {output}")
+        return process.stdout.decode(wrapper.KATEX_OUTPUT_ENCODING).strip()
+
+    def render(self, tex: str, options: dict) -> str:
+        """Render a formula (with `markdown_katex` extension options).
+
+        KaTeX output is cached: SVG images are made from it when the
+        `no_inline_svg` option is set, like `markdown_katex.extension.tex2html`.
+        """
+        katex_options = _katex_options(options)
+        key = formula_key(tex, katex_options)
+        with self._lock:
+            error = self._errors.pop(key, None)
+        if error is not None:
+            raise error
+
+        html = self._cached(key)
+        if html is None:
+            html = self._katex(tex, katex_options)
+            with self._lock:
+                self._memory.put(key, html)
+                if self.cache is not None:
+                    self.cache.store(key, html)
+
+        if options.get("no_inline_svg"):
+            html = extension.svg2img(html)
+        return html
+
+    def render_many(self, formulas: Iterable[Formula]):
+        """Render formulas missing from caches concurrently."""
+        missing = {}
+        for tex, options in formulas:
+            key = formula_key(tex, _katex_options(options))
+            if key not in missing and self._cached(key) is None:
+                missing[key] = (tex, options)
+        if not missing:
+            return
+
+        logger.debug("Rendering %d formulas with KaTeX", len(missing))
+        # Look the command up before workers do
+        self.command  # noqa: B018
+        with ThreadPoolExecutor(max_workers=min(len(missing), self.workers)) as pool:
+            futures = [
+                (key, pool.submit(self.render, tex, options))
+                for key, (tex, options) in missing.items()
+            ]
+        for key, future in futures:
+            error = future.exception()
+            if isinstance(error, Exception):
+                with self._lock:
+                    self._errors[key] = error
+
+
+class KatexPreprocessor(extension.KatexPreprocessor):
+    """Replace formulas by markers, rendering formulas of a document at once."""
+
+    # Formulas of the document, while they are collected
+    formulas: Optional[List[Formula]] = None
+
+    def run(self, lines):
+        """Collect formulas and render them, then replace them by markers."""
+        self.formulas = []
+        list(self._iter_out_lines(lines))
+        self.ext.renderer.render_many(self.formulas)
+        self.formulas = None
+        return list(self._iter_out_lines(lines))
+
+    def _formula(self, tex: str, options: dict) -> str:
+        """Render a formula (or collect it while formulas are collected)."""
+        if self.formulas is not None:
+            self.formulas.append((tex, options))
+            return ""
+        return self.ext.renderer.render(tex, options)
+
+    def _make_tag_for_block(self, block_lines):
+        """Replace a math block by a marker."""
+        indent_len = len(block_lines[0]) - len(block_lines[0].lstrip())
+        block_text = "\n".join(line[indent_len:] for line in block_lines).rstrip()
+        marker_id = extension.make_marker_id(f"block{block_text}")
+        marker = f"tmp_block_md_katex_{marker_id}"
+
+        # Options can be given in the block header
+        options = {"display-mode": True, **self.ext.options}
+        tex = extension._clean_block_text(block_text)
+        header, rest = tex.split("\n", 1)
+        if "{" in header and "}" in header:
+            options.update(json.loads(header))
+            tex = rest
+
+        self.ext.math_html[marker] = f"<p>{self._formula(tex, options)}</p>"
+        return block_lines[0][:indent_len] + marker
+
+    def _make_tag_for_inline(self, inline_text):
+        """Replace an inline formula by a marker."""
+        marker_id = extension.make_marker_id(f"inline{inline_text}")
+        marker = f"tmp_inline_md_katex_{marker_id}"
+        tex = extension._clean_inline_text(inline_text)
+        self.ext.math_html[marker] = self._formula(tex, dict(self.ext.options))
+        return marker
+
+
+class KatexExtension(extension.KatexExtension):
+    """The `markdown_katex` extension, rendering formulas with a renderer."""
+
+    def __init__(self, renderer: Optional[FormulaRenderer] = None, **kwargs):
+        """Initialize the extension with its formula renderer."""
+        self.renderer = renderer if renderer is not None else FormulaRenderer()
+        super().__init__(**kwargs)
+
+    def extendMarkdown(self, md):
+        """Register extension processors."""
+        md.preprocessors.register(
+            KatexPreprocessor(md, self), name="katex_fenced_code_block", priority=50
+        )
+        md.postprocessors.register(
+            extension.KatexPostprocessor(md, self),
+            name="katex_fenced_code_block",
+            priority=0,
+        )
+        md.registerExtension(self)
+
+
+def makeExtension(**kwargs):
+    """Make the extension (as `md2pdf.formulas`)."""
+    return KatexExtension(**kwargs)
@@ -0,0 +1,135 @@
+"""md2pdf highlight: memoise syntax highlighting of code blocks.
+
+The `pymdownx.highlight` extension (used by `pymdownx.superfences`) runs Pygments
+on every code block of every render, while the same code samples recur across
+documents. Highlighted blocks are cached (in memory, and on disk), keyed by their
+language, code and formatter options.
+"""
+
+import logging
+from functools import partial
+from threading import Lock
+from typing import Optional
+
+from pymdownx import highlight
+
+from .cache import MemoryCache, RenderCache, _digest, _dumps, _version
+from .conf import HIGHLIGHT_MEMORY_CACHE_SIZE
+from .deps import paused
+
+logger = logging.getLogger(__name__)
+
+
+def highlight_key(src: str, language: str, options: dict) -> str:
+    """Compute the cache key of a code block highlighted with formatter options."""
+    return _digest(
+        src.encode(),
+        language.encode(),
+        _dumps(options),
+        _version("pygments").encode(),
+        _version("pymdown-extensions").encode(),
+    )
+
+
+class HighlightCache(RenderCache):
+    """An on-disk cache of highlighted code blocks (as HTML)."""
+
+    suffix: str = ".hl"
+
+    def load(self, key: str) -> Optional[str]:
+        """Get the highlighted block, or None if it is missing."""
+        try:
+            with paused():
+                return self.path(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key: str, html: str):
+        """Store the highlighted block as a cache entry."""
+        with self._tmp(key) as tmp:
+            tmp.write_text(html)
+
+
+class Highlights:
+    """Highlighted code blocks kept in memory (and on disk when a cache is given).
+
+    Highlights are thread-safe: they can be shared by converters of worker threads.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[HighlightCache] = None,
+        size: int = HIGHLIGHT_MEMORY_CACHE_SIZE,
+    ):
+        """Initialize caches."""
+        self.cache = cache
+        self._lock = Lock()
+        self._memory: MemoryCache[str] = MemoryCache(size)
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a highlighted block, or None if it is missing."""
+        with self._lock:
+            html = self._memory.get(key)
+        if html is None and self.cache is not None:
+            html = self.cache.load(key)
+            if html is not None:
+                with self._lock:
+                    self._memory.put(key, html)
+        return html
+
+    def put(self, key: str, html: str):
+        """Store a highlighted block."""
+        with self._lock:
+            self._memory.put(key, html)
+            if self.cache is not None:
+                self.cache.store(key, html)
+
+
+class CachedHighlight(highlight.Highlight):
+    """The `pymdownx.highlight` highlighter, looking code blocks up first."""
+
+    def __init__(self, md, highlights: Optional[Highlights] = None, **kwargs):
+        """Initialize the highlighter with its formatter options."""
+        super().__init__(md, **kwargs)
+        self.highlights = highlights
+        self.options = kwargs
+
+    def highlight(self, src, language, css_class="highlight", **kwargs):
+        """Highlight code (inline code is not cached)."""
+        if self.highlights is None or kwargs.get("inline"):
+            return super().highlight(src, language, css_class, **kwargs)
+
+        # The block count is only used for line spans and anchors identifiers
+        if not (self.line_spans or self.line_anchors) or kwargs.get("id_value"):
+            kwargs.pop("code_block_count", None)
+        key = highlight_key(
+            src, language, {**self.options, **kwargs, "css_class": css_class}
+        )
+        html = self.highlights.get(key)
+        if html is not None:
+            return html
+
+        stashed = len(self.md.htmlStash.rawHtmlBlocks)
+        html = super().highlight(src, language, css_class, **kwargs)
+        # HTML titles are stashed by the markdown engine: do not cache such blocks
+        if len(self.md.htmlStash.rawHtmlBlocks) == stashed:
+            self.highlights.put(key, html)
+        return html
+
+
+class HighlightExtension(highlight.HighlightExtension):
+    """The `pymdownx.highlight` extension, highlighting with caches."""
+
+    def __init__(self, highlights: Optional[Highlights] = None, **kwargs):
+        """Initialize the extension with its highlights."""
+        self.highlights = highlights if highlights is not None else Highlights()
+        super().__init__(**kwargs)
+
+    def get_pymdownx_highlighter(self):
+        """Get the highlighter (used by `pymdownx.superfences`)."""
+        return partial(CachedHighlight, highlights=self.highlights)
+
+
+def makeExtension(**kwargs):
+    """Make the extension (as `md2pdf.highlight`)."""
+    return HighlightExtension(**kwargs)
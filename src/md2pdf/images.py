@@ -0,0 +1,151 @@
+"""md2pdf images: share decoded images between documents, downsample them.
+
+WeasyPrint decodes the images of each document from scratch, and embeds them at
+their full resolution. An `ImageCache` keeps decoded images of a converter between
+documents (until their source changes), and `ImageOptions` downsample images to a
+maximal resolution and recompress JPEG images.
+"""
+
+import logging
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from http.client import HTTPException
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from .conf import IMAGE_MEMORY_CACHE_SIZE
+from .exceptions import FetchError, ValidationError
+from .fetch import REMOTE_SCHEMES, Fetcher, Resource
+
+logger = logging.getLogger(__name__)
+
+# JPEG quality range supported by Pillow
+JPEG_QUALITY_RANGE = range(96)
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """Options of images embedded in PDF files.
+
+    Attributes:
+        dpi: maximal resolution of images (larger images are downsampled)
+        jpeg_quality: recompress JPEG images with this quality (from 0 to 95)
+    """
+
+    dpi: Optional[int] = None
+    jpeg_quality: Optional[int] = None
+
+    def __post_init__(self):
+        """Check options values."""
+        if self.dpi is not None and self.dpi < 1:
+            raise ValidationError(f"Invalid image resolution: {self.dpi} DPI")
+        if self.jpeg_quality is not None and (
+            self.jpeg_quality not in JPEG_QUALITY_RANGE
+        ):
+            raise ValidationError(f"Invalid JPEG quality: {self.jpeg_quality}")
+
+    @property
+    def variant(self) -> dict:
+        """Get the render cache key variant (empty for default options)."""
+        options = {
+            name: value for name, value in asdict(self).items() if value is not None
+        }
+        return {"images": options} if options else {}
+
+    @property
+    def weasyprint(self) -> dict:
+        """Get WeasyPrint rendering options."""
+        return {"dpi": self.dpi, "jpeg_quality": self.jpeg_quality}
+
+
+class ImageCache(dict):
+    """Decoded images shared by documents (a WeasyPrint image cache).
+
+    WeasyPrint stores decoded images by URL, and their data by image id. Images of
+    local files and remote resources are checked with the fetcher before being
+    reused: they are decoded again once their source has changed.
+
+    Images of a document are needed until its PDF is written: least recently used
+    images are only evicted by `trim`, between documents. An image cache is not
+    thread-safe: use one per converter.
+    """
+
+    def __init__(self, fetcher: Fetcher, size: int = IMAGE_MEMORY_CACHE_SIZE):
+        """Initialize the cache."""
+        super().__init__()
+        self.fetcher = fetcher
+        self.size = size
+        # Images URLs (least recently used first) and their fetched sources
+        self._sources: OrderedDict[str, Optional[Resource]] = OrderedDict()
+
+    def _source(self, url: str) -> Optional[Resource]:
+        """Fetch the image source (None if it is not fetched by the fetcher)."""
+        if urlsplit(url).scheme.lower() not in (*REMOTE_SCHEMES, "file"):
+            return None
+        return self.fetcher.fetch(url)
+
+    def _changed(self, url: str) -> bool:
+        """Check whether the image source has changed since it was decoded."""
+        cached = self._sources[url]
+        if cached is None:
+            return False
+        try:
+            current = self._source(url)
+        except (OSError, HTTPException, FetchError):
+            return True
+        return current is None or current.body != cached.body
+
+    def __contains__(self, key: object) -> bool:
+        """Check whether an image (or image data) is cached and up to date."""
+        if isinstance(key, str) and key in self._sources and self._changed(key):
+            logger.debug("Image %s has changed", key)
+            del self._sources[key]
+            super().__delitem__(key)
+        return super().__contains__(key)
+
+    def __getitem__(self, key: Any) -> Any:
+        """Get an image (or image data)."""
+        if key in self._sources:
+            self._sources.move_to_end(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: Any, value: Any):
+        """Store an image by URL (or image data, as bytes, by image id)."""
+        if value is None:
+            # Images that failed to load are not kept: their source may be fixed
+            return
+        super().__setitem__(key, value)
+        if isinstance(value, bytes):
+            return
+        try:
+            self._sources[key] = self._source(key)
+        except (OSError, HTTPException, FetchError):
+            super().__delitem__(key)
+            return
+        self._sources.move_to_end(key)
+
+    def trim(self):
+        """Evict least recently used images (and their data) beyond the size.
+
+        WeasyPrint prefixes data keys by the image id. This layout is internal to
+        WeasyPrint: when data of an unknown image is found, all images are evicted
+        instead.
+        """
+        while len(self._sources) > self.size:
+            url, _ = self._sources.popitem(last=False)
+            image = super().pop(url)
+            prefix = f"{getattr(image, 'id', None)}-"
+            for key in [key for key in self if str(key).startswith(prefix)]:
+                super().__delitem__(key)
+
+        prefixes = tuple(
+            f"{getattr(dict.get(self, url), 'id', None)}-" for url in self._sources
+        )
+        if any(
+            not str(key).startswith(prefixes)
+            for key in self
+            if key not in self._sources
+        ):
+            logger.warning("Unknown WeasyPrint image cache layout, evicting images")
+            self._sources.clear()
+            self.clear()
@@ -0,0 +1,180 @@
+"""md2pdf inputs: find markdown files, and tell which documents are up to date.
+
+Inputs are markdown files, directories (searched recursively for markdown files)
+or glob patterns (`**` matches any number of sub-directories). Files found in a
+directory or by a pattern keep their path relative to it, so that output files
+can mirror the source tree.
+
+Like make, a `Manifest` tells which documents are up to date: their PDF is newer
+than their markdown source, stylesheet and every file they loaded when they were
+rendered (snippets, imported stylesheets, fonts, images…).
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .conf import INPUT_SUFFIXES
+from .deps import Dependencies, Signature, absolute, signature
+from .stats import DocumentStats
+
+logger = logging.getLogger(__name__)
+
+# Manifest file name, in the output directory
+MANIFEST_FILE = ".md2pdf-manifest.json"
+
+GLOB_PATTERN = re.compile(r"[*?[]")
+
+
+def is_pattern(path: str) -> bool:
+    """Check whether an input path is a glob pattern."""
+    return GLOB_PATTERN.search(path) is not None
+
+
+def _root(pattern: str) -> Path:
+    """Get the directory a glob pattern is relative to (its fixed part)."""
+    root = Path()
+    for part in Path(pattern).parts:
+        if is_pattern(part):
+            break
+        root /= part
+    return root
+
+
+def _walk(directory: Path) -> Iterable[Path]:
+    """Find markdown files in a directory tree (hidden entries are skipped)."""
+    for parent, directories, files in os.walk(directory):
+        directories[:] = sorted(d for d in directories if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith(".") and name.endswith(INPUT_SUFFIXES):
+                yield Path(parent) / name
+
+
+def find_inputs(inputs: Iterable[Path]) -> dict[Path, Path]:
+    """Find markdown files of inputs (files, directories or glob patterns).
+
+    Returns:
+        Markdown file paths (in inputs order, without duplicates) mapped to their
+        path relative to the directory (or pattern) they were found in.
+    """
+    found: dict[Path, Path] = {}
+    files: Iterable[Path]
+    for path in inputs:
+        if is_pattern(str(path)):
+            root = _root(str(path))
+            matches = sorted(glob.glob(str(path), recursive=True))
+            files = (Path(match) for match in matches if os.path.isfile(match))
+        elif path.is_dir():
+            root, files = path, _walk(path)
+        else:
+            root, files = path.parent, iter([path])
+        for md in files:
+            found.setdefault(md, md.relative_to(root))
+    return found
+
+
+def mirror(inputs: dict[Path, Path], output_dir: Path) -> dict[Path, Path]:
+    """Get output PDF paths of markdown files, mirroring their source tree."""
+    return {
+        md: output_dir / relative.with_suffix(".pdf") for md, relative in inputs.items()
+    }
+
+
+class Manifest:
+    """Documents converted by previous runs, with their options and dependencies.
+
+    The manifest is kept in a JSON file: it tells which documents are up to date
+    with a few file system checks only, without reading them.
+    """
+
+    def __init__(self, path: Path):
+        """Initialize the manifest, loading it from its file."""
+        self.path = path
+        # Markdown file paths: output path, options key and dependencies
+        self._entries: dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """Load the manifest file (an invalid file is ignored)."""
+        try:
+            entries = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring invalid manifest %s", self.path)
+            return
+        if isinstance(entries, dict):
+            self._entries = entries
+
+    def save(self):
+        """Write the manifest file (atomically: other runs may be reading it)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(suffix=".tmp", dir=self.path.parent)
+        with os.fdopen(fd, "w") as tmp:
+            json.dump(self._entries, tmp)
+        Path(name).replace(self.path)
+
+    def record(self, stats: Iterable[DocumentStats], options: str):
+        """Record converted documents (failed documents are forgotten)."""
+        for document in stats:
+            if document.input is None or document.output is None:
+                continue
+            md = str(absolute(document.input))
+            if document.error is not None:
+                self._entries.pop(md, None)
+                continue
+            self._entries[md] = {
+                "output": str(absolute(document.output)),
+                "options": options,
+                "dependencies": sorted(document.dependencies),
+            }
+
+    def fresh(
+        self, documents: Iterable[tuple[Path, Path]], options: str
+    ) -> dict[Path, Dependencies]:
+        """Get up to date documents, converted with the same options.
+
+        Args:
+            documents: markdown file paths with their output PDF path.
+            options: conversion options key.
+
+        Returns:
+            Up to date markdown file paths, mapped to their dependencies.
+        """
+        signatures: dict[str, Signature] = {}
+
+        def current(path: str) -> Signature:
+            if path not in signatures:
+                signatures[path] = signature(path)
+            return signatures[path]
+
+        fresh = {}
+        for md, pdf in documents:
+            entry = self._entries.get(str(absolute(md)))
+            if (
+                not isinstance(entry, dict)
+                or entry.get("output") != str(absolute(pdf))
+                or entry.get("options") != options
+            ):
+                continue
+            output = signature(pdf)
+            dependencies = {
+                path: current(path)
+                for path in (str(absolute(md)), *entry.get("dependencies", ()))
+            }
+            if output is not None and all(
+                dependency is not None and dependency[0] <= output[0]
+                for dependency in dependencies.values()
+            ):
+                fresh[md] = dependencies
+        return fresh
+
+
+def manifest_path(output_dir: Optional[Path] = None) -> Path:
+    """Get the manifest path: in the output directory, or the current one."""
+    return (output_dir or Path.cwd()) / MANIFEST_FILE
@@ -0,0 +1,167 @@
+"""md2pdf memory: account for the resident memory of workers, and limit it.
+
+WeasyPrint renders leave sizeable caches and a fragmented heap behind them: the
+resident memory of workers grows over long batches and watch sessions. The peak
+resident memory of each document is recorded in its statistics, and pool workers
+are recycled after a number of documents, or once they exceed a memory budget
+(see `WorkerLimits`).
+
+Memory is measured for the whole process: with worker threads, documents
+converted at the same time share their measures and limits, and the hard limit
+is only enforced in worker processes.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from .conf import WORKER_MEMORY_CHECK_INTERVAL, WORKER_RSS_HARD_LIMIT_RATIO
+from .exceptions import ValidationError
+
+# Linux process status and peak resident memory reset
+PROC_STATUS = Path("/proc/self/status")
+PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+STATUS_MEMORY = re.compile(r"^(VmRSS|VmHWM):\s+(\d+) kB", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class WorkerLimits:
+    """Limits of pool workers: they are recycled once one of them is reached.
+
+    Recycled workers drop their converter (and its caches) and return freed memory
+    to the system. Worker processes are also replaced after `max_tasks` documents
+    (with Python 3.11 or later).
+
+    Attributes:
+        max_tasks: recycle workers after this number of documents
+        max_rss: recycle workers whose resident memory exceeds this budget after a
+            document (in bytes); worker processes exceeding the hard limit (a
+            multiple of the budget) exit and their document fails
+    """
+
+    max_tasks: Optional[int] = None
+    max_rss: Optional[int] = None
+
+    def __post_init__(self):
+        """Check limits values."""
+        if self.max_tasks is not None and self.max_tasks < 1:
+            raise ValidationError(f"Invalid worker tasks limit: {self.max_tasks}")
+        if self.max_rss is not None and self.max_rss < 1:
+            raise ValidationError(f"Invalid worker memory budget: {self.max_rss}")
+
+    @property
+    def hard_rss(self) -> Optional[int]:
+        """Get the resident memory hard limit of documents (in bytes)."""
+        if self.max_rss is None:
+            return None
+        return int(self.max_rss * WORKER_RSS_HARD_LIMIT_RATIO)
+
+    def reached(self, tasks: int) -> bool:
+        """Check whether a worker that has run `tasks` documents is to be recycled."""
+        if self.max_tasks is not None and tasks >= self.max_tasks:
+            return True
+        return (
+            self.max_rss is not None
+            and (current := rss()) is not None
+            and current > self.max_rss
+        )
+
+
+def _status() -> dict[str, int]:
+    """Get current and peak resident memory from the Linux process status."""
+    try:
+        status = PROC_STATUS.read_text()
+    except OSError:
+        return {}
+    return {name: int(kb) * 1024 for name, kb in STATUS_MEMORY.findall(status)}
+
+
+def rss() -> Optional[int]:
+    """Get the resident memory of this process (in bytes), None if it is unknown."""
+    return _status().get("VmRSS")
+
+
+def peak_rss() -> Optional[int]:
+    """Get the peak resident memory of this process (in bytes).
+
+    The peak is measured since the last reset, or since the process started on
+    systems where it cannot be reset. It is None if it is unknown.
+    """
+    if (peak := _status().get("VmHWM")) is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux reports kilobytes, macOS reports bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def reset_peak_rss():
+    """Reset the peak resident memory of this process (on Linux)."""
+    try:
+        PROC_CLEAR_REFS.write_text("5")
+    except OSError:
+        pass
+
+
+@cache
+def _malloc_trim():
+    """Get the glibc function returning freed heap memory to the system."""
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("c")).malloc_trim
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def release():
+    """Collect garbage and return freed heap memory to the system (with glibc)."""
+    gc.collect()
+    if (malloc_trim := _malloc_trim()) is not None:
+        malloc_trim(0)
+
+
+@contextmanager
+def limited(
+    max_rss: Optional[int], exceeded: Callable[[int], object]
+) -> Iterator[None]:
+    """Call `exceeded` when resident memory exceeds `max_rss` (in bytes).
+
+    Memory is checked by a watchdog thread, which calls `exceeded` with the
+    resident memory at most once, and never once the context is left. Pool worker
+    processes exit from it (see `pool.ProcessPool`): threads cannot be safely
+    interrupted.
+    """
+    if max_rss is None:
+        yield
+        return
+
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(WORKER_MEMORY_CHECK_INTERVAL):
+            if (current := rss()) is None or current <= max_rss:
+                continue
+            with lock:
+                if not done.is_set():
+                    exceeded(current)
+                return
+
+    watcher = threading.Thread(target=watch, name="md2pdf-memory", daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        with lock:
+            done.set()
+        watcher.join()
@@ -0,0 +1,49 @@
+"""md2pdf mail merge: render a template with each row of a data file."""
+
+import csv
+import json
+from pathlib import Path
+from typing import Iterator
+
+from .exceptions import ValidationError
+
+
+def read_rows(data: Path) -> Iterator[dict]:
+    """Lazily read data rows from a JSON lines (.jsonl) or CSV (.csv) file."""
+    if data.suffix in (".jsonl", ".ndjson"):
+        with data.open() as lines:
+            for number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.decoder.JSONDecodeError as err:
+                    raise ValidationError(
+                        f"Invalid data row (line {number} should be valid JSON)"
+                    ) from err
+                if not isinstance(row, dict):
+                    raise ValidationError(
+                        f"Invalid data row (line {number} should be a JSON object)"
+                    )
+                yield row
+    elif data.suffix == ".csv":
+        with data.open(newline="") as lines:
+            yield from csv.DictReader(lines)
+    else:
+        raise ValidationError(
+            f"Unsupported data file format '{data.suffix}' (use .jsonl or .csv)"
+        )
+
+
+def output_path(pattern: str, row: dict, index: int) -> Path:
+    """Get the output PDF path of a data row.
+
+    The pattern is formatted with row fields and the row `index` (starting at 1),
+    e.g. `out/{index}-{name}.pdf`.
+    """
+    try:
+        return Path(pattern.format(**{"index": index, **row}))
+    except (KeyError, IndexError, ValueError) as err:
+        raise ValidationError(
+            f"Invalid output pattern '{pattern}' for data row {index} ({err!r})"
+        ) from err
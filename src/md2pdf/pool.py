@@ -0,0 +1,481 @@
+"""md2pdf worker pools."""
+
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from functools import partial, wraps
+from io import BytesIO
+from itertools import count
+from multiprocessing.queues import SimpleQueue
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterator,
+    Optional,
+    ParamSpec,
+    TypeVar,
+    Union,
+)
+
+from .cache import HTMLCache, RenderCache
+from .conf import (
+    MARKDOWN_BASE_EXTENSIONS,
+    PROCESS_START_METHOD,
+    WORKER_EXIT_CODE,
+    WORKER_MEMORY,
+    WORKER_RETRIES,
+)
+from .exceptions import MemoryLimitError, RenderTimeoutError
+from .images import ImageOptions
+from .memory import WorkerLimits, limited, release
+
+if TYPE_CHECKING:
+    from .core import Converter
+    from .fetch import Fetcher
+    from .stats import DocumentStats
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# Worker state (one converter per worker thread or process)
+_worker = threading.local()
+
+# Fetchers shared by worker threads, per cache directory
+_fetchers: dict[tuple[Optional[Path], bool], "Fetcher"] = {}
+_fetchers_lock = threading.Lock()
+
+
+class ExecutorType(str, Enum):
+    """Supported worker pool executors."""
+
+    thread = "thread"
+    process = "process"
+
+
+@dataclass(frozen=True)
+class ConvertOptions:
+    """Conversion options shared by all documents converted by a pool."""
+
+    css: Optional[Path] = None
+    extras: Optional[list[str]] = None
+    extras_config: Optional[dict] = None
+    cache_dir: Optional[Path] = None
+    html_cache_dir: Optional[Path] = None
+    images: ImageOptions = ImageOptions()
+    limits: WorkerLimits = WorkerLimits()
+    record_rss: bool = False
+    dependencies: bool = False
+
+
+@dataclass(frozen=True)
+class Job:
+    """A document to convert by a pool worker (see `md2pdf` for fields).
+
+    Jobs without an output PDF file path are converted to PDF bytes.
+    """
+
+    pdf: Optional[Path] = None
+    raw: Optional[str] = None
+    md: Optional[Path] = None
+    css: Optional[Path] = None
+    base_url: Optional[Path] = None
+    extras: Optional[list[str]] = None
+    extras_config: Optional[dict] = None
+    context: Optional[dict] = None
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """A converted job: its output and statistics, or the error that stopped it.
+
+    The output is the PDF file path, or PDF bytes for jobs without one.
+    """
+
+    job: Job
+    output: Optional[Union[Path, bytes]] = None
+    stats: Optional["DocumentStats"] = None
+    error: Optional[BaseException] = None
+
+
+def get_fetcher(cache_dir: Optional[Path] = None, files: bool = True) -> "Fetcher":
+    """Get the fetcher shared by workers of this process.
+
+    Remote resources are cached in the `resources` sub-directory of the render
+    cache directory (if any). Local files are not fetched unless `files` is true.
+    """
+    from .fetch import Fetcher, ResourceCache
+
+    with _fetchers_lock:
+        if (cache_dir, files) not in _fetchers:
+            _fetchers[cache_dir, files] = Fetcher(
+                ResourceCache(cache_dir / "resources") if cache_dir else None,
+                files=files,
+            )
+        return _fetchers[cache_dir, files]
+
+
+def new_converter(options: ConvertOptions) -> "Converter":
+    """Create a converter configured with the pool options."""
+    from .core import Converter
+
+    return Converter(
+        cache=RenderCache(options.cache_dir) if options.cache_dir else None,
+        html_cache=(
+            HTMLCache(options.html_cache_dir) if options.html_cache_dir else None
+        ),
+        fetcher=get_fetcher(options.cache_dir),
+        images=options.images,
+        record_rss=options.record_rss,
+        dependencies=options.dependencies,
+    )
+
+
+def get_converter(untrusted: bool = False) -> "Converter":
+    """Get the current worker converter (configured with the pool options).
+
+    The converter of untrusted documents (_e.g._ render server requests) renders
+    Jinja templates in a sandbox, does not read local files and does not share
+    the render and HTML caches of documents.
+    """
+    from .core import Converter
+
+    options = getattr(_worker, "options", ConvertOptions())
+    if untrusted:
+        if not hasattr(_worker, "untrusted_converter"):
+            _worker.untrusted_converter = Converter(
+                fetcher=get_fetcher(options.cache_dir, files=False),
+                images=options.images,
+                sandboxed=True,
+            )
+        return _worker.untrusted_converter
+
+    if not hasattr(_worker, "converter"):
+        _worker.converter = new_converter(options)
+    return _worker.converter
+
+
+def recycle():
+    """Recycle the current worker: drop its converter, and release memory."""
+    logger.debug("Recycling worker after %d tasks", getattr(_worker, "tasks", 0))
+    _worker.__dict__.pop("converter", None)
+    _worker.__dict__.pop("untrusted_converter", None)
+    _worker.tasks = 0
+    release()
+
+
+def _exit(exits: Optional[SimpleQueue], task: Optional[int], error: Exception):
+    """Exit this worker process, reporting its task error to the pool.
+
+    See `ProcessPool`.
+    """
+    if exits is not None and task is not None:
+        exits.put((task, error))
+    os._exit(WORKER_EXIT_CODE)
+
+
+def _exceeded(exits: Optional[SimpleQueue], task: Optional[int], current: int):
+    """Exit this worker process as its resident memory exceeds its hard limit."""
+    logger.warning("Resident memory exceeds its hard limit: %d bytes", current)
+    _exit(exits, task, MemoryLimitError("Worker process exceeded its memory limit"))
+
+
+@contextmanager
+def deadline(timeout: Optional[float]) -> Iterator[None]:
+    """Exit this worker process if the task lasts more than `timeout` seconds.
+
+    The task fails with a `RenderTimeoutError`, and the worker is replaced (see
+    `ProcessPool`). Threads cannot be safely interrupted: tasks of worker threads
+    run until they end.
+    """
+    exits = getattr(_worker, "exits", None)
+    if timeout is None or exits is None:
+        yield
+        return
+
+    lock = threading.Lock()
+    done = threading.Event()
+    # The timer thread cannot read the worker state
+    task = getattr(_worker, "task", None)
+    error = RenderTimeoutError(f"Render exceeded its {timeout:g}s timeout")
+
+    def expire():
+        with lock:
+            if not done.is_set():
+                logger.warning("Task exceeds its %gs timeout", timeout)
+                _exit(exits, task, error)
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        with lock:
+            done.set()
+        timer.cancel()
+
+
+def worker_task(func: Callable[P, R]) -> Callable[P, R]:
+    """Run a function as a pool worker task, within the worker limits.
+
+    Worker processes exit when they exceed their memory hard limit (the task
+    fails), and workers are recycled after a task once they have reached one of
+    their limits.
+    """
+
+    @wraps(func)
+    def task(*args: P.args, **kwargs: P.kwargs) -> R:
+        limits = getattr(_worker, "options", ConvertOptions()).limits
+        exits = getattr(_worker, "exits", None)
+        exceeded = partial(_exceeded, exits, getattr(_worker, "task", None))
+        try:
+            with limited(limits.hard_rss if exits is not None else None, exceeded):
+                return func(*args, **kwargs)
+        finally:
+            _worker.tasks = getattr(_worker, "tasks", 0) + 1
+            if limits.reached(_worker.tasks):
+                recycle()
+
+    return task
+
+
+@worker_task
+def convert_job(job: Job) -> tuple[Union[Path, bytes], "DocumentStats"]:
+    """Convert a document with the current worker converter.
+
+    Returns:
+        The output (see `JobResult`) and the conversion statistics.
+    """
+    target = job.pdf if job.pdf is not None else BytesIO()
+    stats = get_converter().convert(
+        target,
+        raw=job.raw,
+        md=job.md,
+        css=job.css,
+        base_url=job.base_url,
+        extras=job.extras,
+        extras_config=job.extras_config,
+        context=job.context,
+    )
+    return target if isinstance(target, Path) else target.getvalue(), stats
+
+
+def init_worker(options: ConvertOptions, exits: Optional[SimpleQueue] = None):
+    """Warm up a worker before it handles its first conversion.
+
+    The worker converter loads markdown extensions and parses the stylesheet once
+    so that the first conversion does not pay for it. Worker processes report the
+    task they exit from to their pool in the `exits` queue.
+    """
+    _worker.exits = exits
+    _worker.options = options
+    converter = get_converter()
+    converter.markdown(
+        MARKDOWN_BASE_EXTENSIONS + (options.extras or []), options.extras_config or {}
+    )
+    if options.css is not None:
+        converter.stylesheet(options.css)
+
+
+def _available_memory() -> Optional[int]:
+    """Get available physical memory (in bytes), None if it is unknown."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def auto_workers(jobs: Optional[int] = None) -> int:
+    """Get a pool size fitting this machine.
+
+    A worker per available CPU core, as long as workers fit in available memory
+    (see `WORKER_MEMORY`), and no more workers than jobs (if known).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        workers = len(os.sched_getaffinity(0))
+    else:
+        workers = os.cpu_count() or 1
+    if (memory := _available_memory()) is not None:
+        workers = min(workers, memory // WORKER_MEMORY)
+    if jobs is not None:
+        workers = min(workers, jobs)
+    return max(workers, 1)
+
+
+def _tracked(task: int, func: Callable[[], R]) -> R:
+    """Run a process pool task, recorded as the current task of the worker."""
+    _worker.task = task
+    try:
+        return func()
+    finally:
+        _worker.task = None
+
+
+class _Task(Future):
+    """A process pool task, submitted again when its worker pool breaks."""
+
+    def __init__(self, func: Callable[[], Any]):
+        """Initialize the task."""
+        super().__init__()
+        self.func = func
+        self.retries = WORKER_RETRIES
+        self.submitted: Optional[Future] = None
+
+    def cancel(self) -> bool:
+        """Cancel the task if it has not started yet."""
+        if self.cancelled():
+            return True
+        return self.submitted is not None and self.submitted.cancel()
+
+
+class ProcessPool(Executor):
+    """A process pool replacing its worker processes when they exit.
+
+    `ProcessPoolExecutor` breaks when one of its worker processes exits: worker
+    processes exceeding their memory hard limit (see `worker_task`) or their task
+    timeout (see `deadline`) exit, and the broken executor is replaced. The task
+    of the exiting worker fails with a `MemoryLimitError` or a
+    `RenderTimeoutError`, and other interrupted tasks are submitted again (up to
+    `WORKER_RETRIES` times).
+
+    Worker processes are also replaced once they have run `max_tasks` documents
+    (see `WorkerLimits`).
+    """
+
+    def __init__(self, workers: int, options: ConvertOptions):
+        """Initialize the pool with its first executor."""
+        context = multiprocessing.get_context(PROCESS_START_METHOD)
+        self._exits: SimpleQueue = context.SimpleQueue()
+        self._kwargs: dict[str, Any] = {
+            "max_workers": workers,
+            "mp_context": context,
+            "initializer": init_worker,
+            "initargs": (options, self._exits),
+        }
+        if sys.version_info >= (3, 11):
+            self._kwargs["max_tasks_per_child"] = options.limits.max_tasks
+        self._executor = ProcessPoolExecutor(**self._kwargs)
+        self._ids = count()
+        # Errors of tasks whose worker process exited
+        self._exited: dict[int, Exception] = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        """Submit a task to a worker process."""
+        task = _Task(partial(fn, *args, **kwargs))
+        self._submit(task)
+        return task
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """Shut the pool down (see `Executor.shutdown`)."""
+        with self._lock:
+            self._shutdown = True
+            executor = self._executor
+        executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def _replace(self, executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace a broken executor (unless it has been already), with the lock."""
+        if self._executor is executor:
+            logger.warning("A worker process exited: replacing worker processes")
+            self._executor = ProcessPoolExecutor(**self._kwargs)
+        return self._executor
+
+    def _submit(self, task: _Task):
+        """Submit a task to the current executor."""
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            task_id = next(self._ids)
+            executor = self._executor
+        # Executor locks are held by their callbacks: do not hold the pool lock
+        try:
+            submitted = executor.submit(_tracked, task_id, task.func)
+        except BrokenProcessPool:
+            with self._lock:
+                executor = self._replace(executor)
+            submitted = executor.submit(_tracked, task_id, task.func)
+        task.submitted = submitted
+        submitted.add_done_callback(partial(self._done, task, task_id, executor))
+
+    def _done(
+        self, task: _Task, task_id: int, executor: ProcessPoolExecutor, done: Future
+    ):
+        """Set the task result, or submit it again when its executor broke."""
+        if done.cancelled():
+            Future.cancel(task)
+            task.set_running_or_notify_cancel()
+            return
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                while not self._exits.empty():
+                    exited_id, exited_error = self._exits.get()
+                    self._exited[exited_id] = exited_error
+                exited = self._exited.pop(task_id, None)
+                if not self._shutdown:
+                    self._replace(executor)
+            if exited is not None:
+                task.set_exception(exited)
+                return
+            if task.retries > 0:
+                task.retries -= 1
+                try:
+                    self._submit(task)
+                except RuntimeError as err:
+                    task.set_exception(err)
+                return
+        if error is not None:
+            task.set_exception(error)
+        else:
+            task.set_result(done.result())
+
+
+def get_executor(
+    executor: ExecutorType, workers: int, options: Optional[ConvertOptions] = None
+) -> Executor:
+    """Get a worker pool of the requested type with warmed-up workers."""
+    options = options or ConvertOptions()
+    if executor == ExecutorType.process:
+        return ProcessPool(workers, options)
+    return ThreadPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(options,)
+    )
+
+
+def _ready() -> bool:
+    """Dummy task used to start workers."""
+    return True
+
+
+def start_workers(pool: Executor, workers: int):
+    """Start pool workers now instead of upon first conversions.
+
+    Pools start workers on demand: submitting as many tasks as workers starts them
+    all (but it is not guaranteed as idle workers may take several tasks).
+    """
+    wait([pool.submit(_ready) for _ in range(workers)])
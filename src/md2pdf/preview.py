@@ -0,0 +1,174 @@
+"""md2pdf preview: render a part of documents only, for fast feedback.
+
+While editing a long document, authors look at a few pages or at the section they
+are working on: the rendered HTML is truncated before layout so that only this
+part is laid out. Pages are laid out from the beginning of the document, until
+the laid out part covers the requested pages (page counters then count pages of
+the laid out part).
+"""
+
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import List, Optional
+
+from .exceptions import ValidationError
+
+HEADINGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+WHITESPACES = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class Preview:
+    """Part of documents to render: a range of pages, or a section.
+
+    Attributes:
+        pages: first and last pages to render (starting at 1)
+        section: title of the section to render, up to the next heading of the
+            same level or above
+    """
+
+    pages: Optional[tuple[int, int]] = None
+    section: Optional[str] = None
+
+    def __post_init__(self):
+        """Check the previewed part."""
+        if (self.pages is None) == (self.section is None):
+            raise ValidationError("Preview either a range of pages, or a section")
+        if self.pages is not None and not 1 <= self.pages[0] <= self.pages[1]:
+            raise ValidationError(f"Invalid preview pages: {self.pages}")
+
+    def __str__(self) -> str:
+        """Describe the previewed part."""
+        if self.pages is not None:
+            first, last = self.pages
+            return f"page {first}" if first == last else f"pages {first}-{last}"
+        return f"section “{self.section}”"
+
+
+@dataclass(frozen=True)
+class Block:
+    """A top-level HTML element: its offset, tag and text (for headings)."""
+
+    start: int
+    tag: str
+    title: str = ""
+
+
+class _BlocksParser(HTMLParser):
+    """Find top-level elements positions, and headings titles."""
+
+    def __init__(self):
+        """Initialize the parser."""
+        super().__init__(convert_charrefs=True)
+        self.depth = 0
+        self.positions: list[tuple[int, int]] = []
+        self.tags: list[str] = []
+        self.titles: list[str] = []
+        self._title: Optional[list[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        """Record top-level elements positions."""
+        if self.depth == 0:
+            self.positions.append(self.getpos())
+            self.tags.append(tag)
+            self.titles.append("")
+            self._title = [] if tag in HEADINGS else None
+        if tag not in VOID_ELEMENTS:
+            self.depth += 1
+
+    def handle_data(self, data):
+        """Record headings text."""
+        if self._title is not None:
+            self._title.append(data)
+
+    def handle_endtag(self, tag):
+        """Leave an element."""
+        if tag in VOID_ELEMENTS:
+            return
+        self.depth = max(self.depth - 1, 0)
+        if self.depth == 0 and self._title is not None:
+            self.titles[-1] = "".join(self._title)
+            self._title = None
+
+
+def offsets(html: str, positions: List[tuple[int, int]]) -> List[int]:
+    """Convert `HTMLParser` positions (line, column) to offsets in HTML.
+
+    The parser only counts newline characters as line breaks (unlike
+    `str.splitlines`).
+    """
+    starts = [0, *(match.end() for match in re.finditer("\n", html))]
+    return [starts[line - 1] + column for line, column in positions]
+
+
+def blocks(html: str) -> List[Block]:
+    """Find top-level elements of HTML."""
+    parser = _BlocksParser()
+    parser.feed(html)
+    parser.close()
+    return [
+        Block(start, tag, title)
+        for start, tag, title in zip(
+            offsets(html, parser.positions), parser.tags, parser.titles, strict=True
+        )
+    ]
+
+
+def truncate(html: str, size: int) -> str:
+    """Cut HTML before the first top-level element starting after `size`."""
+    if len(html) <= size:
+        return html
+    for block in blocks(html):
+        if block.start >= size:
+            return html[: block.start]
+    return html
+
+
+def _normalize(title: str) -> str:
+    """Normalize a title to compare it."""
+    return WHITESPACES.sub(" ", title).strip().casefold()
+
+
+def section(html: str, title: str) -> str:
+    """Get the HTML of a section, from its heading to the next one of its level.
+
+    The section heading is the first top-level heading with this title, or else
+    the first one containing it (ignoring case and whitespaces).
+
+    Raises:
+        ValidationError: if no heading matches the title.
+    """
+    headings = [block for block in blocks(html) if block.tag in HEADINGS]
+    wanted = _normalize(title)
+    heading = next(
+        (block for block in headings if _normalize(block.title) == wanted),
+        next((block for block in headings if wanted in _normalize(block.title)), None),
+    )
+    if heading is None:
+        raise ValidationError(f"No section titled “{title}” in the document")
+    level = HEADINGS.index(heading.tag)
+    end = next(
+        (
+            block.start
+            for block in headings
+            if block.start > heading.start and HEADINGS.index(block.tag) <= level
+        ),
+        len(html),
+    )
+    return html[heading.start : end]
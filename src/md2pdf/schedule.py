@@ -0,0 +1,102 @@
+"""md2pdf scheduling: send the most expensive documents to workers first.
+
+Pool workers take documents in submission order: a long document submitted last
+runs alone at the end of a batch while other workers are idle. Documents are
+submitted by decreasing estimated cost instead (longest processing time first),
+estimated from their size and the conversion durations of previous runs.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .conf import SCHEDULE_HISTORY_SIZE
+from .stats import DocumentStats
+
+logger = logging.getLogger(__name__)
+
+# History file name, in the render cache directory
+HISTORY_FILE = "history.json"
+
+
+class History:
+    """Conversion durations of previous runs, by input file.
+
+    Each input file path is recorded with its size and conversion duration (cached
+    or failed conversions are not recorded). The history is kept in memory, and in
+    a JSON file when a path is given. Only the most recently converted files are
+    kept.
+    """
+
+    def __init__(self, path: Optional[Path] = None, size: int = SCHEDULE_HISTORY_SIZE):
+        """Initialize the history, loading it from its file."""
+        self.path = path
+        self.size = size
+        # Input file paths (least recently converted first): (size, duration)
+        self._entries: dict[str, tuple[int, float]] = {}
+        if path is not None:
+            self.load()
+
+    def load(self):
+        """Load the history file (an invalid file is ignored)."""
+        if self.path is None:
+            return
+        try:
+            entries = json.loads(self.path.read_text())
+            self._entries = {
+                str(md): (int(size), float(duration))
+                for md, (size, duration) in entries.items()
+            }
+        except FileNotFoundError:
+            return
+        except (AttributeError, TypeError, ValueError):
+            logger.warning("Ignoring invalid conversion history %s", self.path)
+
+    def save(self):
+        """Write the history file (atomically: other runs may be reading it)."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(suffix=".tmp", dir=self.path.parent)
+        with os.fdopen(fd, "w") as tmp:
+            json.dump(self._entries, tmp)
+        Path(name).replace(self.path)
+
+    def record(self, stats: Iterable[DocumentStats]):
+        """Record durations of converted documents."""
+        for document in stats:
+            if document.input is None or document.cached or document.error:
+                continue
+            md = Path(document.input)
+            try:
+                size = md.stat().st_size
+            except OSError:
+                continue
+            key = str(md.resolve())
+            self._entries.pop(key, None)
+            self._entries[key] = (size, document.duration)
+        while len(self._entries) > self.size:
+            del self._entries[next(iter(self._entries))]
+
+    def costs(self, md: Iterable[Path]) -> dict[Path, float]:
+        """Estimate conversion costs of markdown files (in seconds).
+
+        Recorded durations are scaled by the file size change. Files without
+        history are estimated with the mean conversion rate (seconds per byte)
+        of recorded files.
+        """
+        sizes = sum(size for size, _ in self._entries.values())
+        durations = sum(duration for _, duration in self._entries.values())
+        rate = durations / sizes if sizes and durations else 1.0
+
+        costs = {}
+        for path in md:
+            size = path.stat().st_size
+            recorded_size, duration = self._entries.get(str(path.resolve()), (0, 0.0))
+            costs[path] = (
+                duration * size / recorded_size if recorded_size else size * rate
+            )
+        return costs
@@ -0,0 +1,278 @@
+"""md2pdf render server.
+
+Requests are untrusted: their Jinja templates are rendered in a sandbox, they can
+only activate a set of markdown extensions (see `SERVER_EXTRAS`), and local files
+are not fetched while rendering them.
+"""
+
+import ipaddress
+import json
+import logging
+import threading
+from concurrent.futures import CancelledError, Executor, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import BaseServer, ThreadingMixIn, UnixStreamServer
+from typing import Optional, cast
+
+from jinja2.exceptions import SecurityError
+
+from .conf import (
+    SERVER_EXTRAS,
+    SERVER_MAX_REQUEST_SIZE,
+    SERVER_QUEUE_SIZE,
+    SERVER_TIMEOUT,
+)
+from .exceptions import QueueFullError, ValidationError
+from .pool import deadline, get_converter, worker_task
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RenderRequest:
+    """A render request sent to the server."""
+
+    markdown: str
+    css: Optional[str] = None
+    extras: Optional[list[str]] = None
+    extras_config: Optional[dict] = None
+    context: Optional[dict] = None
+
+    @classmethod
+    def from_json(cls, body: bytes) -> "RenderRequest":
+        """Parse and validate a JSON request body."""
+        try:
+            data = json.loads(body)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError) as err:
+            raise ValidationError(
+                "Invalid request body (should be valid JSON)"
+            ) from err
+        if not isinstance(data, dict) or not isinstance(data.get("markdown"), str):
+            raise ValidationError("Invalid request body (missing markdown content)")
+        try:
+            request = cls(**data)
+        except TypeError as err:
+            raise ValidationError(f"Invalid request body ({err})") from err
+        if request.extras is not None and (
+            not isinstance(request.extras, list)
+            or not all(_allowed(extra) for extra in request.extras)
+        ):
+            raise ValidationError(
+                f"Invalid request body (extras should be among {SERVER_EXTRAS})"
+            )
+        if request.css is not None and not isinstance(request.css, str):
+            raise ValidationError("Invalid request body (css should be a string)")
+        if request.context is not None and not isinstance(request.context, dict):
+            raise ValidationError("Invalid request body (context should be an object)")
+        if request.extras_config is not None and (
+            not isinstance(request.extras_config, dict)
+            or not all(
+                isinstance(config, dict) for config in request.extras_config.values()
+            )
+        ):
+            raise ValidationError(
+                "Invalid request body (extras_config should map extensions to objects)"
+            )
+        return request
+
+
+def _allowed(extra: object) -> bool:
+    """Check whether requests can activate a markdown extension."""
+    if not isinstance(extra, str):
+        return False
+    # Markdown extensions are also named after their entry point
+    return (extra if "." in extra else f"markdown.extensions.{extra}") in SERVER_EXTRAS
+
+
+@worker_task
+def render(request: RenderRequest, timeout: Optional[float] = None) -> bytes:
+    """Render a request to PDF bytes in a pool worker (within `timeout` seconds)."""
+    converter = get_converter(untrusted=True)
+    with deadline(timeout):
+        try:
+            html = converter.md2html(
+                request.markdown,
+                extras=request.extras,
+                extras_config=request.extras_config,
+                context=request.context,
+            )
+        except SecurityError as err:
+            raise ValidationError(f"Unsafe template: {err}") from err
+        document = converter.html2document(html, raw_css=request.css)
+        pdf = converter.document2pdf(document)
+    return cast(bytes, pdf)
+
+
+class Renderer:
+    """Dispatch render requests to a worker pool with a bounded queue.
+
+    At most `workers + queue_size` requests are accepted at the same time: others
+    are rejected until pending requests are done. Worker processes exit when their
+    render lasts more than `timeout` seconds, giving their slot back; worker
+    threads cannot be interrupted, their timed out renders keep their slot until
+    they end.
+    """
+
+    def __init__(
+        self,
+        pool: Executor,
+        workers: int,
+        queue_size: int = SERVER_QUEUE_SIZE,
+        timeout: float = SERVER_TIMEOUT,
+    ):
+        """Initialize the renderer."""
+        self.pool = pool
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, request: RenderRequest) -> Future:
+        """Submit a render request to the pool."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Render queue is full")
+        try:
+            future = self.pool.submit(render, request, self.timeout)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def render(self, request: RenderRequest) -> bytes:
+        """Render a request, waiting at most `timeout` seconds for the result."""
+        future = self.submit(request)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Drop the request if it has not started yet
+            future.cancel()
+            raise
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """Render server HTTP requests handler.
+
+    Routes:
+        GET /health: check that the server is alive
+        POST /render: render a JSON request ({"markdown": "...", "css": "...",
+            "extras": [...], "extras_config": {...}, "context": {...}}) to PDF
+    """
+
+    server_version = "md2pdf"
+
+    def address_string(self) -> str:
+        """Get the client address (unix sockets have none)."""
+        if isinstance(self.client_address, tuple):
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format, *args):
+        """Log requests with the module logger."""
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str, **headers):
+        """Send response."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: HTTPStatus, message: str, **headers):
+        """Send a JSON error response."""
+        body = json.dumps({"error": message}).encode()
+        self._send(status, body, "application/json", **headers)
+
+    def do_GET(self):
+        """Handle GET requests."""
+        if self.path != "/health":
+            self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+            return
+        self._send(HTTPStatus.OK, b'{"status": "ok"}', "application/json")
+
+    def do_POST(self):
+        """Handle POST requests."""
+        if self.path != "/render":
+            self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, "Invalid Content-Length header")
+            return
+        if length > SERVER_MAX_REQUEST_SIZE:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request too large")
+            return
+
+        renderer = cast(RenderServerMixin, self.server).renderer
+        try:
+            pdf = renderer.render(RenderRequest.from_json(self.rfile.read(length)))
+        except ValidationError as err:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(err))
+        except QueueFullError as err:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(err), Retry_After="1")
+        except (FutureTimeoutError, CancelledError):
+            self._send_error(HTTPStatus.GATEWAY_TIMEOUT, "Render timeout")
+        except Exception:
+            # Internal errors are logged, not sent to untrusted clients
+            logger.exception("Render failed")
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Render failed")
+        else:
+            self._send(HTTPStatus.OK, pdf, "application/pdf")
+
+
+class RenderServerMixin:
+    """Give HTTP request handlers access to the renderer."""
+
+    renderer: Renderer
+
+
+class TCPRenderServer(RenderServerMixin, ThreadingHTTPServer):
+    """Render server listening on a TCP address."""
+
+
+class UnixRenderServer(RenderServerMixin, ThreadingMixIn, UnixStreamServer):
+    """Render server listening on a unix socket."""
+
+    daemon_threads = True
+
+
+def is_loopback(host: str) -> bool:
+    """Check whether a host address only accepts local connections."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_server(
+    renderer: Renderer,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    socket: Optional[Path] = None,
+) -> BaseServer:
+    """Get an HTTP render server, listening on a unix socket if one is given."""
+    server: BaseServer
+    if socket is not None:
+        socket.unlink(missing_ok=True)
+        server = UnixRenderServer(str(socket), RenderRequestHandler)
+    else:
+        if not is_loopback(host):
+            logger.warning(
+                "Render server listening on %s: anyone reaching it can render "
+                "documents (and use its resources)",
+                host,
+            )
+        server = TCPRenderServer((host, port), RenderRequestHandler)
+    cast(RenderServerMixin, server).renderer = renderer
+    return server
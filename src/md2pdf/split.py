@@ -0,0 +1,310 @@
+"""md2pdf split rendering: lay out huge documents in parallel chunks.
+
+The rendered HTML is cut at top-level headings, chunks are laid out in parallel by
+pool workers, then their PDFs are merged with continuous page numbers, bookmarks
+and internal links.
+"""
+
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from io import BytesIO
+from itertools import accumulate, repeat
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional, cast
+from urllib.parse import unquote
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, Fit, NameObject, TextStringObject
+except ModuleNotFoundError as err:
+    raise RuntimeError(
+        "Missing dependency: to split documents, you should install the `split` "
+        "extra first: `pip install md2pdf[split]`"
+    ) from err
+
+from .cache import RenderCache, render_key
+from .core import PAGE_COUNTERS, Converter, read_markdown
+from .deps import Dependencies, depend, record
+from .pool import get_converter, worker_task
+from .preview import HEADINGS, VOID_ELEMENTS, offsets
+from .stats import DocumentStats
+
+# Internal links are rewritten with this scheme so that links to anchors of other
+# chunks are kept, then resolved once chunks are merged.
+ANCHOR_SCHEME = "md2pdf-anchor:"
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A laid out chunk: its PDF (if written), pages count, bookmarks and files.
+
+    Bookmarks are `(level, label, page, top, open)` tuples, `page` being the chunk
+    page index and `top` the bookmark position (in PDF points from the bottom).
+    Dependencies are files loaded by the chunk (_e.g._ images).
+    """
+
+    pdf: Optional[bytes]
+    pages: int
+    bookmarks: List[tuple[int, str, int, float, bool]]
+    dependencies: Dependencies = field(default_factory=dict)
+
+
+class _HeadingsParser(HTMLParser):
+    """Find positions of top-level headings."""
+
+    def __init__(self, tags: tuple[str, ...]):
+        """Initialize the parser."""
+        super().__init__(convert_charrefs=True)
+        self.tags = tags
+        self.depth = 0
+        self.positions: list[tuple[int, int]] = []
+
+    def handle_starttag(self, tag, attrs):
+        """Record top-level headings positions."""
+        if self.depth == 0 and tag in self.tags:
+            self.positions.append(self.getpos())
+        if tag not in VOID_ELEMENTS:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        """Leave an element."""
+        if tag not in VOID_ELEMENTS:
+            self.depth = max(self.depth - 1, 0)
+
+
+def split_html(html: str, level: int = 1) -> List[str]:
+    """Cut HTML before top-level headings (of the given level or above)."""
+    parser = _HeadingsParser(HEADINGS[:level])
+    parser.feed(html)
+    parser.close()
+
+    starts = offsets(html, parser.positions)
+    if starts and not html[: starts[0]].strip():
+        # Do not get an empty first section
+        starts = starts[1:]
+
+    cuts = [0, *starts, len(html)]
+    return [html[start:end] for start, end in zip(cuts, cuts[1:], strict=False)]
+
+
+def group_sections(sections: List[str], chunks: int) -> List[str]:
+    """Group consecutive sections into (at most) chunks of similar sizes."""
+    target = sum(len(section) for section in sections) / max(chunks, 1)
+    groups: List[str] = []
+    current: List[str] = []
+    size = 0
+    for section in sections:
+        current.append(section)
+        size += len(section)
+        if size >= target and len(groups) < chunks - 1:
+            groups.append("".join(current))
+            current, size = [], 0
+    if current:
+        groups.append("".join(current))
+    return groups
+
+
+@worker_task
+def render_chunk(
+    html: str,
+    css: Optional[Path] = None,
+    base_url: Optional[Path] = None,
+    page_offset: int = 0,
+    total_pages: Optional[int] = None,
+    write: bool = True,
+) -> Chunk:
+    """Lay out a chunk in a pool worker.
+
+    The page counter starts after `page_offset` pages, and when `total_pages` is
+    given, it replaces the `pages` counter of the stylesheet.
+    """
+    converter = get_converter()
+    # Images of previous chunks are not needed anymore
+    converter.images.trim()
+    with record() as dependencies:
+        stylesheets = converter.paged_stylesheets(css, page_offset, total_pages)
+        document = converter.layout(html, stylesheets, base_url)
+        pdf = converter.document2pdf(document) if write else None
+
+    bookmarks = [
+        (level, label, index, (page.height - y) * 0.75, state == "open")
+        for index, page in enumerate(document.pages)
+        for level, label, (_, y), state in page.bookmarks
+    ]
+    return Chunk(
+        pdf=pdf,
+        pages=len(document.pages),
+        bookmarks=bookmarks,
+        dependencies=dependencies,
+    )
+
+
+def _resolve_anchors(writer: PdfWriter):
+    """Turn rewritten internal links into links to named destinations."""
+    names = set(writer.named_destinations)
+    for page in writer.pages:
+        if "/Annots" not in page:
+            continue
+        annotations = ArrayObject()
+        for reference in cast(ArrayObject, page["/Annots"].get_object()):
+            annotation = reference.get_object()
+            action = annotation.get("/A")
+            uri = str(action.get_object().get("/URI", "")) if action else ""
+            if uri.startswith(ANCHOR_SCHEME):
+                name = unquote(uri[len(ANCHOR_SCHEME) :])
+                if name not in names:
+                    # Link to a missing anchor
+                    continue
+                del annotation["/A"]
+                annotation[NameObject("/Dest")] = TextStringObject(name)
+            annotations.append(reference)
+        page[NameObject("/Annots")] = annotations
+
+
+def merge_chunks(chunks: List[Chunk], target: Path):
+    """Merge chunks PDFs into the target file, rebuilding bookmarks."""
+    writer = PdfWriter()
+    # Outline items of the current bookmark branch: (level, item)
+    parents: list[tuple[int, object]] = []
+    for index, chunk in enumerate(chunks):
+        reader = PdfReader(BytesIO(cast(bytes, chunk.pdf)))
+        if index == 0 and reader.metadata is not None:
+            writer.add_metadata(reader.metadata)
+        first = len(writer.pages)
+        writer.append(reader, import_outline=False)
+        for level, label, page, top, is_open in chunk.bookmarks:
+            while parents and parents[-1][0] >= level:
+                parents.pop()
+            item = writer.add_outline_item(
+                label,
+                first + page,
+                parent=parents[-1][1] if parents else None,  # type: ignore[arg-type]
+                fit=Fit.xyz(top=top),
+                is_open=is_open,
+            )
+            parents.append((level, item))
+    _resolve_anchors(writer)
+
+    # Do not overwrite cache entries linked to the output file
+    target.unlink(missing_ok=True)
+    with target.open("wb") as output:
+        writer.write(output)
+
+
+def _layout(
+    pool: Executor,
+    stats: DocumentStats,
+    html: str,
+    pdf: Path,
+    css: Optional[Path],
+    base_url: Optional[Path],
+    level: int,
+    chunks: int,
+):
+    """Lay out document chunks in pool workers, then merge them."""
+    html = re.sub(r"""href=(["'])#""", rf"href=\1{ANCHOR_SCHEME}", html)
+    parts = group_sections(split_html(html, level), chunks)
+
+    with stats.stage("layout"):
+        counters = css is not None and PAGE_COUNTERS.search(css.read_text())
+        laid_out = list(
+            pool.map(
+                render_chunk,
+                parts,
+                repeat(css),
+                repeat(base_url),
+                repeat(0),
+                repeat(None),
+                repeat(not counters),
+            )
+        )
+        if counters:
+            pages = [chunk.pages for chunk in laid_out]
+            laid_out = list(
+                pool.map(
+                    render_chunk,
+                    parts,
+                    repeat(css),
+                    repeat(base_url),
+                    [0, *accumulate(pages)][:-1],
+                    repeat(sum(pages)),
+                )
+            )
+    stats.pages = sum(chunk.pages for chunk in laid_out)
+    for chunk in laid_out:
+        depend(chunk.dependencies)
+
+    with stats.stage("pdf"):
+        merge_chunks(laid_out, pdf)
+
+
+def split_convert(
+    pool: Executor,
+    pdf: Path,
+    raw: Optional[str] = None,
+    md: Optional[Path] = None,
+    css: Optional[Path] = None,
+    base_url: Optional[Path] = None,
+    extras: Optional[List[str]] = None,
+    extras_config: Optional[dict] = None,
+    context: Optional[dict] = None,
+    level: int = 1,
+    chunks: int = 4,
+    cache: Optional[RenderCache] = None,
+    converter: Optional[Converter] = None,
+) -> DocumentStats:
+    """Convert a document laying out its chunks in parallel pool workers.
+
+    The document is split before top-level headings of the given `level` (or
+    above) into at most `chunks` chunks, laid out by the pool workers (use
+    processes for them to run in parallel). Each chunk starts on a new page. When
+    the stylesheet uses page counters, chunks are laid out twice: first to count
+    their pages, then with page numbers offset. The HTML is rendered by the
+    `converter` (the current worker converter by default), whose image options
+    are part of the render key.
+
+    See `md2pdf` for other arguments.
+    """
+    converter = converter if converter is not None else get_converter()
+    stats = converter.stats = DocumentStats(
+        input=str(md) if md is not None else None, output=str(pdf)
+    )
+    started_at = perf_counter()
+    try:
+        with record() as dependencies:
+            with stats.stage("read"):
+                raw = read_markdown(raw, md)
+
+            key = None
+            if cache is not None:
+                with stats.stage("cache"):
+                    variant = {
+                        "split": level,
+                        "chunks": chunks,
+                        **converter.image_options.variant,
+                    }
+                    key = render_key(
+                        raw, css, base_url, extras, extras_config, context, variant
+                    )
+                    stats.cached = cache.get(key, pdf)
+                    if stats.cached:
+                        depend(cache.dependencies(key))
+
+            if not stats.cached:
+                html = converter.md2html(
+                    raw, extras=extras, extras_config=extras_config, context=context
+                )
+                _layout(pool, stats, html, pdf, css, base_url, level, chunks)
+        stats.dependencies = dependencies
+        stats.size = pdf.stat().st_size
+
+        if key is not None and cache is not None and not stats.cached:
+            with stats.stage("cache"):
+                cache.put(key, pdf, dependencies)
+    finally:
+        stats.duration = perf_counter() - started_at
+        converter.stats = None
+    return stats
@@ -0,0 +1,114 @@
+"""md2pdf conversion statistics."""
+
+import json
+import math
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from time import perf_counter
+from typing import Iterator, List, Optional, TextIO
+
+from .deps import Dependencies
+
+# Conversion stages, in order
+STAGES = (
+    "read",
+    "cache",
+    "frontmatter",
+    "jinja",
+    "markdown",
+    "fetch",
+    "html",
+    "layout",
+    "pdf",
+)
+
+
+@dataclass
+class DocumentStats:
+    """Statistics of a document conversion.
+
+    Stages durations are in seconds: file reading, render cache lookup,
+    frontmatter parsing (and template compilation), Jinja and markdown rendering,
+    remote resources prefetching, HTML parsing, layout and PDF serialization.
+    Skipped stages are missing.
+
+    Dependencies are files loaded during the conversion (markdown sources,
+    snippets, stylesheets, fonts, images…) with their signatures.
+
+    The peak resident memory (in bytes) is the one of the converting process
+    during the conversion (see `md2pdf.memory`).
+    """
+
+    input: Optional[str] = None
+    output: Optional[str] = None
+    stages: dict[str, float] = field(default_factory=dict)
+    duration: float = 0.0
+    pages: Optional[int] = None
+    size: Optional[int] = None
+    rss: Optional[int] = None
+    cached: bool = False
+    error: Optional[str] = None
+    dependencies: Dependencies = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record the duration of a conversion stage."""
+        started_at = perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + perf_counter() - started_at
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Get the q-th percentile of values (nearest rank method)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _distribution(values: List[float]) -> dict:
+    """Summarize durations distribution."""
+    return {
+        "total": sum(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values, default=None),
+    }
+
+
+def summarize(documents: List[DocumentStats], elapsed: float) -> dict:
+    """Aggregate documents statistics of a batch that took `elapsed` seconds."""
+    converted = [d for d in documents if d.error is None]
+    pages = sum(d.pages or 0 for d in converted)
+    return {
+        "documents": len(documents),
+        "rendered": sum(not d.cached for d in converted),
+        "cached": sum(d.cached for d in converted),
+        "failed": len(documents) - len(converted),
+        "elapsed": elapsed,
+        "pages": pages,
+        "size": sum(d.size or 0 for d in converted),
+        "rss": max((d.rss for d in documents if d.rss is not None), default=None),
+        "throughput": {
+            "documents": len(converted) / elapsed if elapsed else None,
+            "pages": pages / elapsed if elapsed else None,
+        },
+        "duration": _distribution([d.duration for d in converted]),
+        "stages": {
+            stage: _distribution(values)
+            for stage in STAGES
+            if (values := [d.stages[stage] for d in converted if stage in d.stages])
+        },
+    }
+
+
+def write_report(report: TextIO, documents: List[DocumentStats], elapsed: float):
+    """Write a batch report as JSON lines: one per document, then the batch one."""
+    for document in documents:
+        report.write(json.dumps({"type": "document", **asdict(document)}) + "\n")
+    report.write(json.dumps({"type": "batch", **summarize(documents, elapsed)}) + "\n")
+    report.flush()
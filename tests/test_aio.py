@@ -0,0 +1,148 @@
+"""md2pdf tests for the asyncio API."""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import Union
+from unittest import mock
+
+import pytest
+
+from md2pdf import md2pdf_async
+from md2pdf.aio import AsyncConverter
+from md2pdf.exceptions import ValidationError
+from md2pdf.pool import Job, convert_job
+from md2pdf.stats import DocumentStats
+
+from .defaults import INPUT_MD
+
+
+class SlowJobs:
+    """A slow `convert_job` stand-in, recording started jobs and concurrency."""
+
+    def __init__(self, delay: float):
+        """Initialize records."""
+        self.delay = delay
+        self.started: list[Job] = []
+        self.running = 0
+        self.concurrency = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, job: Job) -> tuple[Union[Path, bytes], DocumentStats]:
+        """Convert a job, slowly."""
+        with self._lock:
+            self.started.append(job)
+            self.running += 1
+            self.concurrency = max(self.concurrency, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        if job.raw == "":
+            raise ValidationError("No markdown content to process")
+        assert job.pdf is not None
+        return job.pdf, DocumentStats(input=job.raw, output=str(job.pdf))
+
+
+def test_md2pdf_async(tmp_path):
+    """Convert a document from an event loop."""
+    stats = asyncio.run(md2pdf_async(tmp_path / "output.pdf", md=INPUT_MD))
+    assert stats.input == str(INPUT_MD)
+    assert (tmp_path / "output.pdf").exists()
+
+    # The default converter is reused by other event loops
+    stats = asyncio.run(md2pdf_async(tmp_path / "other.pdf", raw="# Title"))
+    assert stats.size == (tmp_path / "other.pdf").stat().st_size
+
+    with pytest.raises(ValidationError):
+        asyncio.run(md2pdf_async(tmp_path / "output.pdf", raw=""))
+
+
+def test_async_converter_concurrency(tmp_path):
+    """Bound conversions sent to workers, without blocking the event loop."""
+    jobs = SlowJobs(0.1)
+
+    async def main():
+        async with AsyncConverter(workers=4, concurrency=2) as converter:
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            await asyncio.gather(
+                *(
+                    converter.convert(tmp_path / f"{i}.pdf", raw="# Title")
+                    for i in range(6)
+                )
+            )
+            ticker.cancel()
+            return ticks
+
+    with mock.patch("md2pdf.aio.convert_job", jobs):
+        ticks = asyncio.run(main())
+    assert len(jobs.started) == 6
+    assert jobs.concurrency == 2
+    assert ticks > 10
+
+
+def test_async_converter_timeout_and_cancellation(tmp_path):
+    """Timed out or cancelled conversions that have not started are dropped."""
+    jobs = SlowJobs(0.2)
+
+    async def main():
+        async with AsyncConverter(workers=1) as converter:
+            with pytest.raises(asyncio.TimeoutError):
+                await converter.convert(tmp_path / "0.pdf", raw="0", timeout=0.05)
+            # The worker is still busy: the next conversion waits for its slot
+            task = asyncio.ensure_future(converter.convert(tmp_path / "1.pdf", raw="1"))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await converter.convert(tmp_path / "2.pdf", raw="2")
+
+    with mock.patch("md2pdf.aio.convert_job", jobs):
+        stats = asyncio.run(main())
+    assert stats.input == "2"
+    assert [job.raw for job in jobs.started] == ["0", "2"]
+
+
+def test_async_converter_as_completed(tmp_path):
+    """Yield results as they complete, with errors."""
+    md = [tmp_path / f"{index}.md" for index in range(3)]
+    for path in md:
+        path.write_text(f"# {path.stem}")
+    jobs = [Job(path.with_suffix(".pdf"), md=path) for path in md]
+    jobs.insert(1, Job(tmp_path / "empty.pdf", raw=""))
+
+    async def main():
+        async with AsyncConverter(workers=2) as converter:
+            return [result async for result in converter.as_completed(jobs)]
+
+    results = asyncio.run(main())
+    assert {result.job for result in results} == set(jobs)
+    (failed,) = [result for result in results if result.error is not None]
+    assert failed.job.raw == ""
+    assert isinstance(failed.error, ValidationError)
+    for result in results:
+        if result.error is None:
+            assert result.output == result.job.pdf
+            assert result.stats.output == str(result.job.pdf)
+            assert result.job.pdf.exists()
+
+
+def test_convert_job(tmp_path):
+    """Convert a job with the worker converter."""
+    output, stats = convert_job(Job(tmp_path / "output.pdf", raw="# Title"))
+    assert output == tmp_path / "output.pdf"
+    assert stats.output == str(tmp_path / "output.pdf")
+
+    # Jobs without an output path are converted to PDF bytes
+    output, stats = convert_job(Job(raw="# Title"))
+    assert output.startswith(b"%PDF")
+    assert stats.output is None
+    assert stats.size == len(output)
@@ -0,0 +1,69 @@
+"""md2pdf tests for the benchmark suite."""
+
+import pytest
+
+from md2pdf.bench import Corpus, compare, make_corpus, run
+from md2pdf.exceptions import ValidationError
+
+
+@pytest.mark.parametrize("corpus", list(Corpus))
+def test_make_corpus_is_reproducible(tmp_path, corpus):
+    """Corpora should be identical for a given seed."""
+    first = make_corpus(corpus, tmp_path / "first", scale=0.2)
+    second = make_corpus(corpus, tmp_path / "second", scale=0.2)
+    other = make_corpus(corpus, tmp_path / "other", scale=0.2, seed=1)
+
+    assert len(first) == len(second) > 0
+    assert [md.read_text() for md in first] != [md.read_text() for md in other]
+    for md, same in zip(first, second, strict=True):
+        # Images are referenced with absolute paths
+        content = md.read_text().replace(str(tmp_path / "first"), "")
+        assert content == same.read_text().replace(str(tmp_path / "second"), "")
+
+
+def test_make_corpus_images(tmp_path):
+    """Images corpus should reference generated PNG images."""
+    md, *_ = make_corpus(Corpus.images, tmp_path, scale=0.1)
+    images = sorted(tmp_path.glob("*.png"))
+    assert images
+    for image in images:
+        assert image.read_bytes().startswith(b"\x89PNG\r\n\x1a\n")
+    assert images[0].parent.as_uri() in md.read_text()
+
+
+def test_run(tmp_path):
+    """Benchmark the library and the CLI with a corpus."""
+    results = run([Corpus.small], tmp_path, scale=0.04, workers=1)
+
+    assert results["scale"] == 0.04
+    assert list(results["results"]) == ["library/small", "cli/small"]
+    for result in results["results"].values():
+        assert result["documents"] == 2
+        assert result["throughput"] > 0
+        assert "layout" in result["stages"]
+
+
+def result(throughput, peak_memory):
+    """Get benchmark results for a single corpus."""
+    return {
+        "scale": 1.0,
+        "results": {
+            "cli/small": {"throughput": throughput, "peak_memory": peak_memory}
+        },
+    }
+
+
+def test_compare():
+    """Detect throughput and peak memory regressions beyond the tolerance."""
+    baseline = result(10.0, 100.0)
+
+    assert compare(result(9.0, 110.0), baseline, tolerance=0.2) == []
+    assert compare(result(12.0, 50.0), baseline, tolerance=0.0) == []
+    assert compare(result(10.0, None), baseline, tolerance=0.0) == []
+    assert compare(result(7.0, 130.0), baseline, tolerance=0.2) == [
+        "cli/small: throughput 7.00 documents/s (baseline: 10.00)",
+        "cli/small: peak memory 130.0 MiB (baseline: 100.0)",
+    ]
+
+    with pytest.raises(ValidationError, match="Baseline scale"):
+        compare({**result(10.0, 100.0), "scale": 2.0}, baseline, tolerance=0.2)
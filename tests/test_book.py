@@ -0,0 +1,128 @@
+"""md2pdf tests for books."""
+
+import os
+
+import pytest
+from pypdf import PdfReader
+
+from md2pdf.book import Book
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+
+NUMBERED_CSS = (
+    '@page { @bottom-center { content: "Page " counter(page) " of " '
+    "counter(pages) } }"
+)
+
+
+@pytest.fixture
+def chapters(tmp_path):
+    """Book chapters (one page each)."""
+    paths = []
+    for number in (1, 2, 3):
+        md = tmp_path / f"chapter-{number}.md"
+        md.write_text(f"# Chapter {number}\n\nOnce upon a time.\n")
+        paths.append(md)
+    return paths
+
+
+def test_book_build(chapters, tmp_path):
+    """Combine chapters in a single PDF."""
+    pdf = tmp_path / "book.pdf"
+    book = Book()
+
+    stats = book.build(pdf, chapters, base_url=tmp_path)
+    assert book.laid_out == 3
+    assert stats.pages == 3
+    assert stats.size == pdf.stat().st_size
+    assert stats.input == ", ".join(map(str, chapters))
+    assert len(PdfReader(pdf).pages) == 3
+
+
+def test_book_build_changed_chapters_only(chapters, tmp_path):
+    """Only changed chapters should be laid out again."""
+    pdf = tmp_path / "book.pdf"
+    css = tmp_path / "styles.css"
+    css.write_text("h1 { color: red }")
+    book = Book()
+
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 3
+
+    pdf.unlink()
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 0
+    assert pdf.exists()
+
+    chapters[1].write_text("# Chapter 2\n\nOnce upon another time.\n")
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 1
+
+    # Chapters are reordered without being laid out again
+    book.build(pdf, chapters[::-1], css=css, base_url=tmp_path)
+    assert book.laid_out == 0
+
+    # Every chapter is laid out with the new stylesheet
+    css.write_text("h1 { color: blue }")
+    os.utime(css, ns=(0, 0))
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 3
+
+
+def test_book_build_with_page_counters(chapters, tmp_path):
+    """Page numbers should be continuous across chapters."""
+    pdf = tmp_path / "book.pdf"
+    css = tmp_path / "styles.css"
+    css.write_text(NUMBERED_CSS)
+    book = Book()
+
+    # Chapters are laid out twice to get the total number of pages
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 6
+    for number, page in enumerate(PdfReader(pdf).pages, start=1):
+        assert f"Page {number} of 3" in page.extract_text()
+
+    chapters[0].write_text("# Chapter 1\n\nOnce upon another time.\n")
+    book.build(pdf, chapters, css=css, base_url=tmp_path)
+    assert book.laid_out == 1
+
+
+def test_book_build_with_render_cache(chapters, tmp_path):
+    """Unchanged books should be copied from the render cache."""
+    pdf = tmp_path / "book.pdf"
+    book = Book(Converter(cache=RenderCache(tmp_path / "cache")))
+
+    assert not book.build(pdf, chapters, base_url=tmp_path).cached
+    assert book.build(pdf, chapters, base_url=tmp_path).cached
+    assert book.laid_out == 0
+
+    # Chapters boundaries matter
+    chapters[0].write_text("# Chapter 1\n\nOnce upon a time.")
+    chapters[1].write_text("\n# Chapter 2\n\nOnce upon a time.\n")
+    assert not book.build(pdf, chapters, base_url=tmp_path).cached
+
+
+def test_book_build_changed_dependencies(chapters, tmp_path):
+    """Chapters should be laid out again when their snippets change."""
+    pdf = tmp_path / "book.pdf"
+    snippet = tmp_path / "snippet.md"
+    snippet.write_text("Snippet")
+    chapters[1].write_text('# Chapter 2\n\n--8<-- "snippet.md"\n')
+    config = {"pymdownx.snippets": {"base_path": [str(tmp_path)]}}
+    book = Book()
+
+    def build():
+        return book.build(
+            pdf,
+            chapters,
+            base_url=tmp_path,
+            extras=["pymdownx.snippets"],
+            extras_config=config,
+        )
+
+    assert str(snippet) in build().dependencies
+    assert book.laid_out == 3
+
+    snippet.write_text("New snippet")
+    build()
+    assert book.laid_out == 1
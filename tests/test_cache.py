@@ -0,0 +1,202 @@
+"""md2pdf tests for the render cache module."""
+
+import os
+from unittest import mock
+
+import pytest
+
+from md2pdf import cache as cache_module
+from md2pdf.cache import HTMLCache, RenderCache, html_key, render_key
+from md2pdf.deps import signature
+
+from .defaults import INPUT_CSS
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Render cache in a temporary directory."""
+    yield RenderCache(tmp_path / "cache")
+
+
+def test_render_key():
+    """Render key should change when any input changes."""
+    key = render_key("# hi", INPUT_CSS, extras=["footnotes"], context={"a": 1})
+    assert key == render_key("# hi", INPUT_CSS, extras=["footnotes"], context={"a": 1})
+
+    assert key != render_key("# ho", INPUT_CSS, extras=["footnotes"], context={"a": 1})
+    assert key != render_key("# hi", extras=["footnotes"], context={"a": 1})
+    assert key != render_key("# hi", INPUT_CSS, context={"a": 1})
+    assert key != render_key("# hi", INPUT_CSS, extras=["footnotes"], context={"a": 2})
+    assert key != render_key(
+        "# hi",
+        INPUT_CSS,
+        extras=["footnotes"],
+        extras_config={"footnotes": {"BACKLINK_TEXT": "link"}},
+        context={"a": 1},
+    )
+
+
+def test_render_key_stylesheet_location(tmp_path):
+    """Render key should change when the same stylesheet is moved elsewhere."""
+    css = tmp_path / "styles.css"
+    css.write_bytes(INPUT_CSS.read_bytes())
+    assert render_key("# hi", INPUT_CSS) != render_key("# hi", css)
+
+
+@pytest.mark.parametrize(
+    "package",
+    ["md2pdf", "weasyprint", "markdown", "pymdown-extensions", "pygments"],
+)
+def test_render_key_versions(package):
+    """Render key should change when any rendering package is upgraded."""
+    key = render_key("# hi", INPUT_CSS)
+    version = cache_module._version
+
+    def upgraded(name):
+        return "999" if name == package else version(name)
+
+    with mock.patch.object(cache_module, "_version", upgraded):
+        assert key != render_key("# hi", INPUT_CSS)
+
+
+@pytest.mark.parametrize(
+    "package", ["md2pdf", "markdown", "pymdown-extensions", "pygments"]
+)
+def test_html_key_versions(package):
+    """HTML key should change when any package generating HTML is upgraded."""
+    key = html_key("# hi")
+    version = cache_module._version
+
+    def upgraded(name):
+        return "999" if name == package else version(name)
+
+    with mock.patch.object(cache_module, "_version", upgraded):
+        assert key != html_key("# hi")
+
+
+def test_html_key():
+    """HTML key should change when the source, context or extensions change."""
+    key = html_key("# hi", extras=["footnotes"], context={"a": 1})
+    assert key == html_key("# hi", extras=["footnotes"], context={"a": 1})
+
+    assert key != html_key("# ho", extras=["footnotes"], context={"a": 1})
+    assert key != html_key("# hi", context={"a": 1})
+    assert key != html_key("# hi", extras=["footnotes"], context={"a": 2})
+    assert key != html_key(
+        "# hi",
+        extras=["footnotes"],
+        extras_config={"footnotes": {"BACKLINK_TEXT": "link"}},
+        context={"a": 1},
+    )
+
+
+def test_render_cache_get_put(cache, tmp_path):
+    """Store and retrieve a cache entry."""
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.7 source")
+    target = tmp_path / "target.pdf"
+
+    assert not cache.get("abcd", target)
+    assert not target.exists()
+
+    cache.put("abcd", source)
+    assert cache.get("abcd", target)
+    assert target.read_bytes() == b"%PDF-1.7 source"
+    assert cache.size() == len(b"%PDF-1.7 source")
+
+
+def test_render_cache_eviction(tmp_path):
+    """Least recently used entries should be evicted when the cache is full."""
+    cache = RenderCache(tmp_path / "cache", max_size=25)
+    source = tmp_path / "source.pdf"
+    target = tmp_path / "target.pdf"
+
+    for key in ("aa01", "bb02"):
+        source.write_bytes(b"0123456789")
+        cache.put(key, source)
+        source.unlink()
+
+    # Use the first entry so that the second one is the least recently used
+    stat = cache.path("bb02").stat()
+    os.utime(cache.path("bb02"), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+    assert cache.get("aa01", target)
+
+    source.write_bytes(b"0123456789")
+    cache.put("cc03", source)
+    assert cache.path("aa01").exists()
+    assert not cache.path("bb02").exists()
+    assert cache.path("cc03").exists()
+    assert cache.size() == 20
+
+
+def test_render_cache_get_linked_output(cache, tmp_path):
+    """Using an entry should not change the times of outputs linked to it."""
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.7 source")
+    cache.put("abcd", source)
+    output = tmp_path / "output.pdf"
+    assert cache.get("abcd", output)
+    stat = output.stat()
+    os.utime(output, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+    mtime = output.stat().st_mtime_ns
+
+    assert cache.get("abcd", tmp_path / "other.pdf")
+    assert output.stat().st_mtime_ns == mtime
+    assert cache.path("abcd").with_name("abcd.pdf.used").exists()
+
+
+def test_render_cache_clear(cache, tmp_path):
+    """Remove all cache entries."""
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.7")
+    cache.put("abcd", source)
+
+    assert cache.get("abcd", tmp_path / "target.pdf")
+
+    cache.clear()
+    assert not cache.path("abcd").exists()
+    assert not list(cache.directory.glob("*/*.used"))
+    assert cache.size() == 0
+
+
+def test_html_cache_load_store(tmp_path):
+    """Store and load cached HTML."""
+    cache = HTMLCache(tmp_path / "cache")
+
+    assert cache.load("abcd") is None
+    cache.store("abcd", "<h1>hi</h1>")
+    assert cache.load("abcd") == "<h1>hi</h1>"
+
+
+def test_render_cache_dependencies(cache, tmp_path):
+    """Entries whose dependencies have changed should be ignored."""
+    source = tmp_path / "source.pdf"
+    source.write_bytes(b"%PDF-1.7")
+    target = tmp_path / "target.pdf"
+    image = tmp_path / "image.png"
+    image.write_bytes(b"png")
+
+    dependencies = {str(image): signature(image)}
+    cache.put("abcd", source, dependencies)
+    assert cache.dependencies("abcd") == {str(image): list(signature(image))}
+    assert cache.get("abcd", target)
+
+    image.write_bytes(b"new png")
+    assert not cache.get("abcd", target)
+
+    # Dependencies are removed with their entry
+    cache.clear()
+    assert cache.dependencies("abcd") == {}
+
+
+def test_html_cache_dependencies(tmp_path):
+    """HTML whose dependencies have changed should be ignored."""
+    cache = HTMLCache(tmp_path / "cache")
+    snippet = tmp_path / "snippet.md"
+    snippet.write_text("snippet")
+
+    cache.store("abcd", "<p>snippet</p>", {str(snippet): signature(snippet)})
+    assert cache.load("abcd") == "<p>snippet</p>"
+
+    snippet.write_text("new snippet")
+    assert cache.load("abcd") is None
@@ -1,17 +1,35 @@
 """md2pdf tests for the CLI."""
 
 import json
+import os
 from importlib import metadata
+from io import StringIO
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from threading import Thread
+from threading import Event, Thread
 from time import sleep
 from unittest import mock
 
 import pytest
-
-from md2pdf.cli import cli, parse_config
+from pypdf import PdfReader
+
+from md2pdf.cli import (
+    _convert,
+    _get_progress,
+    _start_workers,
+    _watch,
+    cli,
+    console,
+    parse_config,
+)
+from md2pdf.conf import WORKER_MEMORY
+from md2pdf.deps import signature
 from md2pdf.exceptions import ValidationError
+from md2pdf.inputs import MANIFEST_FILE
+from md2pdf.pool import ConvertOptions, ExecutorType, auto_workers, get_executor
+from md2pdf.preview import Preview
+from md2pdf.schedule import History
+from md2pdf.stats import DocumentStats
 
 from .defaults import DEFAULT_OUTPUT_PDF, INPUT_CSS, INPUT_MD, OUTPUT_PDF
 
@@ -58,23 +76,24 @@ def test_parse_config_invalid_config(config):
 def test_print_usage_when_no_args(cli_runner):
     """Print usage when no arguments are passed."""
     result = cli_runner.invoke(cli)
-    expected = "Usage: main [OPTIONS]"
+    expected = "Usage: md2pdf [OPTIONS]"
     assert result.exit_code == 2
     assert expected in result.output
 
 
-def test_exit_when_no_markdown_input(cli_runner):
+def test_exit_when_no_markdown_input(cli_runner, tmp_path):
     """Exit with an error message when not input markdown files are passed."""
-    result = cli_runner.invoke(cli, ["-o", "test.pdf"])
+    result = cli_runner.invoke(cli, ["-o", str(tmp_path / "test.pdf")])
     expected = "No markdown input file. See `--help`"
     assert result.exit_code == 2
     assert expected in result.output
 
 
-def test_exit_when_multiple_markdown_and_pdf_options(cli_runner):
+def test_exit_when_multiple_markdown_and_pdf_options(cli_runner, tmp_path):
     """Exit with an error message when called with multitple input & output options."""
     result = cli_runner.invoke(
-        cli, ["-i", str(INPUT_MD), "-i", str(INPUT_MD), "-o", "test.pdf"]
+        cli,
+        ["-i", str(INPUT_MD), "-i", str(INPUT_MD), "-o", str(tmp_path / "test.pdf")],
     )
     expected = "PDF output option `--output/-o` cannot be used with multiple input."
     assert result.exit_code == 2
@@ -150,6 +169,133 @@ def test_generate_pdf_from_multiple_markdown_source_files(cli_runner):
     second_pdf.unlink()
 
 
+def test_generate_pdf_from_multiple_markdown_source_files_with_processes(cli_runner):
+    """Generate PDFs from markdown files using the process executor."""
+    assert not DEFAULT_OUTPUT_PDF.exists()
+
+    # Extra markdown file
+    #
+    # Should be manually deleted for python < 3.12 compatibility
+    with NamedTemporaryFile(suffix=".md", delete=False) as second_md:
+        second_md.write(b"# title")
+        second_md.close()
+
+        second_pdf = Path(second_md.name).with_suffix(".pdf")
+        assert not second_pdf.exists()
+
+        result = cli_runner.invoke(
+            cli,
+            ["-x", "process", "-W", "2", "-i", str(INPUT_MD), "-i", second_md.name],
+        )
+        assert result.exit_code == 0
+
+        assert DEFAULT_OUTPUT_PDF.exists()
+        assert second_pdf.exists()
+
+        # Manual cleanup
+        Path(second_md.name).unlink()
+
+    # Clean generated PDF and temporary file
+    second_pdf.unlink()
+
+
+def test_report_failed_conversion(cli_runner):
+    """Report failed conversions without stopping the batch."""
+    assert not OUTPUT_PDF.exists()
+    with NamedTemporaryFile(suffix=".md") as empty_md:
+        result = cli_runner.invoke(cli, ["-i", empty_md.name])
+    assert result.exit_code == 0
+    assert "Failed to convert" in result.output
+
+
+def test_generate_pdf_with_render_cache(cli_runner, tmp_path):
+    """Generate PDFs from the render cache."""
+    second_md = tmp_path / "second.md"
+    second_md.write_text(INPUT_MD.read_text())
+
+    with mock.patch("md2pdf.cli._convert", wraps=_convert) as convert:
+        # Identical documents are rendered once
+        result = cli_runner.invoke(
+            cli,
+            ["--cache-dir", str(tmp_path / "cache"), "-i", str(INPUT_MD)]
+            + ["-i", str(second_md)],
+        )
+        assert result.exit_code == 0
+        assert convert.call_count == 1
+        assert DEFAULT_OUTPUT_PDF.exists()
+        assert second_md.with_suffix(".pdf").exists()
+        DEFAULT_OUTPUT_PDF.unlink()
+
+        # Unchanged documents are copied from the cache
+        result = cli_runner.invoke(
+            cli, ["--cache-dir", str(tmp_path / "cache"), "-i", str(INPUT_MD)]
+        )
+        assert result.exit_code == 0
+        assert convert.call_count == 1
+        assert DEFAULT_OUTPUT_PDF.exists()
+
+        # Unless the cache is disabled
+        result = cli_runner.invoke(
+            cli,
+            ["--cache-dir", str(tmp_path / "cache"), "--no-cache", "-i", str(INPUT_MD)],
+        )
+        assert result.exit_code == 0
+        assert convert.call_count == 2
+
+
+def test_generate_pdf_with_stats(cli_runner, tmp_path):
+    """Write conversion statistics report."""
+    stats = tmp_path / "stats.jsonl"
+    result = cli_runner.invoke(
+        cli, ["--stats", str(stats), "-i", str(INPUT_MD), "-o", str(OUTPUT_PDF)]
+    )
+    assert result.exit_code == 0
+
+    document, batch = (json.loads(line) for line in stats.read_text().splitlines())
+    assert document["type"] == "document"
+    assert document["input"] == str(INPUT_MD)
+    assert document["output"] == str(OUTPUT_PDF)
+    assert document["pages"] > 0
+    assert document["size"] == OUTPUT_PDF.stat().st_size
+    assert "layout" in document["stages"]
+    assert batch["type"] == "batch"
+    assert batch["documents"] == batch["rendered"] == 1
+    assert batch["stages"]["layout"]["p95"] == document["stages"]["layout"]
+    assert batch["rss"] == document["rss"]
+
+
+def test_generate_pdf_with_worker_limits(cli_runner, tmp_path):
+    """Recycle workers with a memory budget, using worker processes."""
+    md = []
+    for index in range(3):
+        md_ = tmp_path / f"{index}.md"
+        md_.write_text(f"# {index}")
+        md.append(md_)
+    stats = tmp_path / "stats.jsonl"
+    result = cli_runner.invoke(
+        cli,
+        [
+            "--max-tasks-per-worker",
+            "1",
+            "--max-worker-rss",
+            "4096",
+            "-W",
+            "2",
+            "--stats",
+            str(stats),
+            *(option for md_ in md for option in ("-i", str(md_))),
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Worker memory budget: 4096 MiB" in result.output
+    *documents, batch = (json.loads(line) for line in stats.read_text().splitlines())
+    assert batch["rendered"] == 3
+    assert all(document["rss"] for document in documents)
+
+    result = cli_runner.invoke(cli, ["--max-worker-rss", "0", "-i", str(md[0])])
+    assert result.exit_code == 2
+
+
 def test_generate_pdf_from_markdown_source_file_and_stylesheet(cli_runner):
     """Generate a PDF from a markdown and a CSS file."""
     assert not OUTPUT_PDF.exists()
@@ -292,3 +438,539 @@ def test_generate_pdf_with_watch_and_css(cli_runner):
     assert output_pdf_last_modification != DEFAULT_OUTPUT_PDF.stat().st_mtime
     assert second_pdf_last_modification != second_pdf.stat().st_mtime
     second_pdf.unlink()
+
+
+def test_watch_coalesces_changes(tmp_path):
+    """Changes detected together should trigger a single render."""
+    first, second = tmp_path / "first.md", tmp_path / "second.md"
+    first.write_text("# First")
+    second.write_text("# Second")
+    render = mock.Mock(return_value=[])
+
+    def run():
+        try:
+            _watch(render, [first, second], None, [])
+        except KeyboardInterrupt:
+            pass
+
+    # Raise a KeyboardInterrupt after the first render
+    with mock.patch("md2pdf.cli.watcher_callback", side_effect=KeyboardInterrupt):
+        watcher = Thread(target=run, daemon=True)
+        watcher.start()
+
+        # Wait a bit for the watcher to start before performing changes
+        sleep(1)
+        second.write_text("# Second (edited)")
+        first.write_text("# First (edited)")
+        watcher.join(timeout=60)
+
+    render.assert_called_once()
+    assert render.call_args.kwargs["md"] == [first, second]
+    assert not render.call_args.kwargs["stale"].is_set()
+
+
+def test_watch_dependencies(tmp_path):
+    """Only documents depending on a changed file should be rendered again."""
+    first, second = tmp_path / "first.md", tmp_path / "second.md"
+    first.write_text('--8<-- "snippet.md"')
+    second.write_text("# Second")
+    snippet = tmp_path / "snippet.md"
+    snippet.write_text("Snippet")
+    render = mock.Mock(return_value=[])
+    documents = [
+        DocumentStats(
+            input=str(first),
+            dependencies={str(first): None, str(snippet): signature(snippet)},
+        ),
+        DocumentStats(input=str(second), dependencies={str(second): None}),
+    ]
+
+    def run():
+        try:
+            _watch(render, [first, second], None, documents)
+        except KeyboardInterrupt:
+            pass
+
+    # Raise a KeyboardInterrupt after the first render
+    with mock.patch("md2pdf.cli.watcher_callback", side_effect=KeyboardInterrupt):
+        watcher = Thread(target=run, daemon=True)
+        watcher.start()
+
+        # Wait a bit for the watcher to start before performing changes
+        sleep(1)
+        snippet.write_text("New snippet")
+        watcher.join(timeout=60)
+
+    render.assert_called_once()
+    assert render.call_args.kwargs["md"] == [first]
+
+
+def test_watch_renders_superseded_documents(tmp_path):
+    """Documents whose render was cancelled should be rendered with next changes."""
+    first, second, third = (tmp_path / f"{name}.md" for name in ("1", "2", "3"))
+    for md_ in (first, second, third):
+        md_.write_text(f"# {md_.stem}")
+
+    def render(progress, md, stale, superseded):
+        if render.call_count == 1:
+            # Input files change again while the first document is rendered
+            third.write_text("# 3 (edited)")
+            assert stale.wait(timeout=30)
+            superseded.extend(md[1:])
+            return [DocumentStats(input=str(md[0]))]
+        return [DocumentStats(input=str(md_)) for md_ in md]
+
+    render = mock.Mock(side_effect=render)
+
+    def run():
+        try:
+            _watch(render, [first, second, third], None, [])
+        except KeyboardInterrupt:
+            pass
+
+    # Raise a KeyboardInterrupt after the second render
+    with mock.patch(
+        "md2pdf.cli.watcher_callback", side_effect=[None, KeyboardInterrupt]
+    ):
+        watcher = Thread(target=run, daemon=True)
+        watcher.start()
+
+        # Wait a bit for the watcher to start before performing changes
+        sleep(1)
+        second.write_text("# 2 (edited)")
+        first.write_text("# 1 (edited)")
+        watcher.join(timeout=60)
+
+    assert render.call_count == 2
+    assert render.call_args_list[0].kwargs["md"] == [first, second]
+    assert render.call_args_list[1].kwargs["md"] == [second, third]
+
+
+def test_watch_switches_previews(tmp_path):
+    """Pressing Enter switches to full renders of all documents."""
+    first, second = tmp_path / "first.md", tmp_path / "second.md"
+    first.write_text("# First")
+    second.write_text("# Second")
+    render = mock.Mock(return_value=[])
+    preview = Preview(pages=(1, 2))
+
+    def run():
+        try:
+            _watch(render, [first, second], None, [], preview=preview)
+        except KeyboardInterrupt:
+            pass
+
+    # Raise a KeyboardInterrupt after the first render
+    with (
+        mock.patch("md2pdf.cli.watcher_callback", side_effect=KeyboardInterrupt),
+        mock.patch("md2pdf.cli.sys.stdin", StringIO("\n")),
+    ):
+        watcher = Thread(target=run, daemon=True)
+        watcher.start()
+        watcher.join(timeout=60)
+
+    render.assert_called_once()
+    assert render.call_args.kwargs["md"] == [first, second]
+    assert render.call_args.kwargs["preview"] is None
+
+
+def test_generate_pdf_with_preview(cli_runner, tmp_path):
+    """Render a part of documents in preview mode."""
+    md = tmp_path / "long.md"
+    md.write_text("\n\n".join(f"# Chapter {index}" for index in range(1, 6)))
+
+    result = cli_runner.invoke(cli, ["-i", str(md), "--preview-pages", "2-3"])
+    assert result.exit_code == 0
+    assert "Preview: pages 2-3" in result.output
+    # Previews do not replace output files
+    assert not md.with_suffix(".pdf").exists()
+    assert len(PdfReader(md.with_suffix(".preview.pdf")).pages) == 2
+
+    result = cli_runner.invoke(cli, ["-i", str(md), "--preview-section", "chapter 4"])
+    assert result.exit_code == 0
+    assert len(PdfReader(md.with_suffix(".preview.pdf")).pages) == 1
+
+    result = cli_runner.invoke(
+        cli, ["-i", str(md), "-o", str(tmp_path / "out.pdf"), "--preview-pages", "1"]
+    )
+    assert result.exit_code == 0
+    assert len(PdfReader(tmp_path / "out.preview.pdf").pages) == 1
+
+    result = cli_runner.invoke(cli, ["-i", str(md), "--preview-pages", "3-1"])
+    assert result.exit_code == 2
+    assert "Invalid value for '--preview-pages'" in result.output
+
+
+@pytest.mark.parametrize(
+    "options",
+    (
+        ["--preview-pages", "1", "--preview-section", "Title"],
+        ["--preview-pages", "1", "--make"],
+        ["--preview-section", "Title", "--book", "-o", "output.pdf"],
+    ),
+)
+def test_exit_when_preview_options_are_invalid(cli_runner, options):
+    """Exit with an error message when preview options are inconsistent."""
+    result = cli_runner.invoke(cli, ["-i", str(INPUT_MD), *options])
+    assert result.exit_code == 2
+    assert "Preview options" in result.output
+
+
+def test_start_workers_cancels_superseded_renders(tmp_path):
+    """Renders that have not started should be cancelled when inputs changed."""
+    md = []
+    for name in ("first", "second", "third"):
+        md_ = tmp_path / f"{name}.md"
+        md_.write_text(f"# {name}")
+        md.append(md_)
+    # The largest document is rendered first
+    md[0].write_text("# first\n\nLong document.")
+    stale = Event()
+
+    def convert(md_, pdf, options, preview=None):
+        # Input files change during the first render
+        stale.set()
+        sleep(0.5)
+        pdf.touch()
+        return DocumentStats(input=str(md_), output=str(pdf))
+
+    superseded: list[Path] = []
+    with (
+        mock.patch("md2pdf.cli._convert", side_effect=convert),
+        get_executor(ExecutorType.thread, 1) as pool,
+        console.capture() as capture,
+    ):
+        _start_workers(
+            _get_progress(console),
+            pool,
+            md,
+            None,
+            ConvertOptions(),
+            stale=stale,
+            superseded=superseded,
+        )
+
+    assert sorted(superseded) == [md[1], md[2]]
+    assert md[0].with_suffix(".pdf").exists()
+    assert not md[1].with_suffix(".pdf").exists()
+    assert not md[2].with_suffix(".pdf").exists()
+    assert "Cancelled 2 superseded renders" in capture.get()
+
+
+def test_start_workers_schedules_longest_documents_first(tmp_path):
+    """Send documents to workers by decreasing cost, recording their durations."""
+    md = []
+    for index, size in enumerate((10, 1000, 100)):
+        md_ = tmp_path / f"{index}.md"
+        md_.write_text("x" * size)
+        md.append(md_)
+    started = []
+
+    def convert(md_, pdf, options, preview=None):
+        started.append(md_)
+        pdf.touch()
+        return DocumentStats(
+            input=str(md_), output=str(pdf), duration=10.0 if md_ == md[0] else 1.0
+        )
+
+    history = History()
+    with (
+        mock.patch("md2pdf.cli._convert", side_effect=convert),
+        get_executor(ExecutorType.thread, 1) as pool,
+    ):
+        _start_workers(
+            _get_progress(console), pool, md, None, ConvertOptions(), history=history
+        )
+        assert started == [md[1], md[2], md[0]]
+
+        # The short document was the longest to convert
+        started.clear()
+        _start_workers(
+            _get_progress(console), pool, md, None, ConvertOptions(), history=history
+        )
+        assert started == [md[0], md[1], md[2]]
+
+
+def test_generate_pdf_with_auto_workers(cli_runner, tmp_path):
+    """Size the pool automatically with `--workers auto`."""
+    md = tmp_path / "input.md"
+    md.write_text("# Title")
+    with mock.patch("md2pdf.cli.auto_workers", return_value=3) as auto_workers:
+        result = cli_runner.invoke(cli, ["-W", "auto", "-i", str(md)])
+    assert result.exit_code == 0
+    assert "Workers: 3" in result.output
+    auto_workers.assert_called_once_with(1)
+    assert md.with_suffix(".pdf").exists()
+
+    result = cli_runner.invoke(cli, ["-W", "0", "-i", str(md)])
+    assert result.exit_code == 2
+    assert "positive integer" in result.output
+
+
+def test_auto_workers():
+    """Start a worker per core, as long as they fit in memory."""
+    with (
+        mock.patch("os.sched_getaffinity", return_value=set(range(8)), create=True),
+        mock.patch(
+            "md2pdf.pool._available_memory", return_value=3 * WORKER_MEMORY
+        ) as available_memory,
+    ):
+        assert auto_workers() == 3
+        assert auto_workers(jobs=2) == 2
+        available_memory.return_value = None
+        assert auto_workers() == 8
+        available_memory.return_value = 0
+        assert auto_workers() == 1
+
+
+def test_generate_pdfs_from_directory_with_make(cli_runner, tmp_path):
+    """Convert a source tree to an output directory, skipping up to date PDFs."""
+    source, output = tmp_path / "docs", tmp_path / "out"
+    for path in ("index.md", "guide/intro.md"):
+        (source / path).parent.mkdir(parents=True, exist_ok=True)
+        (source / path).write_text("# Title")
+    options = ["-i", str(source), "--output-dir", str(output), "--make"]
+
+    result = cli_runner.invoke(cli, options)
+    assert result.exit_code == 0
+    assert (output / "index.pdf").exists()
+    assert (output / "guide" / "intro.pdf").exists()
+    assert (output / MANIFEST_FILE).exists()
+
+    result = cli_runner.invoke(cli, options)
+    assert result.exit_code == 0
+    assert "2 documents are up to date" in result.output
+
+    # Only changed documents are converted again
+    (source / "index.md").write_text("# New title")
+    os.utime(source / "index.md", ns=(2 * 10**18, 2 * 10**18))
+    stats = tmp_path / "stats.jsonl"
+    result = cli_runner.invoke(cli, [*options, "--stats", str(stats)])
+    assert result.exit_code == 0
+    assert "1 documents are up to date" in result.output
+    *_, batch = (json.loads(line) for line in stats.read_text().splitlines())
+    assert batch["rendered"] == 1
+    assert batch["cached"] == 1
+
+
+def test_generate_pdfs_from_glob_pattern(cli_runner, tmp_path):
+    """Convert files matching a glob pattern."""
+    for name in ("first", "second"):
+        (tmp_path / f"{name}.md").write_text(f"# {name}")
+    result = cli_runner.invoke(cli, ["-i", str(tmp_path / "*.md")])
+    assert result.exit_code == 0
+    assert (tmp_path / "first.pdf").exists()
+    assert (tmp_path / "second.pdf").exists()
+
+    result = cli_runner.invoke(cli, ["-i", str(tmp_path / "*.txt")])
+    assert result.exit_code == 2
+    assert "No markdown input file" in result.output
+
+
+def test_generate_pdf_from_stdin_to_stdout(cli_runner, tmp_path):
+    """Stream markdown from stdin, and the PDF to stdout."""
+    result = cli_runner.invoke(cli, ["-i", "-"], input="# Title")
+    assert result.exit_code == 0
+    assert result.stdout_bytes.startswith(b"%PDF")
+    assert "Output file generated" in result.stderr
+
+    result = cli_runner.invoke(cli, ["-i", str(INPUT_MD), "-o", "-", "-x", "process"])
+    assert result.exit_code == 0
+    assert result.stdout_bytes.startswith(b"%PDF")
+
+    output = tmp_path / "output.pdf"
+    result = cli_runner.invoke(cli, ["-i", "-", "-o", str(output)], input="# Title")
+    assert result.exit_code == 0
+    assert output.read_bytes().startswith(b"%PDF")
+
+    result = cli_runner.invoke(cli, ["-i", "-"], input="")
+    assert result.exit_code == 1
+    assert not result.stdout_bytes
+
+
+@pytest.mark.parametrize(
+    "options",
+    (
+        ["-i", "-", "-i", str(INPUT_MD)],
+        ["-i", "-", "--watch"],
+        ["-i", str(INPUT_MD), "-o", "-", "--split-at", "h1"],
+    ),
+)
+def test_exit_when_stdio_options_are_invalid(cli_runner, options):
+    """Exit with an error message when streams are used with other inputs."""
+    result = cli_runner.invoke(cli, options)
+    assert result.exit_code == 2
+    assert "Standard input and output" in result.output
+
+
+@pytest.mark.parametrize(
+    "options",
+    (
+        ["--output-dir", "out", "-o", "output.pdf"],
+        ["--output-dir", "out", "--book", "-o", "output.pdf"],
+        ["--make", "--split-at", "h1"],
+    ),
+)
+def test_exit_when_output_dir_or_make_options_are_invalid(cli_runner, options):
+    """Exit with an error message when output options are inconsistent."""
+    result = cli_runner.invoke(cli, ["-i", str(INPUT_MD), *options])
+    assert result.exit_code == 2
+    assert "cannot be used with" in result.output
+
+
+def test_generate_pdfs_from_data_rows(cli_runner, tmp_path):
+    """Generate a PDF per data row from a markdown template."""
+    template = tmp_path / "letter.md"
+    template.write_text("# Hey {{ name }} 👋")
+    data = tmp_path / "rows.jsonl"
+    data.write_text('{"id": 1, "name": "John"}\n{"id": 2, "name": "Jane"}\n')
+
+    result = cli_runner.invoke(
+        cli,
+        ["-i", str(template), "-d", str(data), "-O", f"{tmp_path}/out/{{id}}.pdf"],
+    )
+    assert result.exit_code == 0
+    assert "2 output files generated" in result.output
+    assert (tmp_path / "out" / "1.pdf").exists()
+    assert (tmp_path / "out" / "2.pdf").exists()
+
+    # Default output pattern
+    result = cli_runner.invoke(cli, ["-i", str(template), "-d", str(data)])
+    assert result.exit_code == 0
+    assert (tmp_path / "letter-1.pdf").exists()
+    assert (tmp_path / "letter-2.pdf").exists()
+
+
+def test_exit_when_data_is_used_with_multiple_inputs(cli_runner, tmp_path):
+    """Exit with an error message when data rows are used with multiple inputs."""
+    data = tmp_path / "rows.jsonl"
+    data.write_text('{"id": 1}\n')
+
+    pattern = f"{tmp_path}/input-{{index}}.pdf"
+    result = cli_runner.invoke(
+        cli, ["-i", str(INPUT_MD), "-i", str(INPUT_MD), "-d", str(data), "-O", pattern]
+    )
+    expected = "Data option `--data/-d` requires a single input"
+    assert result.exit_code == 2
+    assert expected in result.output
+
+
+def test_generate_book(cli_runner, tmp_path):
+    """Combine markdown files as chapters of a single PDF."""
+    chapters = []
+    for number in (1, 2):
+        md = tmp_path / f"chapter-{number}.md"
+        md.write_text(f"# Chapter {number}\n")
+        chapters += ["-i", str(md)]
+    pdf = tmp_path / "book.pdf"
+
+    result = cli_runner.invoke(cli, ["--book", *chapters, "-o", str(pdf)])
+    assert result.exit_code == 0
+    assert "2/2 chapters laid out" in result.output
+    assert len(PdfReader(pdf).pages) == 2
+
+
+@pytest.mark.parametrize(
+    "options",
+    (
+        ["--book", "-i", str(INPUT_MD)],
+        ["--book", "-i", str(INPUT_MD), "-o", str(OUTPUT_PDF), "--split-at", "h1"],
+    ),
+)
+def test_exit_when_book_options_are_invalid(cli_runner, options):
+    """Exit with an error message when book options are inconsistent."""
+    result = cli_runner.invoke(cli, options)
+    assert result.exit_code == 2
+    assert "requires the `--output/-o` option" in result.output
+
+
+def test_generate_pdf_with_split_rendering(cli_runner, tmp_path):
+    """Generate a PDF laying out chunks in parallel."""
+    manual = tmp_path / "manual.md"
+    manual.write_text("# Chapter 1\n\nFirst.\n\n# Chapter 2\n\nSecond.\n")
+    with mock.patch("md2pdf.cli.get_executor", wraps=get_executor) as executor:
+        result = cli_runner.invoke(
+            cli, ["--split-at", "h1", "-W", "2", "-i", str(manual)]
+        )
+        assert executor.call_args.args[0] == ExecutorType.process
+    assert result.exit_code == 0
+    assert len(PdfReader(manual.with_suffix(".pdf")).pages) == 2
+
+
+def test_split_rendering_image_options(cli_runner, tmp_path):
+    """Split renders with different image options should not share cache entries."""
+    manual = tmp_path / "manual.md"
+    manual.write_text("# Chapter 1\n\nFirst.\n\n# Chapter 2\n\nSecond.\n")
+    cache_dir = tmp_path / "cache"
+    options = ["--split-at", "h1", "-i", str(manual), "--cache-dir", str(cache_dir)]
+
+    for dpi in ("96", "150", "96"):
+        result = cli_runner.invoke(cli, [*options, "--dpi", dpi])
+        assert result.exit_code == 0
+    assert len(list(cache_dir.glob("*/*.pdf"))) == 2
+
+
+def test_exit_when_split_is_used_with_data(cli_runner, tmp_path):
+    """Exit with an error message when split rendering is used with data rows."""
+    data = tmp_path / "rows.jsonl"
+    data.write_text('{"id": 1}\n')
+
+    pattern = f"{tmp_path}/input-{{index}}.pdf"
+    result = cli_runner.invoke(
+        cli, ["-i", str(INPUT_MD), "-d", str(data), "-O", pattern, "--split-at", "h1"]
+    )
+    assert result.exit_code == 2
+    assert "cannot be used with the `--data/-d` option" in result.output
+
+
+def test_serve(cli_runner):
+    """Start and stop the render server."""
+    with mock.patch("md2pdf.server.make_server") as make_server:
+        server = make_server.return_value
+        server.serve_forever.side_effect = KeyboardInterrupt
+        result = cli_runner.invoke(cli, ["serve", "-x", "thread", "-W", "1"])
+
+    assert result.exit_code == 0
+    assert "Listening on http://127.0.0.1:8000" in result.output
+    assert make_server.call_args.kwargs == {
+        "host": "127.0.0.1",
+        "port": 8000,
+        "socket": None,
+    }
+    server.server_close.assert_called_once()
+
+
+def test_bench(cli_runner, tmp_path):
+    """Save benchmark baseline, then check for regressions."""
+    results = {
+        "scale": 1.0,
+        "results": {
+            "cli/small": {
+                "documents": 2,
+                "pages": 2,
+                "throughput": 10.0,
+                "pages_throughput": 10.0,
+                "peak_memory": 100.0,
+                "duration": {"p50": 0.1, "p95": 0.2},
+            }
+        },
+    }
+    baseline = tmp_path / "baseline.json"
+    with mock.patch("md2pdf.cli.run_benchmark", return_value=results) as run:
+        result = cli_runner.invoke(
+            cli, ["bench", "--corpus", "small", "--baseline", str(baseline)]
+        )
+        assert result.exit_code == 0
+        assert "Baseline saved" in result.output
+        assert json.loads(baseline.read_text()) == results
+        assert run.call_args.args[0] == ["small"]
+
+        result = cli_runner.invoke(cli, ["bench", "--baseline", str(baseline)])
+        assert result.exit_code == 0
+        assert "No regression" in result.output
+
+    results["results"]["cli/small"]["throughput"] = 5.0
+    with mock.patch("md2pdf.cli.run_benchmark", return_value=results):
+        result = cli_runner.invoke(cli, ["bench", "--baseline", str(baseline)])
+        assert result.exit_code == 1
+        assert "Regression: cli/small: throughput 5.00" in result.output
@@ -1,12 +1,27 @@
 """md2pdf tests for the core module."""
 
+import os
+import random
+import shutil
+from io import BytesIO, StringIO
+from time import time
+from unittest import mock
+
 import pytest
+from jinja2 import Template
 from pypdf import PdfReader
 
-from md2pdf import md2pdf
+from md2pdf import document2pdf, html2document, md2html, md2pdf, md2pdf_many
+from md2pdf.bench import _png
+from md2pdf.cache import HTMLCache, RenderCache
+from md2pdf.conf import MARKDOWN_BASE_EXTENSIONS
+from md2pdf.core import Converter
 from md2pdf.exceptions import ValidationError
+from md2pdf.fetch import Resource
+from md2pdf.pool import ConvertOptions, Job
+from md2pdf.stats import STAGES
 
-from .defaults import INPUT_MD, OUTPUT_PDF
+from .defaults import INPUT_CSS, INPUT_MD, OUTPUT_PDF
 
 
 def test_generate_pdf_from_markdown_file():
@@ -98,3 +113,294 @@ def test_raises_a_validation_error_when_generated_html_is_empty():
     """Raise a ValidationError when generated HTML is empty."""
     with pytest.raises(ValidationError):
         md2pdf(OUTPUT_PDF)
+
+
+def test_md2html():
+    """Render markdown and its template to HTML."""
+    assert md2html(raw="# hi there!") == "<h1>hi there!</h1>"
+    assert md2html(raw="# hi {{ name }}!", context={"name": "you"}) == (
+        "<h1>hi you!</h1>"
+    )
+    assert md2html(md=INPUT_MD).startswith("<h1>An exhibit of Markdown</h1>")
+
+    with pytest.raises(ValidationError):
+        md2html()
+
+
+def test_generate_pdf_bytes_from_html():
+    """Generate PDF bytes or a PDF file object from HTML stages."""
+    document = html2document("<h1>hi there!</h1>", css=INPUT_CSS)
+    assert len(document.pages) == 1
+
+    pdf = document2pdf(document)
+    assert pdf is not None
+    assert pdf.startswith(b"%PDF")
+    reader = PdfReader(BytesIO(pdf))
+    assert reader.pages[0].extract_text() == "hi there!"
+
+    output = BytesIO()
+    assert document2pdf(document, output) is None
+    assert output.getvalue().startswith(b"%PDF")
+
+
+def test_converter_generate_multiple_pdfs():
+    """Generate multiple PDFs with the same converter."""
+    converter = Converter()
+
+    for content in ("# first", "# second"):
+        converter.convert(OUTPUT_PDF, raw=content, css=INPUT_CSS)
+        assert OUTPUT_PDF.exists()
+
+        reader = PdfReader(OUTPUT_PDF)
+        assert reader.pages[0].extract_text() == content[2:]
+        OUTPUT_PDF.unlink()
+
+
+def test_converter_stylesheet_cache(tmp_path):
+    """Parse stylesheets once, and again when they change."""
+    converter = Converter()
+    css = tmp_path / "styles.css"
+    shutil.copy(INPUT_CSS, css)
+
+    stylesheet = converter.stylesheet(css)
+    assert converter.stylesheet(css) is stylesheet
+
+    css.write_text("body { color: red; }")
+    stat = css.stat()
+    os.utime(css, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert converter.stylesheet(css) is not stylesheet
+
+
+def test_converter_markdown_engine_cache():
+    """Markdown engines are reused for identical extensions configuration."""
+    converter = Converter()
+    extensions = [*MARKDOWN_BASE_EXTENSIONS, "footnotes"]
+
+    engine = converter.markdown(extensions, {})
+    assert converter.markdown(extensions, {}) is engine
+    assert converter.markdown(MARKDOWN_BASE_EXTENSIONS, {}) is not engine
+    config = {"footnotes": {"BACKLINK_TEXT": "link"}}
+    assert converter.markdown(extensions, config) is not engine
+
+
+def test_generate_pdf_with_render_cache(tmp_path):
+    """Unchanged documents should be copied from the render cache."""
+    assert not OUTPUT_PDF.exists()
+
+    md2pdf(OUTPUT_PDF, raw="# hi there!", cache_dir=tmp_path)
+    assert OUTPUT_PDF.exists()
+    OUTPUT_PDF.unlink()
+
+    with mock.patch("weasyprint.HTML") as html:
+        md2pdf(OUTPUT_PDF, raw="# hi there!", cache_dir=tmp_path)
+        html.assert_not_called()
+    assert OUTPUT_PDF.exists()
+    reader = PdfReader(OUTPUT_PDF)
+    assert reader.pages[0].extract_text() == "hi there!"
+
+    # Changing the input should trigger a new rendering
+    with mock.patch("weasyprint.HTML") as html:
+        md2pdf(OUTPUT_PDF, raw="# hi there?", cache_dir=tmp_path)
+        html.assert_called_once()
+
+
+def test_converter_html_cache(tmp_path):
+    """Markdown sources should not be rendered again when only styles change."""
+    converter = Converter()
+
+    with mock.patch.object(
+        converter, "_render_html", wraps=converter._render_html
+    ) as render_html:
+        converter.convert(OUTPUT_PDF, raw="# hi there!")
+        converter.convert(OUTPUT_PDF, raw="# hi there!", css=INPUT_CSS)
+        assert render_html.call_count == 1
+
+        converter.convert(OUTPUT_PDF, raw="# hi {{ name }}!", context={"name": "you"})
+        converter.convert(OUTPUT_PDF, raw="# hi {{ name }}!", context={"name": "me"})
+        assert render_html.call_count == 3
+
+    # HTML is shared between converters using the same HTML cache
+    html_cache = HTMLCache(tmp_path)
+    Converter(html_cache=html_cache).convert(OUTPUT_PDF, raw="# hi there!")
+    converter = Converter(html_cache=html_cache)
+    with mock.patch.object(converter, "_render_html") as render_html:
+        converter.convert(OUTPUT_PDF, raw="# hi there!", css=INPUT_CSS)
+        render_html.assert_not_called()
+
+
+def test_converter_template_cache():
+    """Templates should be compiled once."""
+    converter = Converter()
+    raw = "---\nid: 2\n---\n# Hey {{ name }} ({{ id }})"
+
+    with mock.patch("md2pdf.core.Template", wraps=Template) as template:
+        for name in ("John", "Jane"):
+            html = converter.md2html(raw, context={"name": name, "id": 1})
+            assert html == f"<h1>Hey {name} (2)</h1>"
+        template.assert_called_once()
+
+
+def test_converter_convert_stats(tmp_path):
+    """Conversion stages should be timed."""
+    converter = Converter(cache=RenderCache(tmp_path))
+
+    stats = converter.convert(OUTPUT_PDF, md=INPUT_MD, css=INPUT_CSS)
+    assert stats.input == str(INPUT_MD)
+    assert stats.output == str(OUTPUT_PDF)
+    assert not stats.cached
+    assert list(stats.stages) == list(STAGES)
+    assert stats.duration >= sum(stats.stages.values())
+    assert stats.pages == len(PdfReader(OUTPUT_PDF).pages)
+    assert stats.size == OUTPUT_PDF.stat().st_size
+    assert stats.rss is None
+    assert converter.stats is None
+
+    stats = converter.convert(OUTPUT_PDF, md=INPUT_MD, css=INPUT_CSS)
+    assert stats.cached
+    assert list(stats.stages) == ["read", "cache"]
+    assert stats.pages is None
+    assert stats.size == OUTPUT_PDF.stat().st_size
+
+
+def test_converter_convert_to_file_object(tmp_path):
+    """Documents converted to file objects are not cached."""
+    converter = Converter(cache=RenderCache(tmp_path))
+    for _ in range(2):
+        with BytesIO() as output:
+            stats = converter.convert(output, raw="# Title")
+            assert stats.size == len(output.getvalue())
+        assert stats.output is None
+        assert not stats.cached
+    assert not list(tmp_path.glob("*/*.pdf"))
+
+
+class Pipe(BytesIO):
+    """A writable binary stream that cannot seek (as a pipe)."""
+
+    def seekable(self) -> bool:
+        """Pipes cannot seek."""
+        return False
+
+
+def test_generate_pdf_from_stream_to_pipe():
+    """Read markdown from a text stream and write the PDF to a pipe."""
+    output = Pipe()
+    stats = md2pdf(output, md=StringIO("# Title"))
+    assert output.getvalue().startswith(b"%PDF")
+    assert stats.size == len(output.getvalue())
+    assert stats.input is None
+    assert stats.output is None
+
+
+def test_generate_pdf_with_string_paths(tmp_path):
+    """Paths can be given as strings."""
+    md = tmp_path / "input.md"
+    md.write_text("# Title")
+    stats = md2pdf(str(tmp_path / "output.pdf"), md=str(md))
+    assert stats.input == str(md)
+    assert stats.output == str(tmp_path / "output.pdf")
+    assert stats.size == (tmp_path / "output.pdf").stat().st_size
+
+    assert md2html(md=str(md)) == md2html(md=md) == md2html(raw="# Title")
+    assert Converter().md2html(md=os.fspath(md)) == md2html(md=md)
+
+
+def test_md2pdf_many(tmp_path):
+    """Convert documents in a pool, yielding results as they complete."""
+    jobs = [Job(tmp_path / f"{index}.pdf", raw=f"# {index}") for index in range(4)]
+    jobs.append(Job(tmp_path / "empty.pdf", raw=""))
+    jobs.append(Job(md=INPUT_MD))
+
+    results = list(
+        md2pdf_many(iter(jobs), workers=2, options=ConvertOptions(css=INPUT_CSS))
+    )
+    assert {result.job for result in results} == set(jobs)
+    for result in results:
+        if result.job.raw == "":
+            assert isinstance(result.error, ValidationError)
+            assert result.stats is None
+        elif result.job.pdf is None:
+            assert result.output.startswith(b"%PDF")
+            assert result.stats.size == len(result.output)
+        else:
+            assert result.output == result.job.pdf
+            assert result.stats.size == result.job.pdf.stat().st_size
+
+
+def test_md2pdf_many_close(tmp_path):
+    """Jobs are read lazily, and pending jobs are cancelled on close."""
+    read = []
+
+    def jobs():
+        for index in range(100):
+            read.append(index)
+            yield Job(tmp_path / f"{index}.pdf", raw=f"# {index}")
+
+    results = md2pdf_many(jobs(), workers=1)
+    assert next(results).error is None
+    results.close()
+    assert len(read) < 100
+    assert len(list(tmp_path.glob("*.pdf"))) < 100
+
+
+def test_converter_raw_stylesheet_cache(tmp_path):
+    """Raw stylesheets are parsed once per base URL."""
+    converter = Converter()
+
+    stylesheet = converter.raw_stylesheet("h1 { color: red }")
+    assert converter.raw_stylesheet("h1 { color: red }") is stylesheet
+    other = converter.raw_stylesheet("h1 { color: red }", base_url=tmp_path)
+    assert other is not stylesheet
+    assert converter.raw_stylesheet("h1 { color: red }", base_url=tmp_path) is other
+
+
+def test_converter_convert_dependencies(tmp_path):
+    """Record files loaded during conversions, and render them again if needed."""
+    md = tmp_path / "input.md"
+    md.write_text('# Title\n\n--8<-- "snippet.md"\n')
+    snippet = tmp_path / "snippet.md"
+    snippet.write_text("Snippet")
+    css = tmp_path / "styles.css"
+    css.write_text("h1 { color: red }")
+    converter = Converter()
+    config = {"pymdownx.snippets": {"base_path": [str(tmp_path)]}}
+
+    def convert():
+        return converter.convert(
+            tmp_path / "output.pdf",
+            md=md,
+            css=css,
+            extras=["pymdownx.snippets"],
+            extras_config=config,
+        )
+
+    stats = convert()
+    assert set(stats.dependencies) == {str(md), str(snippet), str(css)}
+    assert convert().dependencies == stats.dependencies
+
+    # Cached HTML is rendered again when a snippet changes
+    snippet.write_text("New snippet")
+    assert "New snippet" in converter.md2html(
+        md=md, extras=["pymdownx.snippets"], extras_config=config
+    )
+
+
+def test_converter_fetches_remote_resources_once(tmp_path):
+    """Remote resources are prefetched, then kept by the converter fetcher."""
+    image = tmp_path / "logo.png"
+    _png(image, random.Random(0), size=1)  # noqa: S311
+    url = "http://example.com/logo.png"
+    converter = Converter()
+
+    with mock.patch.object(
+        converter.fetcher,
+        "_request",
+        return_value=(
+            Resource(url, image.read_bytes(), "image/png", expires=time() + 60),
+            True,
+        ),
+    ) as request:
+        for _ in range(2):
+            stats = converter.convert(tmp_path / "output.pdf", raw=f"![logo]({url})")
+    request.assert_called_once_with(url, None)
+    assert "fetch" in stats.stages
@@ -0,0 +1,128 @@
+"""md2pdf tests for the dependencies module."""
+
+import os
+from threading import Thread
+from unittest import mock
+
+from md2pdf.core import Converter
+from md2pdf.deps import (
+    DependencyIndex,
+    absolute,
+    changed,
+    depend,
+    paused,
+    record,
+    signature,
+    track,
+)
+
+
+def touch(path):
+    """Change the file modification time."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+
+def test_record(tmp_path):
+    """Record files opened for reading, with their signatures."""
+    read, written, other = (tmp_path / name for name in ("read", "written", "other"))
+    read.write_text("read")
+    other.write_text("other")
+
+    track()
+    with record() as dependencies:
+        read.read_text()
+        written.write_text("written")
+        # Files opened by other threads are not recorded
+        thread = Thread(target=other.read_text)
+        thread.start()
+        thread.join()
+        # Neither are python modules
+        import md2pdf.merge  # noqa: F401
+
+    assert dependencies == {str(read): signature(read)}
+
+
+def test_record_nested_and_paused(tmp_path):
+    """Outer recorders should get dependencies of inner ones."""
+    first, second, third = (tmp_path / name for name in ("first", "second", "third"))
+    for path in (first, second, third):
+        path.write_text(path.name)
+
+    track()
+    with record() as outer:
+        first.read_text()
+        with record() as inner:
+            second.read_text()
+        with paused():
+            third.read_text()
+
+    assert set(inner) == {str(second)}
+    assert set(outer) == {str(first), str(second)}
+
+
+def test_record_ignored_directories(tmp_path):
+    """Files of ignored directories are not recorded, unlike their siblings."""
+    ignored, sibling = tmp_path / "prefix", tmp_path / "prefix-data"
+    for directory in (ignored, sibling):
+        directory.mkdir()
+        (directory / "file").write_text(directory.name)
+
+    track()
+    with (
+        mock.patch("md2pdf.deps.IGNORED_DIRECTORIES", (ignored,)),
+        record() as dependencies,
+    ):
+        (ignored / "file").read_text()
+        (sibling / "file").read_text()
+    assert set(dependencies) == {str(sibling / "file")}
+
+
+def test_track(tmp_path):
+    """Track opened files only when dependencies are requested."""
+    path = tmp_path / "file"
+    with mock.patch("md2pdf.deps._install_hook") as install:
+        with record() as dependencies:
+            depend({str(path): None})
+        assert dependencies == {str(path): None}
+        Converter()
+        install.assert_not_called()
+
+        Converter(dependencies=True)
+        install.assert_called_once()
+
+
+def test_changed(tmp_path):
+    """Detect changed, created or deleted dependencies."""
+    path = tmp_path / "image.png"
+    dependencies = {str(path): signature(path)}
+    assert not changed(dependencies)
+
+    path.write_bytes(b"png")
+    assert changed(dependencies)
+
+    dependencies = {str(path): signature(path)}
+    assert not changed(dependencies)
+    # Signatures loaded from JSON
+    assert not changed({str(path): list(signature(path))})
+
+    touch(path)
+    assert changed(dependencies)
+
+
+def test_dependency_index(tmp_path):
+    """Index documents that depend on files."""
+    index = DependencyIndex()
+    index.update("a.md", ["a.md", tmp_path / "image.png", tmp_path / "style.css"])
+    index.update("b.md", ["b.md", tmp_path / "style.css"])
+
+    assert index.dependents([tmp_path / "style.css"]) == {"a.md", "b.md"}
+    assert index.dependents([tmp_path / "image.png"]) == {"a.md"}
+    assert index.dependents(["b.md"]) == {"b.md"}
+    assert index.dependents([tmp_path / "other.png"]) == set()
+    assert absolute("a.md") in index.paths
+
+    # Dependencies are replaced
+    index.update("a.md", ["a.md", tmp_path / "style.css"])
+    assert index.dependents([tmp_path / "image.png"]) == set()
+    assert tmp_path / "image.png" not in index.paths
@@ -0,0 +1,289 @@
+"""md2pdf tests for the resources fetching module."""
+
+import time
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from md2pdf.conf import FETCH_MAX_AGE
+from md2pdf.deps import record, signature
+from md2pdf.exceptions import FetchError
+from md2pdf.fetch import (
+    Fetcher,
+    Resource,
+    ResourceCache,
+    _cache_control,
+    resource_urls,
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve resources of the test server, recording requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Serve a resource (or a redirect, or a not modified response)."""
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        server.clients.add(self.client_address)
+        time.sleep(server.delay)
+        path = self.path.split("?")[0]
+        if path not in server.resources:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body, headers = server.resources[path]
+        etag = headers.get("ETag")
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            body = b""
+        else:
+            self.send_response(302 if "Location" in headers else 200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+
+
+@pytest.fixture
+def server():
+    """A local HTTP server standing in for remote hosts."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.requests = []
+    server.clients = set()
+    server.delay = 0.0
+    server.resources = {
+        "/logo.png": (b"PNG", {"Content-Type": "image/png", "ETag": '"v1"'}),
+        "/style.css": (
+            b"h1 {}",
+            {"Content-Type": "text/css; charset=utf-8", "Cache-Control": "no-cache"},
+        ),
+        "/private.png": (b"PNG", {"Cache-Control": "no-store"}),
+        "/moved.png": (b"", {"Location": "/logo.png"}),
+    }
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    """A fetcher (closing its connections)."""
+    fetcher = Fetcher()
+    yield fetcher
+    fetcher.close()
+
+
+def test_resource_urls():
+    """Find remote resources of images, stylesheets and styles."""
+    html = (
+        '<p><img src="https://example.com/a.png"> <img src="local.png"></p>'
+        '<link rel="stylesheet" href="http://example.com/b.css">'
+        '<a href="https://example.com/page">link</a>'
+        "<style>body { background: url('https://example.com/c.png') }</style>"
+        '<div style="background: url(https://example.com/d.png)"></div>'
+        '<img src="https://example.com/a.png"><img src="data:image/png;base64,AA==">'
+    )
+    assert resource_urls(html) == [
+        "https://example.com/a.png",
+        "http://example.com/b.css",
+        "https://example.com/c.png",
+        "https://example.com/d.png",
+    ]
+
+
+def test_fetcher_fetch(server, fetcher):
+    """Fetch remote resources once while they are fresh."""
+    resource = fetcher.fetch(f"{server.url}/logo.png")
+    assert resource.body == b"PNG"
+    assert resource.mime_type == "image/png"
+    assert resource.etag == '"v1"'
+    assert fetcher.fetch(f"{server.url}/logo.png") == resource
+    assert len(server.requests) == 1
+
+    style = fetcher.fetch(f"{server.url}/style.css")
+    assert (style.mime_type, style.encoding) == ("text/css", "utf-8")
+
+
+def test_fetcher_revalidation(server, fetcher):
+    """Revalidate stale resources using their ETag."""
+    server.resources["/logo.png"][1]["Cache-Control"] = "max-age=0"
+    resource = fetcher.fetch(f"{server.url}/logo.png")
+    assert fetcher.fetch(f"{server.url}/logo.png").body == resource.body
+
+    (_, first), (_, second) = server.requests
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == '"v1"'
+
+    # The resource has changed
+    server.resources["/logo.png"] = (b"GIF", {"ETag": '"v2"'})
+    assert fetcher.fetch(f"{server.url}/logo.png").body == b"GIF"
+
+
+def test_fetcher_redirects_and_errors(server, fetcher):
+    """Follow redirects, raise a FetchError for HTTP errors."""
+    resource = fetcher.fetch(f"{server.url}/moved.png")
+    assert resource.url == f"{server.url}/logo.png"
+    assert resource.body == b"PNG"
+
+    with pytest.raises(FetchError, match="HTTP error 404"):
+        fetcher.fetch(f"{server.url}/missing.png")
+
+
+def test_fetcher_connections_reuse(server, fetcher):
+    """Reuse connections to the same host."""
+    for path in ("/logo.png", "/style.css", "/private.png"):
+        fetcher.fetch(f"{server.url}{path}")
+    assert len(server.requests) == 3
+    assert len(server.clients) == 1
+
+
+def test_fetcher_prefetch(server, fetcher):
+    """Prefetch resources concurrently."""
+    server.delay = 0.2
+    urls = [f"{server.url}/logo.png?v={v}" for v in range(5)]
+    started_at = time.perf_counter()
+    fetcher.prefetch(urls)
+    assert time.perf_counter() - started_at < 0.2 * 4
+    assert len(server.requests) == 5
+
+    # Prefetched resources are fresh, prefetch errors are not retried
+    fetcher.prefetch([*urls, f"{server.url}/missing.png"])
+    assert len(server.requests) == 6
+    for url in urls:
+        assert fetcher.fetch(url).body == b"PNG"
+    with pytest.raises(FetchError):
+        fetcher.fetch(f"{server.url}/missing.png")
+    assert len(server.requests) == 6
+
+    # Prefetch errors are forgotten with their document
+    fetcher.prefetch([f"{server.url}/missing.png"])
+    assert len(server.requests) == 7
+    fetcher.prefetch([])
+    with pytest.raises(FetchError):
+        fetcher.fetch(f"{server.url}/missing.png")
+    assert len(server.requests) == 8
+
+    # Prefetch errors are kept for the document of each thread
+    fetcher.prefetch([f"{server.url}/missing.png"])
+    thread = Thread(target=fetcher.prefetch, args=([],))
+    thread.start()
+    thread.join()
+    with pytest.raises(FetchError):
+        fetcher.fetch(f"{server.url}/missing.png")
+    assert len(server.requests) == 9
+
+
+@pytest.mark.parametrize(
+    "headers, max_age, store",
+    (
+        ({}, FETCH_MAX_AGE, True),
+        ({"Cache-Control": "max-age=60"}, 60, True),
+        ({"Cache-Control": "no-cache, max-age=60"}, 0, True),
+        ({"Cache-Control": "no-store"}, FETCH_MAX_AGE, False),
+        (
+            {
+                "Date": "Thu, 01 Jan 2026 00:00:00 GMT",
+                "Expires": "Thu, 01 Jan 2026 00:02:00 GMT",
+            },
+            120,
+            True,
+        ),
+        (
+            {
+                "Cache-Control": "max-age=60",
+                "Date": "Thu, 01 Jan 2026 00:00:00 GMT",
+                "Expires": "Thu, 01 Jan 2026 00:02:00 GMT",
+            },
+            60,
+            True,
+        ),
+        ({"Expires": "Thu, 01 Jan 1970 00:00:00 GMT"}, 0, True),
+        ({"Expires": "0"}, 0, True),
+    ),
+)
+def test_cache_control(headers, max_age, store):
+    """Get the freshness lifetime of responses, and whether they can be stored."""
+    message = Message()
+    for name, value in headers.items():
+        message[name] = value
+    assert _cache_control(message) == (max_age, store)
+
+
+def test_fetcher_resource_cache(server, tmp_path):
+    """Keep resources on disk between fetchers, unless they cannot be stored."""
+    cache = ResourceCache(tmp_path / "resources")
+    fetcher = Fetcher(cache)
+    for path in ("/logo.png", "/private.png"):
+        fetcher.fetch(f"{server.url}{path}")
+    fetcher.close()
+    assert len(cache.entries()) == 1
+
+    other = Fetcher(cache)
+    assert other.fetch(f"{server.url}/logo.png").body == b"PNG"
+    assert len(server.requests) == 2
+    other.close()
+
+    # Cached resources are used when they cannot be revalidated
+    server.shutdown()
+    server.server_close()
+    stale = Fetcher(cache)
+    cache.store(
+        f"{server.url}/logo.png", Resource(f"{server.url}/logo.png", b"PNG", etag="1")
+    )
+    assert stale.fetch(f"{server.url}/logo.png").body == b"PNG"
+
+
+def test_resource_cache_eviction(tmp_path):
+    """Evict least recently used resources when the cache is full."""
+    cache = ResourceCache(tmp_path / "resources", max_size=2048)
+    for index in range(3):
+        url = f"https://example.com/{index}.png"
+        cache.store(url, Resource(url, bytes(1000)))
+    assert cache.load("https://example.com/0.png") is None
+    assert cache.load("https://example.com/2.png").body == bytes(1000)
+
+
+def test_fetcher_local_files(tmp_path, fetcher):
+    """Keep local files in memory until they change."""
+    image = tmp_path / "image.png"
+    image.write_bytes(b"PNG")
+
+    resource = fetcher.fetch(image.as_uri())
+    assert (resource.body, resource.mime_type) == (b"PNG", "image/png")
+    with record() as dependencies:
+        assert fetcher.fetch(image.as_uri()) is resource
+    assert dependencies == {str(image): signature(image)}
+
+    image.write_bytes(b"GIF89a")
+    assert fetcher.fetch(image.as_uri()).body == b"GIF89a"
+
+
+def test_fetcher_without_local_files(tmp_path):
+    """Refuse to read local files when they are not fetched."""
+    secret = tmp_path / "secret.txt"
+    secret.write_text("secret")
+    with pytest.raises(FetchError, match="Local files are not fetched"):
+        Fetcher(files=False).fetch(secret.as_uri())
+
+
+def test_fetcher_weasyprint_interface(server, fetcher):
+    """Fetch resources for WeasyPrint."""
+    from weasyprint.urls import URLFetcherResponse
+
+    response = fetcher(f"{server.url}/style.css")
+    assert isinstance(response, URLFetcherResponse)
+    assert response.url == f"{server.url}/style.css"
+    assert fetcher("data:text/plain,hello") is not None
@@ -0,0 +1,116 @@
+"""md2pdf tests for the formulas module."""
+
+import time
+from unittest import mock
+
+import markdown
+import pytest
+
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+from md2pdf.formulas import (
+    FormulaCache,
+    FormulaRenderer,
+    KatexExtension,
+    formula_key,
+)
+
+MATH = """# Maths
+
+Inline $`x^2`$ and $`\\sqrt{2}`$, then $`x^2`$ again.
+
+```math
+\\frac{1}{2}
+```
+"""
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    """A formula renderer with an on-disk cache."""
+    yield FormulaRenderer(FormulaCache(tmp_path / "formulas"))
+
+
+def test_formula_key():
+    """Formula key should change with the TeX source and KaTeX options."""
+    key = formula_key("x^2", {"display-mode": True})
+    assert key == formula_key("x^2", {"display-mode": True})
+    assert key != formula_key("x^3", {"display-mode": True})
+    assert key != formula_key("x^2", {})
+
+
+def test_renderer_caches(renderer):
+    """Formulas are rendered once, then loaded from caches."""
+    with mock.patch.object(renderer, "_katex", return_value="<svg></svg>") as katex:
+        assert renderer.render("x^2", {"no_inline_svg": False}) == "<svg></svg>"
+        assert renderer.render("x^2", {}) == "<svg></svg>"
+        assert renderer.render("x^2", {"no_inline_svg": True}).startswith("<img ")
+    katex.assert_called_once_with("x^2", {})
+
+    other = FormulaRenderer(renderer.cache)
+    with mock.patch.object(other, "_katex") as katex:
+        assert other.render("x^2", {}) == "<svg></svg>"
+    katex.assert_not_called()
+
+
+def test_renderer_render_many(renderer):
+    """Formulas missing from caches are rendered once, concurrently."""
+
+    def katex(tex, options):
+        time.sleep(0.2)
+        if tex == "\\error":
+            raise ValueError("Undefined control sequence")
+        return f"<span>{tex}</span>"
+
+    formulas = [(f"x^{i}", {}) for i in range(4)]
+    with mock.patch.object(renderer, "_katex", side_effect=katex) as mocked:
+        started_at = time.perf_counter()
+        renderer.render_many([*formulas, *formulas, ("\\error", {})])
+        assert time.perf_counter() - started_at < 0.2 * 5
+        assert mocked.call_count == 5
+
+        assert renderer.render("x^3", {}) == "<span>x^3</span>"
+        # Errors are raised once, without rendering the formula again
+        with pytest.raises(ValueError, match="Undefined"):
+            renderer.render("\\error", {})
+        assert mocked.call_count == 5
+
+
+@pytest.mark.parametrize("options", ({}, {"no_inline_svg": True}))
+def test_katex_extension(renderer, options):
+    """Render formulas as the markdown_katex extension does, with caches."""
+    expected = markdown.markdown(
+        MATH,
+        extensions=["markdown_katex"],
+        extension_configs={"markdown_katex": options},
+    )
+    html = markdown.markdown(
+        MATH, extensions=[KatexExtension(renderer=renderer, **options)]
+    )
+    assert html == expected
+    assert len(renderer.cache.entries()) == 3
+    assert ("<svg" in html) != bool(options)
+
+    with mock.patch.object(renderer, "_katex") as katex:
+        assert (
+            markdown.markdown(
+                MATH, extensions=[KatexExtension(renderer=renderer, **options)]
+            )
+            == expected
+        )
+    katex.assert_not_called()
+
+
+def test_converter_formulas(tmp_path):
+    """Converters render formulas with their renderer (cached with renders)."""
+    converter = Converter(cache=RenderCache(tmp_path))
+    config = {"markdown_katex": {"insert_fonts_css": False}}
+    html = converter.md2html(MATH, extras=["markdown_katex"], extras_config=config)
+    assert '<span class="katex">' in html
+    assert "katex.min.css" not in html
+    assert len(FormulaCache(tmp_path / "formulas").entries()) == 3
+
+    other = Converter(cache=RenderCache(tmp_path))
+    with mock.patch.object(other.formulas, "_katex") as katex:
+        other.md2html(f"{MATH}\n\nNew", extras=["markdown_katex"], extras_config=config)
+    katex.assert_not_called()
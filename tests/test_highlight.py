@@ -0,0 +1,111 @@
+"""md2pdf tests for the highlight module."""
+
+from unittest import mock
+
+import markdown
+from pymdownx.highlight import Highlight
+
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+from md2pdf.highlight import (
+    HighlightCache,
+    HighlightExtension,
+    Highlights,
+    highlight_key,
+)
+
+CODE = """# Code
+
+```python
+def foo():
+    return 42
+```
+
+Some `#!python inline` code.
+
+```python title="bar.py"
+def bar():
+    return 42
+```
+
+```python
+def foo():
+    return 42
+```
+"""
+EXTENSIONS = ["pymdownx.superfences", "pymdownx.inlinehilite"]
+
+
+def test_highlight_key():
+    """Highlight key should change with the code, language and options."""
+    key = highlight_key("x = 1", "python", {"linenums": True})
+    assert key == highlight_key("x = 1", "python", {"linenums": True})
+    assert key != highlight_key("x = 2", "python", {"linenums": True})
+    assert key != highlight_key("x = 1", "text", {"linenums": True})
+    assert key != highlight_key("x = 1", "python", {"linenums": False})
+
+
+def test_highlights_eviction(tmp_path):
+    """Keep least recently used blocks in memory, and all blocks on disk."""
+    highlights = Highlights(HighlightCache(tmp_path / "highlight"), size=2)
+    for index in range(3):
+        highlights.put(str(index), f"<pre>{index}</pre>")
+    assert len(highlights._memory) == 2
+    assert highlights.get("0") == "<pre>0</pre>"
+    assert Highlights().get("0") is None
+
+
+def test_highlight_extension(tmp_path):
+    """Highlight code blocks as pymdownx does, once."""
+    expected = markdown.markdown(CODE, extensions=EXTENSIONS)
+    highlights = Highlights(HighlightCache(tmp_path / "highlight"))
+    extensions = [HighlightExtension(highlights=highlights), *EXTENSIONS]
+    with mock.patch.object(
+        Highlight, "highlight", autospec=True, side_effect=Highlight.highlight
+    ) as highlight:
+        assert markdown.markdown(CODE, extensions=extensions) == expected
+        # Inline code is not cached
+        assert highlight.call_count == 3
+        assert len(highlights.cache.entries()) == 2
+
+        highlight.reset_mock()
+        markdown.markdown(CODE, extensions=extensions)
+        assert highlight.call_count == 1
+
+
+def test_highlight_extension_options():
+    """Highlighted blocks depend on formatter options and titles stashed as HTML."""
+    highlights = Highlights()
+    for linenums in (False, True, False):
+        extension = HighlightExtension(highlights=highlights, linenums=linenums)
+        html = markdown.markdown(CODE, extensions=[extension, *EXTENSIONS])
+        assert ('class="linenos"' in html) is linenums
+    assert len(highlights._memory) == 4
+
+    titled = '```python title="<em>baz.py</em>" title_mode="html"\nbaz()\n```\n'
+    expected = markdown.markdown(titled, extensions=EXTENSIONS)
+    for _ in range(2):
+        html = markdown.markdown(
+            titled, extensions=[HighlightExtension(highlights=highlights), *EXTENSIONS]
+        )
+        assert html == expected
+        assert "<em>baz.py</em>" in html
+    assert len(highlights._memory) == 4
+
+
+def test_converter_highlights(tmp_path):
+    """Converters highlight code blocks with their highlights (cached on disk)."""
+    converter = Converter(cache=RenderCache(tmp_path))
+    html = converter.md2html(CODE)
+    assert '<span class="k">def</span>' in html
+    assert len(HighlightCache(tmp_path / "highlight").entries()) == 2
+
+    config = {"pymdownx.highlight": {"linenums": True}}
+    html = converter.md2html(CODE, extras=["pymdownx.highlight"], extras_config=config)
+    assert 'class="linenos"' in html
+    assert len(converter.highlights._memory) == 4
+
+    other = Converter(cache=RenderCache(tmp_path))
+    with mock.patch.object(Highlight, "highlight") as highlight:
+        other.md2html(f"{CODE}\n\nNew")
+    highlight.assert_not_called()
@@ -0,0 +1,131 @@
+"""md2pdf tests for the images module."""
+
+import os
+from base64 import b64encode
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+from md2pdf.deps import record, signature
+from md2pdf.exceptions import ValidationError
+from md2pdf.fetch import Fetcher
+from md2pdf.images import ImageCache, ImageOptions
+
+
+@pytest.fixture
+def image(tmp_path):
+    """A local image file."""
+    path = tmp_path / "image.png"
+    path.write_bytes(b"PNG")
+    yield path
+
+
+def test_image_options():
+    """Image options are checked, and change render cache keys when set."""
+    assert ImageOptions().variant == {}
+    assert ImageOptions(dpi=150, jpeg_quality=0).variant == {
+        "images": {"dpi": 150, "jpeg_quality": 0}
+    }
+    assert ImageOptions(dpi=150).weasyprint == {"dpi": 150, "jpeg_quality": None}
+
+    with pytest.raises(ValidationError, match="resolution"):
+        ImageOptions(dpi=0)
+    with pytest.raises(ValidationError, match="JPEG quality"):
+        ImageOptions(jpeg_quality=96)
+
+
+def test_image_cache_reuse(image):
+    """Reuse images until their source changes, recording them as dependencies."""
+    cache = ImageCache(Fetcher())
+    url = image.as_uri()
+    cache[url] = decoded = SimpleNamespace(id="image")
+    cache["image-source-"] = b"PNG"
+
+    with record() as dependencies:
+        assert url in cache
+        assert cache[url] is decoded
+    assert dependencies == {str(image): signature(image)}
+
+    # Touched files are not decoded again
+    os.utime(image, ns=(0, 0))
+    assert url in cache
+
+    image.write_bytes(b"GIF89a")
+    assert url not in cache
+    assert "image-source-" in cache
+
+
+def test_image_cache_failed_images(image):
+    """Do not keep images that failed to load."""
+    cache = ImageCache(Fetcher())
+    cache[image.as_uri()] = None
+    assert image.as_uri() not in cache
+
+    cache["file:///missing.png"] = SimpleNamespace(id="missing")
+    assert "file:///missing.png" not in cache
+
+
+def test_image_cache_trim():
+    """Evict least recently used images with their data."""
+    cache = ImageCache(Fetcher(), size=2)
+    for index in range(3):
+        cache[f"data:image/png;base64,{index}"] = SimpleNamespace(id=str(index))
+        cache[f"{index}-source-"] = b"PNG"
+    # Images are not evicted before documents are written
+    assert len(cache) == 6
+
+    assert cache["data:image/png;base64,0"].id == "0"
+    cache.trim()
+    assert "data:image/png;base64,0" in cache
+    assert "data:image/png;base64,1" not in cache
+    assert "1-source-" not in cache
+    assert len(cache) == 4
+
+    # Data of unknown images (another key layout) evicts all images
+    cache["source-3"] = b"PNG"
+    cache.trim()
+    assert len(cache) == 0
+
+
+def test_image_cache_weasyprint_layout():
+    """WeasyPrint keys image data as the cache expects, evicting all of it."""
+    pytest.importorskip("weasyprint.images")
+    from PIL import Image
+    from weasyprint import HTML
+
+    png = BytesIO()
+    Image.new("RGB", (4, 4)).save(png, format="PNG")
+    url = f"data:image/png;base64,{b64encode(png.getvalue()).decode()}"
+    cache = ImageCache(Fetcher(), size=0)
+    HTML(string=f'<img src="{url}">').render(cache=cache).write_pdf()
+
+    prefix = f"{cache[url].id}-"
+    assert [key for key in cache if key != url]
+    assert all(str(key).startswith(prefix) for key in cache if key != url)
+    cache.trim()
+    assert len(cache) == 0
+
+
+def test_converter_image_options(tmp_path):
+    """Converters pass their image cache and options to WeasyPrint."""
+    from weasyprint import HTML
+
+    options = ImageOptions(dpi=150, jpeg_quality=80)
+    converter = Converter(cache=RenderCache(tmp_path), images=options)
+    with mock.patch.object(
+        HTML, "render", autospec=True, side_effect=HTML.render
+    ) as render:
+        converter.convert(tmp_path / "output.pdf", raw="# Title")
+    assert render.call_args.kwargs["cache"] is converter.images
+    assert render.call_args.kwargs["dpi"] == 150
+    assert render.call_args.kwargs["jpeg_quality"] == 80
+
+    # Documents rendered with other image options are not cached
+    stats = Converter(cache=RenderCache(tmp_path)).convert(
+        tmp_path / "output.pdf", raw="# Title"
+    )
+    assert not stats.cached
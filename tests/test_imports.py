@@ -0,0 +1,63 @@
+"""md2pdf tests for lazy imports."""
+
+import subprocess
+import sys
+
+import pytest
+
+# Pygments is not listed: rich imports it to format help messages
+HEAVY_MODULES = (
+    "frontmatter",
+    "jinja2",
+    "markdown",
+    "rich.progress",
+    "watchfiles",
+    "weasyprint",
+)
+
+
+def imported_modules(*args):
+    """List modules imported by a python command (using `-X importtime`)."""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    # Lines look like: "import time:   self [us] | cumulative | module"
+    return {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def heavy(modules):
+    """Filter heavy modules (and their submodules)."""
+    return {
+        m for m in modules if m.split(".")[0] in HEAVY_MODULES or m in HEAVY_MODULES
+    }
+
+
+@pytest.mark.parametrize(
+    "args",
+    (
+        ["-c", "import md2pdf.cli"],
+        ["-m", "md2pdf", "--version"],
+        ["-m", "md2pdf", "--help"],
+        ["-m", "md2pdf", "serve", "--help"],
+    ),
+)
+def test_cli_startup_does_not_import_heavy_dependencies(args):
+    """Program version, help or usage should start fast."""
+    assert heavy(imported_modules(*args)) == set()
+
+
+def test_api_imports_weasyprint_upon_layout():
+    """Rendering HTML should not import WeasyPrint."""
+    modules = imported_modules(
+        "-c", "from md2pdf import md2html; md2html(raw='# Hello')"
+    )
+    assert "markdown" in modules
+    assert "jinja2" in modules
+    assert not any(m.startswith("weasyprint") for m in modules)
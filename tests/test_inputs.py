@@ -0,0 +1,111 @@
+"""md2pdf tests for the inputs module."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from md2pdf.deps import absolute
+from md2pdf.inputs import Manifest, find_inputs, mirror
+from md2pdf.stats import DocumentStats
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """A tree of markdown sources."""
+    for path in (
+        "index.md",
+        "guide/intro.md",
+        "guide/advanced/tips.markdown",
+        "guide/notes.txt",
+        ".drafts/draft.md",
+        "guide/.hidden.md",
+    ):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("# Title")
+    yield tmp_path
+
+
+def test_find_inputs(tree):
+    """Find markdown files in directories and glob patterns, with relative paths."""
+    # Hidden files and directories are skipped
+    assert list(find_inputs([tree]).items()) == [
+        (tree / "index.md", Path("index.md")),
+        (tree / "guide/intro.md", Path("guide/intro.md")),
+        (tree / "guide/advanced/tips.markdown", Path("guide/advanced/tips.markdown")),
+    ]
+
+    assert find_inputs([tree / "guide" / "**" / "*.m*"]) == {
+        tree / "guide/advanced/tips.markdown": Path("advanced/tips.markdown"),
+        tree / "guide/intro.md": Path("intro.md"),
+    }
+    assert find_inputs([tree / "*.txt"]) == {}
+
+    # Files are found once, in inputs order
+    assert list(find_inputs([tree / "guide/intro.md", tree]).items()) == [
+        (tree / "guide/intro.md", Path("intro.md")),
+        (tree / "index.md", Path("index.md")),
+        (tree / "guide/advanced/tips.markdown", Path("guide/advanced/tips.markdown")),
+    ]
+
+
+def test_mirror(tree, tmp_path):
+    """Output files mirror the source tree."""
+    outputs = mirror(find_inputs([tree / "guide"]), tmp_path / "out")
+    assert outputs == {
+        tree / "guide/advanced/tips.markdown": tmp_path / "out/advanced/tips.pdf",
+        tree / "guide/intro.md": tmp_path / "out/intro.pdf",
+    }
+
+
+def test_manifest(tmp_path):
+    """Documents are up to date when their PDF is newer than their dependencies."""
+    md, css, image, pdf = (
+        tmp_path / name for name in ("input.md", "style.css", "logo.png", "out.pdf")
+    )
+    for path in (md, css, image, pdf):
+        path.write_text("content")
+    os.utime(pdf, ns=(2 * 10**18, 2 * 10**18))
+
+    manifest = Manifest(tmp_path / "manifest.json")
+    assert manifest.fresh([(md, pdf)], "key") == {}
+    manifest.record(
+        [
+            DocumentStats(
+                input=str(md),
+                output=str(pdf),
+                dependencies={str(absolute(p)): None for p in (md, css, image)},
+            )
+        ],
+        "key",
+    )
+    manifest.save()
+
+    manifest = Manifest(tmp_path / "manifest.json")
+    assert set(manifest.fresh([(md, pdf)], "key")[md]) == {
+        str(absolute(p)) for p in (md, css, image)
+    }
+    # Other options or output paths
+    assert manifest.fresh([(md, pdf)], "other") == {}
+    assert manifest.fresh([(md, tmp_path / "other.pdf")], "key") == {}
+
+    # Dependencies newer than the PDF, or missing
+    os.utime(image, ns=(3 * 10**18, 3 * 10**18))
+    assert manifest.fresh([(md, pdf)], "key") == {}
+    image.unlink()
+    assert manifest.fresh([(md, pdf)], "key") == {}
+
+    # Failed documents are forgotten
+    image.write_text("content")
+    manifest.record([DocumentStats(input=str(md), output=str(pdf), error="!")], "key")
+    assert manifest.fresh([(md, pdf)], "key") == {}
+
+
+def test_manifest_invalid_file(tmp_path):
+    """Invalid manifest files are ignored."""
+    path = tmp_path / "manifest.json"
+    path.write_text("{")
+    assert Manifest(path).fresh([(path, path)], "key") == {}
+    path.write_text(json.dumps({str(absolute(path)): "invalid"}))
+    assert Manifest(path).fresh([(path, path)], "key") == {}
@@ -0,0 +1,164 @@
+"""md2pdf tests for the memory module."""
+
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import pytest
+
+from md2pdf.core import Converter
+from md2pdf.exceptions import MemoryLimitError, RenderTimeoutError, ValidationError
+from md2pdf.memory import WorkerLimits, limited, peak_rss, release, reset_peak_rss, rss
+from md2pdf.pool import (
+    ConvertOptions,
+    ExecutorType,
+    Job,
+    convert_job,
+    deadline,
+    get_converter,
+    get_executor,
+    worker_task,
+)
+
+
+@worker_task
+def exceed():
+    """Exceed the memory hard limit of any worker (in a worker process)."""
+    with mock.patch("md2pdf.memory.rss", return_value=2**62):
+        time.sleep(10)
+
+
+def linger(timeout):
+    """Sleep longer than the task timeout (in a worker process)."""
+    with deadline(timeout):
+        time.sleep(10)
+    return True
+
+
+def test_worker_limits():
+    """Limits are checked, and reached by tasks or resident memory."""
+    with pytest.raises(ValidationError, match="tasks"):
+        WorkerLimits(max_tasks=0)
+    with pytest.raises(ValidationError, match="memory"):
+        WorkerLimits(max_rss=0)
+
+    assert WorkerLimits().hard_rss is None
+    assert WorkerLimits(max_rss=100).hard_rss == 200
+
+    limits = WorkerLimits(max_tasks=2, max_rss=100)
+    with mock.patch("md2pdf.memory.rss", return_value=50) as current:
+        assert not limits.reached(1)
+        assert limits.reached(2)
+        current.return_value = 150
+        assert limits.reached(1)
+        current.return_value = None
+        assert not limits.reached(1)
+
+
+def test_resident_memory():
+    """Measure current and peak resident memory."""
+    if rss() is None:
+        pytest.skip("Resident memory is not available on this system")
+    reset_peak_rss()
+    data = bytearray(64 * 1024**2)
+    assert peak_rss() >= rss() >= len(data)
+    del data
+    release()
+    reset_peak_rss()
+    assert peak_rss() < 64 * 1024**2 + rss()
+
+
+def test_limited():
+    """Call back once when resident memory exceeds the limit."""
+    exceeded = mock.Mock()
+    with limited(None, exceeded):
+        pass
+
+    with mock.patch("md2pdf.memory.rss", return_value=200):
+        with limited(300, exceeded):
+            time.sleep(0.2)
+        exceeded.assert_not_called()
+
+        with limited(100, exceeded):
+            time.sleep(0.2)
+        exceeded.assert_called_once_with(200)
+
+        # The watchdog stops with the context
+        with limited(100, exceeded):
+            pass
+        time.sleep(0.2)
+        exceeded.assert_called_once()
+
+
+def test_record_rss(tmp_path):
+    """Record the peak resident memory of documents only when requested."""
+    with mock.patch("md2pdf.core.reset_peak_rss") as reset:
+        stats = Converter().convert(tmp_path / "output.pdf", raw="# Title")
+        assert stats.rss is None
+        reset.assert_not_called()
+
+        options = ConvertOptions(record_rss=True)
+        with get_executor(ExecutorType.thread, 1, options) as pool:
+            _, stats = pool.submit(
+                convert_job, Job(tmp_path / "output.pdf", raw="# Title")
+            ).result()
+        reset.assert_called_once()
+    assert stats.rss is None or stats.rss > 0
+
+
+def test_worker_recycling(tmp_path):
+    """Workers are recycled once they reach their limits."""
+    converters = worker_task(lambda: id(get_converter()))
+    options = ConvertOptions(limits=WorkerLimits(max_tasks=2))
+    with get_executor(ExecutorType.thread, 1, options) as pool:
+        ids = [pool.submit(converters).result() for _ in range(4)]
+    assert ids[0] == ids[1]
+    assert ids[1] != ids[2]
+    assert ids[2] == ids[3]
+
+    # Worker threads are not interrupted, and recycled after their task
+    options = ConvertOptions(limits=WorkerLimits(max_rss=100))
+    with (
+        get_executor(ExecutorType.thread, 1, options) as pool,
+        mock.patch("md2pdf.memory.rss", return_value=300),
+    ):
+        first = pool.submit(converters).result()
+        assert pool.submit(converters).result() != first
+
+
+def test_process_pool_worker_exit(tmp_path):
+    """Worker processes exceeding their hard limit exit, and are replaced."""
+    options = ConvertOptions(limits=WorkerLimits(max_rss=1024**4))
+    with get_executor(ExecutorType.process, 1, options) as pool:
+        exceeding = pool.submit(exceed)
+        # Interrupted tasks are submitted again
+        pending = pool.submit(pow, 2, 3)
+        with pytest.raises(MemoryLimitError):
+            exceeding.result()
+        assert pending.result() == 8
+
+        # Worker processes exit from tasks exceeding their timeout
+        with pytest.raises(RenderTimeoutError):
+            pool.submit(linger, 0.2).result()
+
+        output, _ = pool.submit(
+            convert_job, Job(tmp_path / "output.pdf", raw="# Title")
+        ).result()
+        assert output.exists()
+
+        # Tasks of workers exiting for other reasons are retried
+        with mock.patch("md2pdf.pool.WORKER_RETRIES", 1):
+            with pytest.raises(BrokenProcessPool):
+                pool.submit(os._exit, 1).result()
+        assert pool.submit(pow, 3, 2).result() == 9
+
+        # Tasks beyond those queued for workers can be cancelled
+        running = [pool.submit(time.sleep, 0.5) for _ in range(2)]
+        cancelled = pool.submit(pow, 2, 2)
+        assert cancelled.cancel()
+        assert cancelled.cancelled()
+        assert [future.result() for future in running] == [None, None]
+
+    with pytest.raises(RuntimeError):
+        pool.submit(pow, 2, 2)
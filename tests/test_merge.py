@@ -0,0 +1,57 @@
+"""md2pdf tests for the mail merge module."""
+
+from pathlib import Path
+
+import pytest
+
+from md2pdf.exceptions import ValidationError
+from md2pdf.merge import output_path, read_rows
+
+
+def test_read_rows_from_json_lines(tmp_path):
+    """Read data rows from a JSON lines file."""
+    data = tmp_path / "rows.jsonl"
+    data.write_text('{"id": 1, "name": "John"}\n\n{"id": 2, "name": "Jane"}\n')
+
+    assert list(read_rows(data)) == [
+        {"id": 1, "name": "John"},
+        {"id": 2, "name": "Jane"},
+    ]
+
+
+def test_read_rows_from_csv(tmp_path):
+    """Read data rows from a CSV file."""
+    data = tmp_path / "rows.csv"
+    data.write_text("id,name\n1,John\n2,Jane\n")
+
+    assert list(read_rows(data)) == [
+        {"id": "1", "name": "John"},
+        {"id": "2", "name": "Jane"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "name,content,message",
+    (
+        ("rows.jsonl", '{"id": 1}\n{"id": 2,}\n', r"line 2 should be valid JSON"),
+        ("rows.jsonl", "[1, 2]\n", r"line 1 should be a JSON object"),
+        ("rows.txt", "id\n1\n", r"Unsupported data file format '.txt'"),
+    ),
+)
+def test_read_rows_from_invalid_file(tmp_path, name, content, message):
+    """Raise a ValidationError for invalid data files."""
+    data = tmp_path / name
+    data.write_text(content)
+
+    with pytest.raises(ValidationError, match=message):
+        list(read_rows(data))
+
+
+def test_output_path():
+    """Format output path pattern with row fields."""
+    row = {"id": 2, "name": "Jane"}
+    assert output_path("out/{id}-{name}.pdf", row, 1) == Path("out/2-Jane.pdf")
+    assert output_path("out/{index}.pdf", row, 1) == Path("out/1.pdf")
+
+    with pytest.raises(ValidationError, match="Invalid output pattern"):
+        output_path("out/{unknown}.pdf", row, 1)
@@ -0,0 +1,109 @@
+"""md2pdf tests for the preview mode."""
+
+from unittest import mock
+
+import pytest
+
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+from md2pdf.exceptions import ValidationError
+from md2pdf.preview import Preview, blocks, section, truncate
+
+HTML = """<h1>Title</h1>
+<p>Intro<br>text.</p>
+<h2>First <code>section</code></h2>
+<div><h2>Nested heading</h2></div>
+<h3>Sub-section</h3>
+<h2>Second section</h2>
+<p>End.</p>"""
+
+CHAPTERS = "\n\n".join(f"# Chapter {index}\n\nText." for index in range(1, 9))
+
+
+def test_preview():
+    """Preview either a range of pages, or a section."""
+    assert str(Preview(pages=(2, 5))) == "pages 2-5"
+    assert str(Preview(pages=(3, 3))) == "page 3"
+    assert str(Preview(section="Usage")) == "section “Usage”"
+    for pages, title in (((1, 2), "Usage"), (None, None), ((0, 2), None)):
+        with pytest.raises(ValidationError):
+            Preview(pages, title)
+
+
+def test_blocks():
+    """Find top-level elements, and headings titles."""
+    found = blocks(HTML)
+    assert [block.tag for block in found] == ["h1", "p", "h2", "div", "h3", "h2", "p"]
+    assert found[2].title == "First section"
+    assert found[3].title == ""
+    assert HTML[found[1].start :].startswith("<p>Intro")
+
+
+def test_truncate():
+    """Cut HTML between top-level elements."""
+    assert truncate(HTML, 1) == "<h1>Title</h1>\n"
+    assert truncate(HTML, 16).endswith("text.</p>\n")
+    assert truncate(HTML, len(HTML)) == HTML
+
+
+def test_section():
+    """Get a section, up to the next heading of its level."""
+    first = section(HTML, "first  SECTION")
+    assert first.startswith("<h2>First")
+    assert "Sub-section" in first
+    assert "Second section" not in first
+    assert section(HTML, "second") == "<h2>Second section</h2>\n<p>End.</p>"
+    assert section(HTML, "Title") == HTML
+    with pytest.raises(ValidationError, match="No section"):
+        section(HTML, "Nested heading")
+
+
+@pytest.mark.parametrize("separator", ("\x0c", "\x85", "\u2028", "\r", "\r\n"))
+def test_section_with_other_line_separators(separator):
+    """Only newlines are line breaks of parser positions."""
+    html = f"<p>a{separator}b</p>\n<h1>T</h1>\n<p>c</p>"
+    assert section(html, "T") == "<h1>T</h1>\n<p>c</p>"
+    assert truncate(html, 1) == f"<p>a{separator}b</p>\n"
+
+
+def test_converter_preview_pages(tmp_path):
+    """Lay out the beginning of documents only, until it covers previewed pages."""
+    converter = Converter()
+    with (
+        mock.patch("md2pdf.core.PREVIEW_PAGE_SIZE", 10),
+        mock.patch.object(
+            converter, "html2document", wraps=converter.html2document
+        ) as html2document,
+    ):
+        stats = converter.convert(
+            tmp_path / "output.pdf", raw=CHAPTERS, preview=Preview(pages=(2, 3))
+        )
+    assert stats.pages == 2
+    # Laid out HTML is grown until it has more pages than the last previewed one
+    laid_out = [call.args[0] for call in html2document.call_args_list]
+    assert len(laid_out) > 1
+    assert "Chapter 4" in laid_out[-1]
+    assert "Chapter 8" not in laid_out[-1]
+
+    # Documents shorter than previewed pages are previewed from their last page
+    stats = converter.convert(
+        tmp_path / "output.pdf", raw=CHAPTERS, preview=Preview(pages=(10, 12))
+    )
+    assert stats.pages == 1
+
+
+def test_converter_preview_section(tmp_path):
+    """Lay out a section only, without caching it."""
+    converter = Converter(cache=RenderCache(tmp_path / "cache"))
+    with mock.patch.object(
+        converter, "html2document", wraps=converter.html2document
+    ) as html2document:
+        stats = converter.convert(
+            tmp_path / "output.pdf", raw=CHAPTERS, preview=Preview(section="Chapter 2")
+        )
+    assert stats.pages == 1
+    (html,) = (call.args[0] for call in html2document.call_args_list)
+    assert "Chapter 2" in html
+    assert "Chapter 3" not in html
+    assert not stats.cached
+    assert not list((tmp_path / "cache").glob("*/*.pdf"))
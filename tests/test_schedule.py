@@ -0,0 +1,72 @@
+"""md2pdf tests for the schedule module."""
+
+import json
+
+from md2pdf.schedule import History
+from md2pdf.stats import DocumentStats
+
+
+def test_history_costs(tmp_path):
+    """Estimate costs from recorded durations, or sizes with the mean rate."""
+    small, large, new = (tmp_path / f"{name}.md" for name in ("small", "large", "new"))
+    small.write_text("x" * 100)
+    large.write_text("x" * 10)
+    new.write_text("x" * 1000)
+    history = History()
+
+    # Without history, costs follow sizes
+    costs = history.costs([small, large, new])
+    assert costs[new] > costs[small] > costs[large]
+
+    # A short file may be long to convert (e.g. with many images)
+    history.record(
+        [
+            DocumentStats(input=str(small), duration=1.0),
+            DocumentStats(input=str(large), duration=10.0),
+        ]
+    )
+    costs = history.costs([small, large, new])
+    assert costs[small] == 1.0
+    assert costs[large] == 10.0
+    assert costs[new] == 1000 * 11.0 / 110
+
+    # Recorded durations are scaled by size changes
+    large.write_text("x" * 20)
+    assert history.costs([large])[large] == 20.0
+
+
+def test_history_record(tmp_path):
+    """Record converted documents only, keeping the most recent ones."""
+    md = [tmp_path / f"{index}.md" for index in range(3)]
+    for path in md:
+        path.write_text("# Title")
+    history = History(size=2)
+    history.record(
+        [
+            DocumentStats(input=str(md[0]), duration=1.0, cached=True),
+            DocumentStats(input=str(md[1]), duration=1.0, error="Failed"),
+            DocumentStats(input=str(tmp_path / "missing.md"), duration=1.0),
+            DocumentStats(duration=1.0),
+        ]
+    )
+    assert history.costs(md) == dict.fromkeys(md, 7.0)
+
+    history.record(DocumentStats(input=str(path), duration=2.0) for path in md)
+    history.record([DocumentStats(input=str(md[1]), duration=3.0)])
+    assert history.costs(md) == {md[0]: 7.0 * 5.0 / 14, md[1]: 3.0, md[2]: 2.0}
+
+
+def test_history_file(tmp_path):
+    """Keep the history in a file, ignoring invalid ones."""
+    md = tmp_path / "input.md"
+    md.write_text("# Title")
+    path = tmp_path / "cache" / "history.json"
+    history = History(path)
+    history.record([DocumentStats(input=str(md), duration=2.0)])
+    history.save()
+    assert History(path).costs([md]) == {md: 2.0}
+
+    path.write_text(json.dumps(["invalid"]))
+    assert History(path).costs([md]) == {md: 7.0}
+    path.write_text("{")
+    assert History(path).costs([md]) == {md: 7.0}
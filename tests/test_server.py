@@ -0,0 +1,251 @@
+"""md2pdf tests for the render server."""
+
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.client import HTTPConnection
+from threading import Event, Thread
+from time import sleep
+from unittest import mock
+
+import pytest
+
+from md2pdf.exceptions import QueueFullError, ValidationError
+from md2pdf.pool import ExecutorType, get_converter, get_executor
+from md2pdf.server import Renderer, RenderRequest, is_loopback, make_server
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """HTTP connection over a unix socket."""
+
+    def __init__(self, path):
+        """Initialize connection."""
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        """Connect to the unix socket."""
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def pool():
+    """Worker pool."""
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        yield pool
+
+
+def serve(renderer, **kwargs):
+    """Start a render server in a background thread."""
+    server = make_server(renderer, port=0, **kwargs)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def post(connection, body):
+    """Post a render request."""
+    connection.request(
+        "POST",
+        "/render",
+        body=json.dumps(body) if isinstance(body, dict) else body,
+        headers={"Content-Type": "application/json"},
+    )
+    return connection.getresponse()
+
+
+def test_render_request_from_json():
+    """Parse render requests."""
+    request = RenderRequest.from_json(b'{"markdown": "# hi", "context": {"a": 1}}')
+    assert request == RenderRequest(markdown="# hi", context={"a": 1})
+
+
+@pytest.mark.parametrize(
+    "body",
+    (
+        b"# hi",
+        b'["# hi"]',
+        b'{"css": "h1 {}"}',
+        b'{"markdown": "# hi", "unknown": 1}',
+        b'{"markdown": "# hi", "extras": ["pymdownx.snippets"]}',
+        b'{"markdown": "# hi", "extras": "tables"}',
+        b'{"markdown": "# hi", "css": ["h1 {}"]}',
+        b'{"markdown": "# hi", "context": ["a"]}',
+        b'{"markdown": "# hi", "extras_config": ["tables"]}',
+        b'{"markdown": "# hi", "extras_config": {"tables": 1}}',
+    ),
+)
+def test_render_request_from_invalid_json(body):
+    """Raise a ValidationError for invalid requests."""
+    with pytest.raises(ValidationError, match="Invalid request body"):
+        RenderRequest.from_json(body)
+
+
+def test_server_render(pool):
+    """Render PDF over HTTP."""
+    server = serve(Renderer(pool, workers=1))
+    connection = HTTPConnection(*server.server_address)
+
+    connection.request("GET", "/health")
+    response = connection.getresponse()
+    assert response.status == 200
+    response.read()
+
+    response = post(
+        connection,
+        {"markdown": "# Hi {{ name }}", "css": "h1 {}", "context": {"name": "you"}},
+    )
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "application/pdf"
+    assert response.read().startswith(b"%PDF")
+
+    response = post(connection, b"# Hi")
+    assert response.status == 400
+    assert json.loads(response.read()) == {
+        "error": "Invalid request body (should be valid JSON)"
+    }
+
+    response = post(connection, {"markdown": ""})
+    assert response.status == 400
+    response.read()
+
+    response = post(connection, {"markdown": "# Hi", "context": ["you"]})
+    assert response.status == 400
+    assert "context" in json.loads(response.read())["error"]
+
+    # Internal errors are not sent to clients
+    with mock.patch("md2pdf.server.render", side_effect=OSError("/secret/path")):
+        response = post(connection, {"markdown": "# Hi"})
+    assert response.status == 500
+    assert json.loads(response.read()) == {"error": "Render failed"}
+
+    connection.request("POST", "/unknown")
+    response = connection.getresponse()
+    assert response.status == 404
+    response.read()
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_render_request_extras():
+    """Accept extensions of the allowlist, by module or entry point name."""
+    request = RenderRequest.from_json(
+        b'{"markdown": "# hi", "extras": ["tables", "pymdownx.tilde"]}'
+    )
+    assert request.extras == ["tables", "pymdownx.tilde"]
+
+
+def test_server_render_untrusted_requests(pool):
+    """Render templates in a sandbox, and reject invalid request lengths."""
+    server = serve(Renderer(pool, workers=1))
+    connection = HTTPConnection(*server.server_address)
+
+    response = post(
+        connection, {"markdown": "{{ ''.__class__.__mro__[1].__subclasses__() }}"}
+    )
+    assert response.status == 400
+    assert "Unsafe template" in json.loads(response.read())["error"]
+
+    for length, status in (("abc", 400), ("-1", 400), (str(2**30), 413)):
+        connection.putrequest("POST", "/render")
+        connection.putheader("Content-Length", length)
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == status
+        response.read()
+        connection.close()
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_untrusted_converter():
+    """Untrusted documents converter does not read local files."""
+    converter = get_converter(untrusted=True)
+    assert converter.sandbox is not None
+    assert not converter.fetcher.files
+    assert converter.cache is None
+    assert get_converter().fetcher.files
+
+
+@pytest.mark.parametrize(
+    "host,loopback",
+    (
+        ("127.0.0.1", True),
+        ("::1", True),
+        ("localhost", True),
+        ("10.0.0.1", False),
+        ("192.168.1.2", False),
+        ("example.com", False),
+    ),
+)
+def test_is_loopback(host, loopback):
+    """Tell whether the server only accepts local connections."""
+    assert is_loopback(host) is loopback
+
+
+def test_server_render_on_unix_socket(pool, tmp_path):
+    """Render PDF over HTTP on a unix socket."""
+    path = tmp_path / "md2pdf.sock"
+    server = serve(Renderer(pool, workers=1), socket=path)
+    connection = UnixHTTPConnection(str(path))
+
+    response = post(connection, {"markdown": "# Hi"})
+    assert response.status == 200
+    assert response.read().startswith(b"%PDF")
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_backpressure_and_timeout(pool):
+    """Reject requests when the queue is full and timeout slow renders."""
+    started, release = Event(), Event()
+
+    def slow_render(request, timeout):
+        started.set()
+        release.wait(5)
+        return b"%PDF"
+
+    server = serve(Renderer(pool, workers=1, queue_size=0, timeout=0.5))
+    with mock.patch("md2pdf.server.render", side_effect=slow_render):
+        # The first request occupies the single worker until its timeout
+        first = HTTPConnection(*server.server_address)
+        responses = []
+        client = Thread(target=lambda: responses.append(post(first, {"markdown": "#"})))
+        client.start()
+        started.wait(5)
+
+        response = post(HTTPConnection(*server.server_address), {"markdown": "# Hi"})
+        assert response.status == 503
+        assert response.getheader("Retry-After") == "1"
+        response.read()
+
+        client.join(5)
+        assert responses[0].status == 504
+        responses[0].read()
+        release.set()
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_renderer_timeout_releases_worker():
+    """Worker processes exit from timed out renders, giving their slot back."""
+    loops = "{% for i in range(100000) %}" * 2 + "{% endfor %}" * 2
+    with get_executor(ExecutorType.process, 1) as pool:
+        renderer = Renderer(pool, workers=1, queue_size=0, timeout=0.5)
+        with pytest.raises(FutureTimeoutError):
+            renderer.render(RenderRequest(markdown=loops))
+
+        # The slot is given back once the worker process has exited
+        for _ in range(100):
+            try:
+                future = renderer.submit(RenderRequest(markdown="# Hi"))
+            except QueueFullError:
+                sleep(0.1)
+                continue
+            break
+        assert future.result(timeout=30).startswith(b"%PDF")
@@ -0,0 +1,210 @@
+"""md2pdf tests for split rendering."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    FloatObject,
+    NameObject,
+    TextStringObject,
+)
+
+from md2pdf.cache import RenderCache
+from md2pdf.core import Converter
+from md2pdf.images import ImageOptions
+from md2pdf.split import (
+    ANCHOR_SCHEME,
+    Chunk,
+    _resolve_anchors,
+    group_sections,
+    merge_chunks,
+    split_convert,
+    split_html,
+)
+
+MANUAL = """Preface.
+
+# Chapter 1
+
+See [chapter 3](#chapter-3).
+
+## Section 1.1
+
+> # Quoted heading
+
+# Chapter 2
+
+## Section 2.1
+
+# Chapter 3 {: #chapter-3 }
+
+Back to [nowhere](#missing).
+"""
+
+
+@pytest.fixture
+def pool():
+    """Worker pool."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_split_html():
+    """Cut HTML before top-level headings."""
+    html = (
+        "<h1>A</h1>\n<p>a</p>\n"
+        "<blockquote>\n<h1>Quoted</h1>\n</blockquote>\n"
+        "<h2>B</h2>\n<p>b<br />b</p>\n"
+        "<h1 id='c'>C</h1>\n<p>c</p>\n"
+    )
+    assert split_html(html) == [
+        (
+            "<h1>A</h1>\n<p>a</p>\n"
+            "<blockquote>\n<h1>Quoted</h1>\n</blockquote>\n"
+            "<h2>B</h2>\n<p>b<br />b</p>\n"
+        ),
+        "<h1 id='c'>C</h1>\n<p>c</p>\n",
+    ]
+    assert len(split_html(html, level=2)) == 3
+    assert split_html("<p>preface</p><h1>A</h1>") == ["<p>preface</p>", "<h1>A</h1>"]
+    assert split_html("<p>no heading</p>") == ["<p>no heading</p>"]
+
+
+@pytest.mark.parametrize("separator", ("\x0c", "\x85", "\u2028", "\r"))
+def test_split_html_with_other_line_separators(separator):
+    """Only newlines are line breaks of parser positions."""
+    html = f"<h1>A</h1>\n<p>a{separator}a</p>\n<h1>B</h1>\n<p>b</p>"
+    assert split_html(html) == [
+        f"<h1>A</h1>\n<p>a{separator}a</p>\n",
+        "<h1>B</h1>\n<p>b</p>",
+    ]
+
+
+@pytest.mark.parametrize(
+    "sections,chunks,expected",
+    (
+        (["aa", "bb", "cc", "dd"], 2, ["aabb", "ccdd"]),
+        (["aaaaaa", "b", "c", "d"], 2, ["aaaaaa", "bcd"]),
+        (["a", "b", "c"], 4, ["a", "b", "c"]),
+        (["a", "b", "c"], 1, ["abc"]),
+    ),
+)
+def test_group_sections(sections, chunks, expected):
+    """Group consecutive sections into chunks of similar sizes."""
+    assert group_sections(sections, chunks) == expected
+
+
+def pdf_with_links(*names):
+    """Get a PDF page with links to rewritten anchors, and a 'target' anchor."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(200, 200)
+    writer.add_named_destination("target", 0)
+    annotations = ArrayObject()
+    for name in names:
+        annotation = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Annot"),
+                NameObject("/Subtype"): NameObject("/Link"),
+                NameObject("/Rect"): ArrayObject([FloatObject(0)] * 4),
+                NameObject("/A"): DictionaryObject(
+                    {
+                        NameObject("/S"): NameObject("/URI"),
+                        NameObject("/URI"): TextStringObject(name),
+                    }
+                ),
+            }
+        )
+        annotations.append(writer._add_object(annotation))
+    page[NameObject("/Annots")] = annotations
+    return writer
+
+
+def test_resolve_anchors():
+    """Rewritten internal links should point to named destinations."""
+    writer = pdf_with_links(
+        f"{ANCHOR_SCHEME}target", f"{ANCHOR_SCHEME}missing", "https://example.com"
+    )
+    _resolve_anchors(writer)
+
+    first, external = (a.get_object() for a in writer.pages[0]["/Annots"])
+    assert first["/Dest"] == "target"
+    assert "/A" not in first
+    assert external["/A"]["/URI"] == "https://example.com"
+
+
+def test_merge_chunks(tmp_path):
+    """Merge chunks, rebuilding bookmarks with their levels."""
+    chunks = []
+    for bookmarks in (
+        [(1, "Chapter 1", 0, 100.0, True), (2, "Section 1.1", 1, 50.0, True)],
+        [(2, "Section 1.2", 0, 100.0, True), (1, "Chapter 2", 1, 100.0, False)],
+    ):
+        writer = PdfWriter()
+        for _ in range(2):
+            writer.add_blank_page(200, 200)
+        pdf = tmp_path / "chunk.pdf"
+        writer.write(pdf)
+        chunks.append(Chunk(pdf.read_bytes(), 2, bookmarks))
+
+    output = tmp_path / "output.pdf"
+    merge_chunks(chunks, output)
+
+    reader = PdfReader(output)
+    assert len(reader.pages) == 4
+    chapter1, sections, chapter2 = reader.outline
+    assert chapter1.title == "Chapter 1"
+    assert [section.title for section in sections] == ["Section 1.1", "Section 1.2"]
+    assert [reader.get_destination_page_number(s) for s in sections] == [1, 2]
+    assert chapter2.title == "Chapter 2"
+    assert reader.get_destination_page_number(chapter2) == 3
+
+
+def test_split_convert(pool, tmp_path):
+    """Lay out chunks in parallel with continuous page numbers."""
+    css = tmp_path / "styles.css"
+    css.write_text(
+        "h1 { break-before: page }\n"
+        '@page { @bottom-center { content: "Page " counter(page) " of " '
+        "counter(pages) } }"
+    )
+    pdf = tmp_path / "manual.pdf"
+
+    stats = split_convert(
+        pool, pdf, raw=MANUAL, css=css, extras=["attr_list"], chunks=4
+    )
+    assert stats.pages == 4
+    assert stats.size == pdf.stat().st_size
+
+    reader = PdfReader(pdf)
+    assert len(reader.pages) == 4
+    for number, page in enumerate(reader.pages, start=1):
+        assert f"Page {number} of 4" in page.extract_text()
+    titles = [item.title for item in reader.outline if not isinstance(item, list)]
+    assert titles == ["Chapter 1", "Quoted heading", "Chapter 2", "Chapter 3"]
+
+    # Links to anchors of other chunks are kept (and links to missing ones removed)
+    links = [
+        annotation.get_object()
+        for page in reader.pages
+        for annotation in page.get("/Annots", [])
+    ]
+    assert [link["/Dest"] for link in links] == ["chapter-3"]
+
+
+def test_split_convert_with_render_cache(pool, tmp_path):
+    """Unchanged documents should be copied from the render cache."""
+    cache = RenderCache(tmp_path / "cache")
+    pdf = tmp_path / "manual.pdf"
+
+    assert not split_convert(pool, pdf, raw=MANUAL, cache=cache).cached
+    assert split_convert(pool, pdf, raw=MANUAL, cache=cache).cached
+    assert not split_convert(pool, pdf, raw=MANUAL, cache=cache, level=2).cached
+
+    # Image options of the converter are part of the key
+    converter = Converter(images=ImageOptions(dpi=150))
+    assert not split_convert(
+        pool, pdf, raw=MANUAL, cache=cache, converter=converter
+    ).cached
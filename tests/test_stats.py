@@ -0,0 +1,77 @@
+"""md2pdf tests for the stats module."""
+
+import json
+from io import StringIO
+
+import pytest
+
+from md2pdf.stats import DocumentStats, percentile, summarize, write_report
+
+
+def test_document_stats_stage():
+    """Stages durations should add up."""
+    stats = DocumentStats()
+    with stats.stage("cache"):
+        pass
+    duration = stats.stages["cache"]
+    with stats.stage("cache"):
+        pass
+    assert stats.stages["cache"] >= duration
+
+    with pytest.raises(RuntimeError), stats.stage("layout"):
+        raise RuntimeError("failed")
+    assert "layout" in stats.stages
+
+
+@pytest.mark.parametrize(
+    "values,q,expected",
+    (
+        ([], 50, None),
+        ([1.0], 95, 1.0),
+        ([3.0, 1.0, 2.0, 4.0], 50, 2.0),
+        ([float(v) for v in range(1, 101)], 95, 95.0),
+        ([1.0, 2.0], 0, 1.0),
+    ),
+)
+def test_percentile(values, q, expected):
+    """Compute percentiles with the nearest rank method."""
+    assert percentile(values, q) == expected
+
+
+def test_summarize():
+    """Aggregate documents statistics of a batch."""
+    documents = [
+        DocumentStats(
+            stages={"read": 0.1, "layout": 1.0}, duration=2.0, pages=2, size=100
+        ),
+        DocumentStats(
+            stages={"read": 0.3, "layout": 3.0}, duration=4.0, pages=4, size=200
+        ),
+        DocumentStats(duration=0.1, size=100, cached=True),
+        DocumentStats(error="Boom"),
+    ]
+    summary = summarize(documents, elapsed=2.0)
+
+    assert summary["documents"] == 4
+    assert summary["rendered"] == 2
+    assert summary["cached"] == 1
+    assert summary["failed"] == 1
+    assert summary["pages"] == 6
+    assert summary["size"] == 400
+    assert summary["throughput"] == {"documents": 1.5, "pages": 3.0}
+    assert summary["duration"]["p50"] == 2.0
+    assert summary["duration"]["p95"] == 4.0
+    assert list(summary["stages"]) == ["read", "layout"]
+    assert summary["stages"]["layout"]["total"] == 4.0
+    assert summary["stages"]["layout"]["mean"] == 2.0
+
+
+def test_write_report():
+    """Write a JSON line per document, then a batch one."""
+    report = StringIO()
+    write_report(report, [DocumentStats(input="a.md"), DocumentStats()], 1.0)
+
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    assert [line["type"] for line in lines] == ["document", "document", "batch"]
+    assert lines[0]["input"] == "a.md"
+    assert lines[2]["documents"] == 2